@@ -0,0 +1,189 @@
+"""
+Move-and-capture acquisition: drive the gantry through a list of XY positions and
+grab one settled camera frame at each, tagged with where the machine was.
+
+    with MoveAndCapture(driver, camera, output_dir="scan") as acq:
+        shots = acq.run([(0, 0), (-5, 0), (-5, 5)])
+
+Encoding and saving run in a thread pool while the machine already moves to the
+next point; only the frame grab itself holds up motion.
+"""
+import os
+import json
+import time
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+
+
+AcquiredFrame = namedtuple("AcquiredFrame", [
+    "index",        # position number in the request
+    "commanded",    # (x, y) sent to the machine
+    "reported",     # (x, y, z) WPos from the Idle status report
+    "seq",          # camera frame sequence number
+    "timestamp",    # capture time, time.monotonic()
+    "settled_at",   # time the machine was confirmed Idle, time.monotonic()
+    "path",         # saved file, or None if kept in memory
+    "image",        # undistorted BGR image when output_dir is None, else None
+])
+
+
+class MoveAndCapture:
+    def __init__(self, driver, camera, output_dir=None, settle_delay=0.1, speed=3000,
+                 undistort=True, image_format="png", save_workers=2, frame_timeout=2.0):
+        """
+        Args:
+            driver (CncMachineDriver): Connected, unlocked driver.
+            camera (ThreadSafeCameraReader): Running camera reader.
+            output_dir (str or None): Directory for images and manifest.jsonl; in memory if None.
+            settle_delay (float): Seconds after confirmed Idle before a frame counts.
+                The capture timestamp is taken when the read returns, so this should
+                cover vibration settling plus one exposure.
+            speed (float): Feed rate for the moves, mm/min.
+            undistort (bool): Undistort frames if the camera has a calibration.
+            image_format (str): File extension for cv2.imwrite ('png', 'jpg', 'tiff', ...).
+                With 'jpg', no undistortion and a raw MJPEG camera the compressed frame is
+                written as is.
+            save_workers (int): Threads for decode / undistort / encode / write.
+            frame_timeout (float): Seconds to wait for a settled frame before giving up.
+        """
+        self.driver = driver
+        self.camera = camera
+        self.output_dir = output_dir
+        self.settle_delay = settle_delay
+        self.speed = speed
+        self.undistort = undistort and camera.undistorter is not None
+        self.image_format = image_format.lstrip(".").lower()
+        self.frame_timeout = frame_timeout
+        self._pool = ThreadPoolExecutor(max_workers=save_workers, thread_name_prefix="AcquisitionSave")
+        # Bound the frames waiting for the pool so a slow disk cannot eat all memory
+        self._pending = threading.BoundedSemaphore(2 * save_workers)
+        self._stop = threading.Event()
+        self.timings = []  # (move_s, frame_wait_s) per position
+        if output_dir is not None:
+            os.makedirs(output_dir, exist_ok=True)
+
+    # -----------------------------
+    # Acquisition
+    # -----------------------------
+    def run(self, positions, on_frame=None):
+        """
+        Visit every position and capture one frame there.
+
+        Args:
+            positions (iterable): (x, y) machine coordinates in mm.
+            on_frame (callable or None): on_frame(AcquiredFrame), called from a pool
+                thread once the frame has been processed.
+
+        Returns:
+            list[AcquiredFrame]: One entry per visited position, in order.
+        """
+        self._stop.clear()
+        self.timings = []
+        futures = []
+        manifest = None
+        if self.output_dir is not None:
+            manifest = open(os.path.join(self.output_dir, "manifest.jsonl"), "a")
+        manifest_lock = threading.Lock()
+        try:
+            for index, (x, y) in enumerate(positions):
+                if self._stop.is_set():
+                    break
+                start = time.monotonic()
+                self.driver.move_xy(x, y, self.speed)
+                settled_at = time.monotonic()
+                status = self.driver.status
+                frame = self._settled_frame(settled_at + self.settle_delay)
+                self.timings.append((settled_at - start, time.monotonic() - settled_at))
+
+                self._pending.acquire()
+                futures.append(self._pool.submit(
+                    self._process, index, (x, y), status, settled_at, frame,
+                    on_frame, manifest, manifest_lock))
+            return [future.result() for future in futures]
+        finally:
+            for future in futures:
+                future.exception()  # wait for everything already submitted
+            if manifest is not None:
+                manifest.close()
+
+    def stop(self):
+        """Finish the current position and skip the rest."""
+        self._stop.set()
+
+    def _settled_frame(self, not_before):
+        """
+        Wait for the first frame captured at or after `not_before`.
+
+        Returns:
+            tuple: (seq, timestamp, payload, compressed) where payload is an owned
+                copy of the ring image, or None if only the compressed bytes are needed.
+        """
+        delay = not_before - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        deadline = not_before + self.frame_timeout
+        seq = 0
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError("No camera frame arrived after the machine settled")
+            lease = self.camera.wait_for_new(seq, timeout=remaining)
+            if lease is None:
+                continue
+            with lease:
+                seq = lease.seq
+                if lease.timestamp < not_before:
+                    continue
+                # Release the ring slot quickly: keep the MJPEG bytes (owned per frame)
+                # or copy the decoded image, everything else happens in the pool
+                compressed = lease.compressed
+                image = None if compressed is not None else lease.image.copy()
+                return lease.seq, lease.timestamp, image, compressed
+
+    # -----------------------------
+    # Background processing
+    # -----------------------------
+    def _process(self, index, commanded, status, settled_at, frame, on_frame, manifest, manifest_lock):
+        try:
+            seq, timestamp, image, compressed = frame
+            reported = tuple(status.wpos) if status is not None else None
+            path = None
+            if self.output_dir is not None:
+                path = os.path.join(self.output_dir, f"frame_{index:05d}.{self.image_format}")
+            if (path is not None and compressed is not None and not self.undistort
+                    and self.image_format in ("jpg", "jpeg")):
+                with open(path, "wb") as f:
+                    f.write(compressed.tobytes())
+                image = None
+            else:
+                if image is None:
+                    image = cv2.imdecode(compressed, cv2.IMREAD_COLOR)
+                if self.undistort:
+                    image = self.camera.undistorter.undistort(image)
+                if path is not None:
+                    if not cv2.imwrite(path, image):
+                        raise IOError(f"Could not write {path}")
+                    image = None
+            result = AcquiredFrame(index, commanded, reported, seq, timestamp, settled_at, path, image)
+            if manifest is not None:
+                record = result._replace(image=None)._asdict()
+                with manifest_lock:
+                    manifest.write(json.dumps(record) + "\n")
+                    manifest.flush()
+            if on_frame is not None:
+                on_frame(result)
+            return result
+        finally:
+            self._pending.release()
+
+    def close(self):
+        self._pool.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
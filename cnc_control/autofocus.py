@@ -0,0 +1,234 @@
+"""
+Contrast-based autofocus: sweep Z while the camera keeps capturing, score every
+frame's sharpness and fit a peak.
+
+    af = Autofocus(driver, camera, roi=(0.4, 0.4, 0.2, 0.2))
+    best_z = af.run(z_min=-1.0, z_max=1.0)
+
+The sweep is one continuous streamed G1 move instead of step-and-look: frames are
+matched to Z by interpolating the status reports at each frame's capture time. A
+coarse pass over the whole range is followed by a slower fine pass around the peak.
+Sweep feeds follow the measured camera frame rate, so a slow sensor mode still gets
+enough frames per pass.
+"""
+import threading
+import time
+
+import cv2
+import numpy as np
+
+
+def sharpness(image, roi=None, downscale=2, method="laplacian"):
+    """
+    Focus score of a BGR or grey frame; higher is sharper.
+
+    Args:
+        image (np.ndarray): Frame.
+        roi (tuple or None): (x, y, w, h) as fractions of the frame, whole frame if None.
+        downscale (int): Shrink the ROI by this factor first (INTER_AREA); 1 keeps it.
+        method (str): 'laplacian' (variance of the Laplacian) or 'tenengrad'
+            (mean squared Sobel gradient magnitude).
+
+    Returns:
+        float: Score.
+    """
+    h, w = image.shape[:2]
+    if roi is not None:
+        fx, fy, fw, fh = roi
+        x0, y0 = int(fx * w), int(fy * h)
+        image = image[y0:y0 + max(1, int(fh * h)), x0:x0 + max(1, int(fw * w))]
+    if image.ndim == 3:
+        image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    if downscale > 1:
+        size = (max(1, image.shape[1] // downscale), max(1, image.shape[0] // downscale))
+        image = cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+    if method == "laplacian":
+        return float(cv2.Laplacian(image, cv2.CV_32F, ksize=3).var())
+    if method == "tenengrad":
+        gx = cv2.Sobel(image, cv2.CV_32F, 1, 0, ksize=3)
+        gy = cv2.Sobel(image, cv2.CV_32F, 0, 1, ksize=3)
+        return float(np.mean(gx * gx + gy * gy))
+    raise ValueError("method must be 'laplacian' or 'tenengrad'")
+
+
+def fit_peak(z, scores, window=2):
+    """
+    Sub-sample peak position: parabola through the best score and `window`
+    neighbours on each side, falling back to the best sample.
+
+    Returns:
+        float: Z of the peak, clamped to the sampled range.
+    """
+    z = np.asarray(z, dtype=np.float64)
+    scores = np.asarray(scores, dtype=np.float64)
+    if z.size == 0:
+        raise ValueError("No focus samples")
+    order = np.argsort(z)
+    z, scores = z[order], scores[order]
+    best = int(np.argmax(scores))
+    lo, hi = max(0, best - window), min(z.size, best + window + 1)
+    if hi - lo >= 3 and np.ptp(z[lo:hi]) > 0:
+        a, b, _ = np.polyfit(z[lo:hi], scores[lo:hi], 2)
+        if a < 0:
+            return float(np.clip(-b / (2 * a), z[lo], z[hi - 1]))
+    return float(z[best])
+
+
+class Autofocus:
+    COARSE_SPEED = 300   # upper limits of the sweep feeds, mm/min
+    FINE_SPEED = 60
+
+    def __init__(self, driver, camera, roi=(0.375, 0.375, 0.25, 0.25), downscale=2,
+                 method="laplacian", frame_latency=0.0, frames_per_sweep=12, fps=None):
+        """
+        Args:
+            driver (CncMachineDriver): Connected driver with Z support.
+            camera (ThreadSafeCameraReader): Running camera; ring frames are scored
+                (at preview resolution in raw MJPEG mode).
+            roi (tuple or None): (x, y, w, h) fractions of the frame to score.
+            downscale (int): Extra shrink of the ROI before scoring.
+            method (str): 'laplacian' or 'tenengrad'.
+            frame_latency (float): Seconds between mid-exposure and the frame timestamp;
+                subtracted before looking up Z.
+            frames_per_sweep (int): Frames each pass should get; sets the sweep feeds.
+            fps (float or None): Camera frame rate; measured on the first run if None.
+        """
+        self.driver = driver
+        self.camera = camera
+        self.roi = roi
+        self.downscale = downscale
+        self.method = method
+        self.frame_latency = frame_latency
+        self.frames_per_sweep = frames_per_sweep
+        self.fps = fps
+        self.samples = []   # (z, score) of every pass, for plotting/debugging
+        self._lock = threading.Lock()
+        self._history = []
+
+    def _on_status(self, status):
+        with self._lock:
+            self._history.append((status.timestamp, status.wpos[2]))
+
+    def measure_fps(self, frames=4, timeout=5.0):
+        """
+        Camera frame rate from the timestamps of consecutive new frames.
+
+        Returns:
+            float: Frames per second (also stored in self.fps).
+        """
+        stamps = []
+        lease = self.camera.get_frame()
+        seq = 0
+        if lease is not None:
+            seq = lease.seq
+            lease.release()
+        deadline = time.monotonic() + timeout
+        while len(stamps) < frames and time.monotonic() < deadline:
+            lease = self.camera.wait_for_new(seq, timeout=0.5)
+            if lease is not None:
+                with lease:
+                    seq = lease.seq
+                    stamps.append(lease.timestamp)
+        if len(stamps) < 2 or stamps[-1] <= stamps[0]:
+            raise RuntimeError("Camera delivers no frames; cannot autofocus")
+        self.fps = (len(stamps) - 1) / (stamps[-1] - stamps[0])
+        return self.fps
+
+    def sweep_speed(self, distance, limit):
+        """
+        Feed that gives `frames_per_sweep` frames over `distance` mm at the camera rate:
+        distance * fps / frames * 60, but never above `limit`.
+        """
+        fps = self.fps if self.fps is not None else self.measure_fps()
+        return min(limit, abs(distance) * fps / self.frames_per_sweep * 60.0)
+
+    def sweep(self, z_from, z_to, speed):
+        """
+        Move from the current Z to `z_to` in one streamed move, scoring frames on the way.
+
+        Args:
+            z_from (float): Current Z (already reached).
+            z_to (float): Sweep end.
+            speed (float): Z feed, mm/min. Slower gives more frames per mm.
+
+        Returns:
+            tuple: (z, scores) arrays, one entry per frame taken during the move.
+        """
+        frames = []  # (timestamp, score)
+        with self._lock:
+            self._history = []
+        self.driver.subscribe(self._on_status)
+        try:
+            lease = self.camera.get_frame()
+            seq = 0
+            if lease is not None:
+                seq = lease.seq
+                lease.release()
+            started = time.monotonic()
+            self.driver.move_z(z_to, speed, wait=False)
+            deadline = started + abs(z_to - z_from) / (speed / 60.0) * 2 + 5.0
+            while time.monotonic() < deadline:
+                lease = self.camera.wait_for_new(seq, timeout=0.5)
+                if lease is not None:
+                    with lease:
+                        seq = lease.seq
+                        score = sharpness(lease.image, self.roi, self.downscale, self.method)
+                        frames.append((lease.timestamp - self.frame_latency, score))
+                status = self.driver.status
+                if status is not None and status.state == "Idle" and status.timestamp > started + 0.05:
+                    break
+            else:
+                raise TimeoutError("Z sweep did not finish")
+        finally:
+            self.driver.unsubscribe(self._on_status)
+        with self._lock:
+            history = np.asarray(self._history, dtype=np.float64).reshape(-1, 2)
+        if not frames or len(history) < 2:
+            return np.empty(0), np.empty(0)
+
+        times, scores = np.asarray(frames).T
+        # Only frames taken while Z was actually between the sweep ends
+        z = np.interp(times, history[:, 0], history[:, 1])
+        inside = (times >= history[0, 0]) & (times <= history[-1, 0])
+        self.samples.extend(zip(z[inside].tolist(), scores[inside].tolist()))
+        return z[inside], scores[inside]
+
+    def run(self, z_min, z_max, coarse_speed=None, fine_speed=None, fine_range=None, backlash=0.0):
+        """
+        Full autofocus: coarse sweep over [z_min, z_max], fine sweep around the peak,
+        then move to the best Z (from below if `backlash` is set).
+
+        Args:
+            z_min, z_max (float): Search range, mm.
+            coarse_speed, fine_speed (float or None): Sweep feeds, mm/min; derived from
+                the camera frame rate (see sweep_speed) if None.
+            fine_range (float or None): Half-width of the fine pass; a tenth of the
+                coarse range if None.
+            backlash (float): Overshoot below the target before the final approach, mm.
+
+        Returns:
+            float: Best-focus Z.
+        """
+        self.samples = []
+        if coarse_speed is None:
+            coarse_speed = self.sweep_speed(z_max - z_min, self.COARSE_SPEED)
+        self.driver.move_z(z_min, self.COARSE_SPEED)
+        z, scores = self.sweep(z_min, z_max, coarse_speed)
+        if z.size < 3:
+            raise RuntimeError(f"Too few frames during the coarse focus sweep ({z.size} at "
+                               f"{coarse_speed:.0f} mm/min); lower coarse_speed")
+        best = fit_peak(z, scores)
+
+        half = fine_range if fine_range is not None else (z_max - z_min) / 10.0
+        lo, hi = max(z_min, best - half), min(z_max, best + half)
+        if fine_speed is None:
+            fine_speed = self.sweep_speed(hi - lo, self.FINE_SPEED)
+        self.driver.move_z(lo, self.COARSE_SPEED)
+        z, scores = self.sweep(lo, hi, fine_speed)
+        if z.size >= 3:
+            best = fit_peak(z, scores)
+
+        if backlash:
+            self.driver.move_z(max(self.driver.Z_MIN, best - backlash), self.COARSE_SPEED)
+        self.driver.move_z(round(best, 4), self.FINE_SPEED)
+        return best
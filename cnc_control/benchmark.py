@@ -0,0 +1,283 @@
+"""
+Benchmark suite for the CNC + camera stack.
+
+Runs against the GRBL simulator or a real port and writes a JSON report so releases
+can be compared:
+
+    python -m cnc_control.benchmark --port sim --output bench.json
+    python -m cnc_control.benchmark --port /dev/ttyUSB0 --camera /dev/video2 --output bench.json
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import tempfile
+import subprocess
+
+import numpy as np
+
+
+def summarize(samples):
+    """Latency percentiles in milliseconds for a list of durations in seconds."""
+    if not samples:
+        return {"n": 0}
+    ms = np.asarray(samples, dtype=np.float64) * 1000.0
+    return {
+        "n": int(ms.size),
+        "mean_ms": float(ms.mean()),
+        "min_ms": float(ms.min()),
+        "p50_ms": float(np.percentile(ms, 50)),
+        "p90_ms": float(np.percentile(ms, 90)),
+        "p99_ms": float(np.percentile(ms, 99)),
+        "max_ms": float(ms.max()),
+    }
+
+
+def timed(fn, iterations):
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+# -----------------------------
+# CNC
+# -----------------------------
+def bench_cnc(port, iterations, segments):
+    from cnc_control.cnc_lib.new_machine_lib import CncMachineDriver
+
+    results = {}
+    driver = CncMachineDriver(port, baud_rate=115200, timeout=2)
+    connect = {}
+    start = time.perf_counter()
+    driver.open_serial_port()
+    connect["open_serial_port_ms"] = (time.perf_counter() - start) * 1000
+    t = time.perf_counter()
+    driver.unlock()
+    connect["unlock_ms"] = (time.perf_counter() - t) * 1000
+    t = time.perf_counter()
+    driver.set_units_and_mode()
+    connect["set_units_and_mode_ms"] = (time.perf_counter() - t) * 1000
+    connect["total_ms"] = (time.perf_counter() - start) * 1000
+    results["connect"] = connect
+
+    try:
+        # Round trip of a command that does not move anything
+        results["command_rtt"] = summarize(timed(lambda: driver._send_gcode("G4 P0"), iterations))
+
+        # Short relative moves back and forth, each waits for Idle
+        direction = [1]
+
+        def jog_once():
+            driver.move_x_rel(-direction[0])
+            direction[0] = -direction[0]
+        results["move_x_rel"] = summarize(timed(jog_once, max(2, iterations // 10)))
+
+        # Streaming a polyline: segments per second at the machine's feed
+        lines = [f"G1 X{-(i % 20) * 0.5:.3f} Y{(i % 40) * 0.25:.3f} F3000" for i in range(segments)]
+        driver.set_units_and_mode()
+        start = time.perf_counter()
+        errors = driver.stream(lines)
+        streamed = time.perf_counter() - start
+        driver._wait_for_idle(timeout=driver.MOVE_TIMEOUT)
+        total = time.perf_counter() - start
+        results["stream"] = {
+            "segments": segments,
+            "errors": len(errors),
+            "stream_s": streamed,
+            "total_s": total,
+            "segments_per_s": segments / total if total else None,
+        }
+        results["driver_latency"] = {k: (v * 1000 if k != "count" else v)
+                                     for k, v in driver.latency_stats().items()}
+    finally:
+        driver.close_serial_port()
+    return results
+
+
+# -----------------------------
+# Camera
+# -----------------------------
+def synthetic_calibration(width, height):
+    """Write a plausible fisheye calibration for a synthetic frame size, return the path."""
+    f = 0.6 * width
+    data = {
+        "camera_matrix": [[f, 0, width / 2], [0, f, height / 2], [0, 0, 1]],
+        "distortion_coefficients": [-0.05, 0.01, 0.0, 0.0],
+        "resolution": {"width": width, "height": height},
+        "rms_error": 0.0,
+    }
+    fd, path = tempfile.mkstemp(suffix=".json")
+    with os.fdopen(fd, "w") as fh:
+        json.dump(data, fh)
+    return path
+
+
+def bench_undistort(width, height, iterations, calibration_file=None, preview_size=(1280, 960)):
+    from cnc_control.camera.camera_reader import FisheyeUndistorter
+    from cnc_control.camera.parallel_undistort import TiledUndistortEngine
+
+    path = calibration_file or synthetic_calibration(width, height)
+    try:
+        with tempfile.TemporaryDirectory() as cache_dir:
+            # Cold: maps computed and written to the cache; warm: memory-mapped from it
+            start = time.perf_counter()
+            FisheyeUndistorter(path, cache_dir=cache_dir)
+            init_cold_ms = (time.perf_counter() - start) * 1000
+            start = time.perf_counter()
+            undistorter = FisheyeUndistorter(path, cache_dir=cache_dir)
+            init_warm_ms = (time.perf_counter() - start) * 1000
+            w, h = undistorter.resolution
+            frame = np.random.randint(0, 255, (h, w, 3), dtype=np.uint8)
+            undistort = summarize(timed(lambda: undistorter.undistort(frame), iterations))
+            preview = summarize(timed(lambda: undistorter.undistort_preview(frame, *preview_size), iterations))
+            engine = TiledUndistortEngine(undistorter)
+            try:
+                bands = engine.tune(frame)
+                tiled = summarize(timed(lambda: engine.undistort(frame), iterations))
+                tiled_info = {"workers": engine.workers, "bands": engine.bands, "band_ms": bands}
+            finally:
+                engine.close()
+    finally:
+        if calibration_file is None:
+            os.remove(path)
+    return {
+        "resolution": [w, h],
+        "init_cold_ms": init_cold_ms,
+        "init_warm_ms": init_warm_ms,
+        "undistort": undistort,
+        "undistort_preview": preview,
+        "undistort_tiled": tiled,
+        "tiled": tiled_info,
+    }
+
+
+def bench_render(width, height, iterations):
+    """Time the preview path (render_preview + MainWindowController.update_frame) on a synthetic frame."""
+    if not os.environ.get("DISPLAY") and not os.environ.get("WAYLAND_DISPLAY"):
+        os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    from PyQt6.QtWidgets import QApplication
+    from mainwindow_controller import MainWindowController
+    from preview_worker import render_preview
+
+    frame = np.random.randint(0, 255, (height, width, 3), dtype=np.uint8)
+
+    app = QApplication.instance() or QApplication(sys.argv[:1])
+    window = MainWindowController()
+    window.resize(1280, 800)
+    window.show()
+    app.processEvents()
+    displayer = window.ui.image_displayer
+    render_samples, display_samples = [], []
+    try:
+        for _ in range(iterations):
+            start = time.perf_counter()
+            image = render_preview(frame, displayer.width(), displayer.height())
+            rendered = time.perf_counter()
+            window.update_frame(image)
+            app.processEvents()
+            render_samples.append(rendered - start)
+            display_samples.append(time.perf_counter() - rendered)
+    finally:
+        window.close()
+    return {
+        "resolution": [width, height],
+        "render_preview": summarize(render_samples),
+        "update_frame": summarize(display_samples),
+    }
+
+
+def bench_camera(camera_id, duration, iterations, calibration_file=None):
+    from cnc_control.camera.camera_reader import ThreadSafeCameraReader
+
+    results = {}
+    for label, calibration in (("raw", None), ("undistorted", calibration_file)):
+        if label == "undistorted" and calibration is None:
+            continue
+        start = time.perf_counter()
+        cam = ThreadSafeCameraReader(camera_id=camera_id, calibration_file=calibration)
+        open_ms = (time.perf_counter() - start) * 1000
+        try:
+            while cam.get_image() is None:
+                time.sleep(0.01)
+            first = cam.frames_captured
+            time.sleep(duration)
+            fps = (cam.frames_captured - first) / duration
+            results[label] = {
+                "resolution": [cam.width, cam.height],
+                "open_ms": open_ms,
+                "capture_fps": fps,
+                "get_image": summarize(timed(cam.get_image, iterations)),
+            }
+        finally:
+            cam.stop()
+    return results
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="CNC/camera benchmark suite")
+    parser.add_argument("--port", default="sim", help="serial port, or 'sim' for the GRBL simulator")
+    parser.add_argument("--sim-latency", type=float, default=0.0005, help="simulator response latency, s")
+    parser.add_argument("--sim-time-scale", type=float, default=0.0, help="simulator motion time multiplier")
+    parser.add_argument("--camera", default=None, help="camera index or device; skipped if not given")
+    parser.add_argument("--calibration", default=None, help=".json/.npz calibration for undistortion")
+    parser.add_argument("--width", type=int, default=8000, help="synthetic frame width")
+    parser.add_argument("--height", type=int, default=6000, help="synthetic frame height")
+    parser.add_argument("--iterations", type=int, default=100)
+    parser.add_argument("--segments", type=int, default=500, help="segments for the streaming test")
+    parser.add_argument("--camera-seconds", type=float, default=5.0)
+    parser.add_argument("--skip", action="append", default=[],
+                        choices=["cnc", "undistort", "render", "camera"], help="skip a benchmark group")
+    parser.add_argument("--output", default="benchmark.json")
+    args = parser.parse_args(argv)
+
+    report = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "git_revision": git_revision(),
+        "platform": platform.platform(),
+        "python": platform.python_version(),
+        "args": vars(args),
+        "results": {},
+    }
+    results = report["results"]
+
+    if "cnc" not in args.skip:
+        if args.port == "sim":
+            from cnc_control.cnc_lib.grbl_simulator import GrblSimulator
+            with GrblSimulator(response_latency=args.sim_latency, time_scale=args.sim_time_scale) as sim:
+                results["cnc"] = bench_cnc(sim.port, args.iterations, args.segments)
+            results["cnc"]["simulated"] = True
+        else:
+            results["cnc"] = bench_cnc(args.port, args.iterations, args.segments)
+        print(f"cnc: {json.dumps(results['cnc']['command_rtt'])}")
+
+    frame_iterations = max(3, args.iterations // 10)
+    if "undistort" not in args.skip:
+        results["undistort"] = bench_undistort(args.width, args.height, frame_iterations, args.calibration)
+        print(f"undistort: {json.dumps(results['undistort']['undistort'])}")
+    if "render" not in args.skip:
+        results["render"] = bench_render(args.width, args.height, frame_iterations)
+        print(f"render: {json.dumps(results['render']['update_frame'])}")
+    if "camera" not in args.skip and args.camera is not None:
+        camera_id = int(args.camera) if args.camera.isdigit() else args.camera
+        results["camera"] = bench_camera(camera_id, args.camera_seconds, args.iterations, args.calibration)
+
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,49 @@
+import os
 import threading
 import time
+import hashlib
 import cv2
 import numpy as np
 from pathlib import Path
+from collections import OrderedDict
 import json
 
+from cnc_control.camera.parallel_undistort import TiledUndistortEngine
+from cnc_control.metrics import REGISTRY
+
+
 # -----------------------------
-# FisheyeUndistorter (unchanged)
+# Metrics
+# -----------------------------
+FRAMES_CAPTURED = REGISTRY.counter("camera_frames_total", "Camera frames by outcome", {"state": "captured"})
+FRAMES_DROPPED = REGISTRY.counter("camera_frames_total", "Camera frames by outcome", {"state": "dropped"})
+FRAMES_FAILED = REGISTRY.counter("camera_frames_total", "Camera frames by outcome", {"state": "failed"})
+GET_IMAGE_SECONDS = REGISTRY.histogram("camera_get_image_seconds", "get_image() including decode and undistortion")
+UNDISTORT_FULL_SECONDS = REGISTRY.histogram("camera_undistort_seconds", "Undistortion of one frame", {"kind": "full"})
+UNDISTORT_PREVIEW_SECONDS = REGISTRY.histogram("camera_undistort_seconds", "Undistortion of one frame", {"kind": "preview"})
+
+# -----------------------------
+# FisheyeUndistorter (maps cached on disk)
 # -----------------------------
 class FisheyeUndistorter:
-    def __init__(self, calibration_file):
+    DEFAULT_CACHE_DIR = Path.home() / ".cache" / "cnc_control" / "undistort_maps"
+    MAP_TYPE = cv2.CV_16SC2
+    PREVIEW_MAPS_IN_MEMORY = 8
+
+    def __init__(self, calibration_file, cache_dir=None, preview_sizes=()):
+        """
+        Fisheye undistortion with remap tables cached on disk.
+
+        Maps are stored as .npy files keyed by a hash of K, D, source/output size and
+        map type, and memory-mapped on load, so reopening a camera does not recompute
+        them. Preview map sets go straight from a raw frame (of any decoded size) to a
+        display-sized undistorted image, see undistort_preview().
+
+        Args:
+            calibration_file (str): Path to .json/.npz calibration.
+            cache_dir (str or None): Map cache directory; ~/.cache/cnc_control/undistort_maps by default.
+            preview_sizes (iterable): (width, height) output sizes to precompute and persist.
+        """
         self.K = None
         self.D = None
         self.resolution = None
@@ -23,13 +57,13 @@ class FisheyeUndistorter:
         else:
             raise ValueError("Calibration file must be .json or .npz")
         
-        self.map1, self.map2 = cv2.fisheye.initUndistortRectifyMap(
-            self.K, self.D,
-            np.eye(3),
-            self.K,
-            self.resolution,
-            cv2.CV_16SC2
-        )
+        self.resolution = (int(self.resolution[0]), int(self.resolution[1]))
+        self.cache_dir = Path(cache_dir) if cache_dir is not None else self.DEFAULT_CACHE_DIR
+        self._preview_maps = OrderedDict()
+
+        self.map1, self.map2 = self._get_maps(self.resolution, self.resolution, persist=True)
+        for size in preview_sizes:
+            self._get_maps(self.resolution, self._fit_size(*size), persist=True)
         print(f"✅ Loaded calibration: {calibration_file}")
         print(f"   Resolution: {self.resolution[0]}x{self.resolution[1]}")
         print(f"   RMS error: {getattr(self, 'rms_error', 'N/A')}")
@@ -55,39 +89,260 @@ class FisheyeUndistorter:
                 f"Frame resolution {frame.shape[1]}x{frame.shape[0]} "
                 f"doesn't match calibration {self.resolution[0]}x{self.resolution[1]}"
             )
-        return cv2.remap(frame, self.map1, self.map2, interpolation=cv2.INTER_LINEAR)
+        start = time.perf_counter()
+        result = cv2.remap(frame, self.map1, self.map2, interpolation=cv2.INTER_LINEAR)
+        UNDISTORT_FULL_SECONDS.observe(time.perf_counter() - start)
+        return result
+
+    def undistort_preview(self, frame, width, height):
+        """
+        Undistort straight to display size: no full-size remap followed by a downscale.
+
+        `frame` may be the full sensor frame or a reduced MJPEG decode; the output keeps
+        the calibration aspect ratio and fits into width x height. remap samples without
+        prefiltering, so feed reduced-decode frames for strong downscales.
+        """
+        src_size = (frame.shape[1], frame.shape[0])
+        map1, map2 = self._get_maps(src_size, self._fit_size(width, height))
+        start = time.perf_counter()
+        result = cv2.remap(frame, map1, map2, interpolation=cv2.INTER_LINEAR)
+        UNDISTORT_PREVIEW_SECONDS.observe(time.perf_counter() - start)
+        return result
+
+    def _fit_size(self, width, height):
+        scale = min(width / self.resolution[0], height / self.resolution[1])
+        return (max(1, int(self.resolution[0] * scale)), max(1, int(self.resolution[1] * scale)))
+
+    def _get_maps(self, src_size, dst_size, persist=False):
+        """Maps from dst_size output pixels to src_size input pixels: memory, then disk, then compute."""
+        key = (src_size, dst_size)
+        if key == (self.resolution, self.resolution) and getattr(self, 'map1', None) is not None:
+            return self.map1, self.map2
+        maps = self._preview_maps.get(key)
+        if maps is not None:
+            self._preview_maps.move_to_end(key)
+            return maps
+
+        paths = self._cache_paths(src_size, dst_size)
+        maps = self._load_cached(paths)
+        if maps is None:
+            maps = self._compute_maps(src_size, dst_size)
+            if persist:
+                self._save_cached(paths, maps)
+        if key != (self.resolution, self.resolution):
+            self._preview_maps[key] = maps
+            while len(self._preview_maps) > self.PREVIEW_MAPS_IN_MEMORY:
+                self._preview_maps.popitem(last=False)
+        return maps
+
+    def _compute_maps(self, src_size, dst_size):
+        # Source intrinsics follow the decoded frame size, output intrinsics the display size
+        sx, sy = src_size[0] / self.resolution[0], src_size[1] / self.resolution[1]
+        dx, dy = dst_size[0] / self.resolution[0], dst_size[1] / self.resolution[1]
+        K_src = self.K * np.array([[sx], [sy], [1]], dtype=np.float32)
+        P = self.K * np.array([[dx], [dy], [1]], dtype=np.float32)
+        return cv2.fisheye.initUndistortRectifyMap(K_src, self.D, np.eye(3), P, dst_size, self.MAP_TYPE)
+
+    def _cache_paths(self, src_size, dst_size):
+        digest = hashlib.sha1()
+        for part in (self.K, self.D):
+            digest.update(np.ascontiguousarray(part, dtype=np.float32).tobytes())
+        digest.update(repr((tuple(src_size), tuple(dst_size), self.MAP_TYPE, cv2.__version__)).encode())
+        key = digest.hexdigest()[:20]
+        return self.cache_dir / f"{key}_map1.npy", self.cache_dir / f"{key}_map2.npy"
+
+    def _load_cached(self, paths):
+        if not all(path.exists() for path in paths):
+            return None
+        try:
+            return tuple(np.load(path, mmap_mode='r') for path in paths)
+        except (OSError, ValueError) as e:
+            print(f"⚠️ Ignoring broken undistortion map cache {paths[0].name}: {e}")
+            return None
+
+    def _save_cached(self, paths, maps):
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            for path, array in zip(paths, maps):
+                # Write then rename, so a concurrent reader never sees a half-written file
+                tmp = path.with_name(f"{path.stem}.{os.getpid()}.tmp.npy")
+                np.save(tmp, array)
+                os.replace(tmp, path)
+        except OSError as e:
+            print(f"⚠️ Could not cache undistortion maps: {e}")
+
+
+# -----------------------------
+# Preallocated frame ring
+# -----------------------------
+class CameraFrame:
+    """
+    Read-only, zero-copy lease on one ring slot.
+
+    The slot is not overwritten by the capture thread until release() is called
+    (or the `with` block exits).
+    """
+
+    __slots__ = ("image", "seq", "timestamp", "compressed", "_ring", "_index")
+
+    def __init__(self, image, seq, timestamp, ring, index, compressed=None):
+        self.image = image
+        self.seq = seq
+        self.timestamp = timestamp  # time.monotonic() right after cap.read() returned
+        self.compressed = compressed  # raw MJPEG bytes in preview_scale mode, else None
+        self._ring = ring
+        self._index = index
+
+    def release(self):
+        if self._ring is not None:
+            self._ring._unpin(self._index)
+            self._ring = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.release()
+
+
+class FrameRing:
+    """
+    Small ring of preallocated frame buffers filled in place by cap.read(buffer).
+
+    Each published slot carries a sequence number and capture timestamp. Slots pinned
+    by readers are skipped by the writer, so leases stay valid until released.
+    """
+
+    def __init__(self, slots, shape, dtype=np.uint8):
+        self.buffers = [np.empty(shape, dtype=dtype) for _ in range(slots)]
+        self._pins = [0] * slots
+        self._seqs = [0] * slots
+        self._timestamps = [0.0] * slots
+        self._compressed = [None] * slots
+        self._shared = [False] * slots   # buffer was handed to frame listeners, never refill it
+        self._latest = None
+        self.seq = 0
+        self.closed = False
+        self._cond = threading.Condition()
+
+    def acquire_write(self):
+        """Index of a slot the writer may fill, or None if every other slot is pinned."""
+        with self._cond:
+            for offset in range(1, len(self.buffers) + 1):
+                index = ((self._latest if self._latest is not None else -1) + offset) % len(self.buffers)
+                if index != self._latest and self._pins[index] == 0:
+                    # Pin for the writer so readers cannot lease a half-written slot
+                    self._pins[index] = 1
+                    return index
+            return None
+
+    def write_buffer(self, index):
+        """Buffer to read the next frame into, or None if the slot's array was handed off."""
+        return None if self._shared[index] else self.buffers[index]
+
+    def publish(self, index, buffer, timestamp, compressed=None, shared=False):
+        """
+        Make a filled slot the latest frame; buffer replaces the slot if cap.read reallocated.
+        With shared=True the buffer is also owned by someone else and is not refilled later.
+        """
+        with self._cond:
+            self.buffers[index] = buffer
+            self._shared[index] = shared
+            self._compressed[index] = compressed
+            self._pins[index] -= 1
+            self.seq += 1
+            self._seqs[index] = self.seq
+            self._timestamps[index] = timestamp
+            self._latest = index
+            self._cond.notify_all()
+
+    def abandon(self, index):
+        with self._cond:
+            self._pins[index] -= 1
+
+    def latest(self):
+        """Lease on the newest frame, or None if nothing was captured yet."""
+        with self._cond:
+            return self._lease_latest()
+
+    def wait_for_new(self, after_seq, timeout=None):
+        """Block until a frame newer than after_seq is published; lease or None on timeout."""
+        with self._cond:
+            self._cond.wait_for(lambda: self.seq > after_seq or self.closed, timeout=timeout)
+            if self.closed or self.seq <= after_seq:
+                return None
+            return self._lease_latest()
+
+    def close(self):
+        """Wake all waiters; wait_for_new() returns None from now on."""
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+
+    def _lease_latest(self):
+        index = self._latest
+        if index is None:
+            return None
+        self._pins[index] += 1
+        view = self.buffers[index].view()
+        view.flags.writeable = False
+        return CameraFrame(view, self._seqs[index], self._timestamps[index], self, index,
+                           self._compressed[index])
+
+    def _unpin(self, index):
+        with self._cond:
+            self._pins[index] -= 1
 
 
 # -----------------------------
 # Thread-Safe Camera Reader (undistort in get_image)
 # -----------------------------
 class ThreadSafeCameraReader:
-    def __init__(self, camera_id=4, calibration_file=None):
+    # JPEG-native reduced decode: DCT scaling, much cheaper than decode + resize
+    REDUCED_DECODE_FLAGS = {
+        1: cv2.IMREAD_COLOR,
+        2: cv2.IMREAD_REDUCED_COLOR_2,
+        4: cv2.IMREAD_REDUCED_COLOR_4,
+        8: cv2.IMREAD_REDUCED_COLOR_8,
+    }
+    REQUESTED_MODE = ("MJPG", 8000, 6000, 5)  # fourcc, width, height, fps
+    MODE_CACHE_FILE = Path.home() / ".cache" / "cnc_control" / "camera_modes.json"
+
+    def __init__(self, camera_id=4, calibration_file=None, buffers=3, preview_scale=None,
+                 undistort_threads=None):
         """
         Initialize thread-safe camera reader.
         Undistortion (if any) is applied ONLY in get_image(), not in capture thread.
+        Frames are captured into a ring of `buffers` preallocated slots, no per-frame copies.
+
+        With `preview_scale` set, the reader pulls raw MJPEG bytes from the backend
+        (CAP_PROP_FORMAT=-1) and decodes ring frames at 1/preview_scale resolution.
+        The compressed frame is kept, and full resolution is decoded only on demand
+        by get_image() / get_full_resolution().
 
         Args:
             camera_id (int or str): Camera index or video path
             calibration_file (str or None): Path to .json/.npz for undistortion.
+            buffers (int): Ring size; at least 2 (one being written, one readable).
+            preview_scale (int or None): 1, 2, 4 or 8 for raw MJPEG mode; None decodes in the backend.
+            undistort_threads (int or None): Remap full frames in bands on this many threads
+                (TiledUndistortEngine); None undistorts on the calling thread.
         """
+        if preview_scale is not None and preview_scale not in self.REDUCED_DECODE_FLAGS:
+            raise ValueError("preview_scale must be one of 1, 2, 4, 8 or None")
         self.camera_id = camera_id
         self.undistorter = None
         if calibration_file is not None:
             self.undistorter = FisheyeUndistorter(calibration_file)
+        self.undistort_engine = None
+        if self.undistorter is not None and undistort_threads:
+            self.undistort_engine = TiledUndistortEngine(self.undistorter, workers=undistort_threads)
 
         self.cap = cv2.VideoCapture(camera_id)
         if not self.cap.isOpened():
             raise RuntimeError(f"Cannot open camera {camera_id}")
-        self.cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc('M', 'J', 'P', 'G'))
-        # Set resolution and FPS 4608x3456
-        self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, 8000)
-        self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 6000)
-        self.cap.set(cv2.CAP_PROP_FPS, 5)
-        
-        self.width = int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-        self.height = int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-        print(f"📹 Camera opened: {self.width}x{self.height}")
+        cached = self._negotiate_mode()
+        print(f"📹 Camera opened: {self.width}x{self.height}" + (" (cached mode)" if cached else ""))
 
         # If undistorter is used, verify resolution matches
         if self.undistorter is not None:
@@ -97,52 +352,305 @@ class ThreadSafeCameraReader:
                     f"calibration resolution {self.undistorter.resolution}"
                 )
 
-        self._latest_raw_frame = None
-        self._frame_lock = threading.Lock()
+        self.preview_scale = None
+        self._pending_preview_scale = None  # set by fit_preview_scale(), applied by the capture thread
+        if preview_scale is not None:
+            if self.cap.set(cv2.CAP_PROP_FORMAT, -1):
+                self.preview_scale = preview_scale
+            else:
+                print("⚠️ Backend cannot deliver raw MJPEG, decoding full frames.")
+        scale = self.preview_scale or 1
+        self._ring = FrameRing(max(2, buffers), (-(-self.height // scale), -(-self.width // scale), 3))
+        self._full_cache = (None, None)  # (seq, full-resolution frame) of the last on-demand decode
+        self._local = threading.local()  # per-thread get_image() lease and undistort buffer
+        self._frame_listeners = ()        # callables fed by the capture thread, see add_frame_listener()
         self._running = True
         self._thread = threading.Thread(target=self._capture_loop, daemon=True)
         self._thread.start()
 
+    # -----------------------------
+    # Camera mode negotiation (cached per device)
+    # -----------------------------
+    def _device_key(self):
+        """Cache key: index plus V4L2 device name, so a different camera on the same index misses."""
+        if isinstance(self.camera_id, int):
+            try:
+                name = Path(f"/sys/class/video4linux/video{self.camera_id}/name").read_text().strip()
+                return f"{self.camera_id}:{name}"
+            except OSError:
+                pass
+        return str(self.camera_id)
+
+    def _load_mode_cache(self):
+        try:
+            with open(self.MODE_CACHE_FILE) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_mode_cache(self, cache):
+        try:
+            self.MODE_CACHE_FILE.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.MODE_CACHE_FILE.with_suffix(".tmp")
+            with open(tmp, "w") as f:
+                json.dump(cache, f, indent=2)
+            os.replace(tmp, self.MODE_CACHE_FILE)
+        except OSError as e:
+            print(f"⚠️ Could not cache camera mode: {e}")
+
+    def _set_if_changed(self, prop, value):
+        # Every set() may restart the V4L2 stream, skip the ones that change nothing
+        if self.cap.get(prop) != value:
+            self.cap.set(prop, value)
+
+    def _negotiate_mode(self):
+        """
+        Apply REQUESTED_MODE, or the mode the backend settled on last time for this device.
+
+        The first open lets the backend pick the nearest supported mode and stores
+        the result; later opens ask for that supported mode directly.
+
+        Returns:
+            bool: True if the cached mode was used.
+        """
+        key = self._device_key()
+        cache = self._load_mode_cache()
+        requested = list(self.REQUESTED_MODE)
+        mode = cache.get(key)
+        if mode is not None and mode.get("requested") != requested:
+            mode = None
+        fourcc, width, height, fps = (
+            (mode["fourcc"], mode["width"], mode["height"], mode["fps"]) if mode else requested)
+
+        self._set_if_changed(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*fourcc))
+        self._set_if_changed(cv2.CAP_PROP_FRAME_WIDTH, width)
+        self._set_if_changed(cv2.CAP_PROP_FRAME_HEIGHT, height)
+        self._set_if_changed(cv2.CAP_PROP_FPS, fps)
+        self.width = int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        self.height = int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+
+        if mode is not None and (self.width, self.height) == (mode["width"], mode["height"]):
+            return True
+        code = int(self.cap.get(cv2.CAP_PROP_FOURCC))
+        negotiated = "".join(chr((code >> (8 * i)) & 0xFF) for i in range(4)) if code else fourcc
+        cache[key] = {
+            "requested": requested,
+            "fourcc": negotiated if negotiated.isprintable() and negotiated.strip() else fourcc,
+            "width": self.width,
+            "height": self.height,
+            "fps": self.cap.get(cv2.CAP_PROP_FPS) or fps,
+        }
+        self._save_mode_cache(cache)
+        return False
+
+    @property
+    def frames_captured(self):
+        return self._ring.seq
+
     def _capture_loop(self):
-        """Capture raw frames in background."""
+        """Capture raw frames in background, in place into the ring."""
         while self._running:
-            ret, frame = self.cap.read()
+            index = self._ring.acquire_write()
+            if index is None:
+                # Every other slot is leased: keep the driver queue drained, drop the frame
+                self.cap.grab()
+                FRAMES_DROPPED.inc()
+                continue
+            self._apply_pending_preview_scale()
+            listeners = self._frame_listeners
+            if self.preview_scale is not None:
+                ret, frame, compressed = self._read_compressed()
+            else:
+                # Frames handed to listeners go into fresh arrays the ring never refills
+                buffer = None if listeners else self._ring.write_buffer(index)
+                ret, frame = self.cap.read() if buffer is None else self.cap.read(buffer)
+                compressed = None
+            timestamp = time.monotonic()
             if not ret:
+                self._ring.abandon(index)
+                FRAMES_FAILED.inc()
                 print("⚠️ Failed to read frame. Stopping capture.")
                 time.sleep(0.05)
                 continue
-            with self._frame_lock:
-                # Store RAW frame only
-                self._latest_raw_frame = frame.copy()
+            # cap.read() reallocates only if the frame size differs from the slot
+            self._ring.publish(index, frame, timestamp, compressed, shared=bool(listeners))
+            FRAMES_CAPTURED.inc()
+            for listener in listeners:
+                try:
+                    listener(self._ring.seq, timestamp, frame, compressed)
+                except Exception as e:
+                    print(f"❌ Frame listener failed: {e}")
 
             time.sleep(0.001)  # optional: reduce CPU
 
+    def _apply_pending_preview_scale(self):
+        """Switch preview_scale between frames, only ever from the capture thread."""
+        scale = self._pending_preview_scale
+        if scale is None:
+            return
+        self._pending_preview_scale = None
+        # Raw mode may have been disabled since the request was made
+        if self.preview_scale is not None:
+            self.preview_scale = scale
+
+    def _read_compressed(self):
+        """Read one MJPEG frame as bytes and decode a reduced-size preview from it."""
+        ret, raw = self.cap.read()
+        if not ret:
+            return False, None, None
+        if raw.ndim == 3:
+            # The backend decoded anyway (raw mode unsupported for this stream)
+            print("⚠️ Camera returned decoded frames, raw MJPEG mode disabled.")
+            self.preview_scale = None
+            return True, raw, None
+        preview = cv2.imdecode(raw, self.REDUCED_DECODE_FLAGS[self.preview_scale])
+        if preview is None:
+            return False, None, None
+        return True, preview, raw
+
+    def fit_preview_scale(self, width, height):
+        """
+        In raw MJPEG mode pick the largest reduced-decode factor that still covers a
+        width x height view. Safe to call from any thread: the value is only stored
+        here and the capture loop applies it before the next frame it reads.
+        """
+        if self.preview_scale is None:
+            return
+        for scale in (8, 4, 2, 1):
+            if self.width / scale >= width or self.height / scale >= height:
+                self._pending_preview_scale = scale
+                return
+
+    def get_full_resolution(self, frame=None):
+        """
+        Decode a frame at full sensor resolution (raw MJPEG mode).
+
+        Args:
+            frame (CameraFrame or None): Lease to decode; the latest frame if None.
+
+        Returns:
+            np.ndarray or None: Full-resolution BGR image (not undistorted).
+        """
+        lease = frame if frame is not None else self._ring.latest()
+        if lease is None:
+            return None
+        try:
+            if lease.compressed is None:
+                return lease.image.copy()
+            cached_seq, cached = self._full_cache
+            if cached_seq == lease.seq:
+                return cached
+            full = cv2.imdecode(lease.compressed, cv2.IMREAD_COLOR)
+            full.flags.writeable = False  # shared with later calls for the same frame
+            self._full_cache = (lease.seq, full)
+            return full
+        finally:
+            if frame is None:
+                lease.release()
+
+    def add_frame_listener(self, callback):
+        """
+        Have the capture thread pass every new frame to `callback` without pinning a slot.
+
+        callback(seq, timestamp, image, compressed) runs on the capture thread right after
+        the frame is published and must return quickly. `image` (read-only by convention)
+        and `compressed` are not reused by the ring while listeners exist, so the callee
+        may keep them.
+        """
+        self._frame_listeners = self._frame_listeners + (callback,)
+
+    def remove_frame_listener(self, callback):
+        self._frame_listeners = tuple(listener for listener in self._frame_listeners if listener != callback)
+
+    def get_frame(self):
+        """
+        Lease the latest raw frame without copying.
+
+        Returns:
+            CameraFrame or None: Read-only frame with seq/timestamp; call release() when done.
+        """
+        return self._ring.latest()
+
+    def wait_for_new(self, after_seq, timeout=None):
+        """
+        Block until a raw frame newer than `after_seq` arrives.
+
+        Args:
+            after_seq (int): Sequence number of the last frame the caller has seen (0 for any).
+            timeout (float or None): Seconds to wait.
+
+        Returns:
+            CameraFrame or None: Lease on the newest frame, or None on timeout/stop.
+        """
+        if not self._running:
+            return None
+        return self._ring.wait_for_new(after_seq, timeout)
+
     def get_image(self):
         """
         Get the latest frame, applying undistortion if enabled.
 
+        Without undistortion the result is a read-only view into the ring, valid until
+        the same thread's next get_image() or release_image() call: each thread holds its
+        own lease, so calls from different threads do not invalidate each other's views.
+        In raw MJPEG mode this decodes the latest frame at full resolution. With
+        undistort_threads the undistorted image is a per-thread output buffer, likewise
+        valid until that thread's next get_image() call. A thread that stops calling
+        get_image() should call release_image(), or its last slot stays pinned.
+
         Returns:
             np.ndarray or None: Undistorted (or raw) image, or None if not ready.
         """
-        with self._frame_lock:
-            if self._latest_raw_frame is None:
-                return None
-            frame = self._latest_raw_frame.copy()
+        start = time.perf_counter()
+        self.release_image()
+        if self.preview_scale is not None:
+            frame = self.get_full_resolution()
+            if frame is not None and self.undistorter is not None:
+                frame = self._undistort(frame)
+            GET_IMAGE_SECONDS.observe(time.perf_counter() - start)
+            return frame
+        lease = self._ring.latest()
+        if lease is None:
+            return None
 
-        # Apply undistortion OUTSIDE the lock (to avoid holding lock during processing)
+        # Apply undistortion while the slot is pinned, the remap output does not alias the ring
         if self.undistorter is not None:
             try:
-                frame = self.undistorter.undistort(frame)
+                frame = self._undistort(lease.image)
+                lease.release()
+                GET_IMAGE_SECONDS.observe(time.perf_counter() - start)
+                return frame
             except Exception as e:
                 print(f"❌ Undistortion failed in get_image(): {e}")
                 # Optionally return raw frame or None — here we return raw
                 # (you can change behavior as needed)
-        return frame
+        self._local.lease = lease
+        GET_IMAGE_SECONDS.observe(time.perf_counter() - start)
+        return lease.image
+
+    def _undistort(self, frame):
+        if self.undistort_engine is not None:
+            out = getattr(self._local, "undistort_out", None)
+            if out is None or out.shape != frame.shape or out.dtype != frame.dtype:
+                out = self._local.undistort_out = np.empty_like(frame)
+            return self.undistort_engine.undistort(frame, out=out)
+        return self.undistorter.undistort(frame)
+
+    def release_image(self):
+        """Release the view returned by this thread's last get_image()."""
+        lease = getattr(self._local, "lease", None)
+        self._local.lease = None
+        if lease is not None:
+            lease.release()
 
     def stop(self):
         """Stop background thread and release camera."""
         self._running = False
         self._thread.join()
+        self._ring.close()
+        self.release_image()
+        if self.undistort_engine is not None:
+            self.undistort_engine.close()
         self.cap.release()
         print("⏹️ Camera reader stopped.")
 
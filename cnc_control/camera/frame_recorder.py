@@ -0,0 +1,254 @@
+import os
+import threading
+import time
+from collections import deque
+
+import cv2
+
+
+# -----------------------------
+# Frame recorder (bounded queue + background encoders)
+# -----------------------------
+class FrameRecorder:
+    MODES = ("mjpeg", "images", "video")
+    POLICIES = ("drop_oldest", "block")
+
+    def __init__(self, camera, path, mode="mjpeg", policy="drop_oldest", queue_size=16,
+                 workers=2, fps=None, image_format="jpg", jpeg_quality=90, undistort=False):
+        """
+        Record what a ThreadSafeCameraReader captures without slowing the capture down.
+
+        The capture thread hands every new frame over as a frame listener (see
+        ThreadSafeCameraReader.add_frame_listener): the raw MJPEG bytes or the freshly
+        read image, without pinning a ring slot or copying. The frame goes into a bounded
+        queue; worker threads decode / encode and write. The capture thread never waits
+        for the recorder: if the queue is full, 'drop_oldest' discards the oldest queued
+        frame, 'block' keeps the queue and skips the new frame instead. Both are counted.
+
+        Memory use is bounded by queue_size frames (compressed bytes in raw MJPEG mode,
+        decoded images otherwise).
+
+        Args:
+            camera (ThreadSafeCameraReader): Running camera.
+            path (str): Output file (.mjpeg / video) or directory (images).
+            mode (str): 'mjpeg' (concatenated JPEG stream; raw camera bytes are passed
+                through without re-encoding), 'images' (one file per frame) or 'video'
+                (cv2.VideoWriter, MJPG fourcc).
+            policy (str): 'drop_oldest' or 'block' when the queue is full.
+            queue_size (int): Frames held between the capture thread and workers.
+            workers (int): Encoder threads.
+            fps (float or None): Video frame rate; the camera's FPS if None.
+            image_format (str): Extension for 'images' mode.
+            jpeg_quality (int): Quality when frames have to be (re-)encoded as JPEG.
+            undistort (bool): Undistort frames with the camera's calibration (disables
+                MJPEG passthrough).
+        """
+        if mode not in self.MODES:
+            raise ValueError(f"mode must be one of {self.MODES}")
+        if policy not in self.POLICIES:
+            raise ValueError(f"policy must be one of {self.POLICIES}")
+        self.camera = camera
+        self.path = path
+        self.mode = mode
+        self.policy = policy
+        self.queue_size = max(1, queue_size)
+        self.workers = max(1, workers)
+        self.fps = fps or camera.cap.get(cv2.CAP_PROP_FPS) or 5.0
+        self.image_format = image_format.lstrip(".").lower()
+        self.jpeg_quality = jpeg_quality
+        self.undistort = undistort and camera.undistorter is not None
+
+        # Counters: enqueued, dropped and missed change under _cond, written and failed under _write_lock
+        self.enqueued = 0   # frames accepted into the queue
+        self.written = 0    # frames on disk
+        self.dropped = 0    # frames discarded from the full queue (drop_oldest)
+        self.missed = 0     # new frames skipped because the queue was full ('block')
+        self.failed = 0     # frames that could not be encoded or written
+
+        self._queue = deque()
+        self._cond = threading.Condition()
+        self._results = {}                 # index -> payload, waiting for in-order write
+        self._write_lock = threading.Lock()
+        self._next_index = 0               # assigned when a worker takes a frame
+        self._next_write = 0
+        self._running = False
+        self._feeding = False
+        self._threads = []
+        self._sink = None
+        self._index_file = None
+        self.started_at = None
+
+    # -----------------------------
+    # Control
+    # -----------------------------
+    def start(self):
+        if self._running:
+            return self
+        if self.mode == "images":
+            os.makedirs(self.path, exist_ok=True)
+            index_path = os.path.join(self.path, "frames.csv")
+        else:
+            parent = os.path.dirname(os.path.abspath(self.path))
+            os.makedirs(parent, exist_ok=True)
+            index_path = os.path.splitext(self.path)[0] + ".csv"
+            if self.mode == "mjpeg":
+                self._sink = open(self.path, "wb")
+        # Capture timestamps (time.monotonic) for matching frames with machine positions
+        self._index_file = open(index_path, "w")
+        self._index_file.write("index,seq,timestamp\n")
+        self._running = True
+        self._feeding = True
+        self.started_at = time.monotonic()
+        self._threads = [threading.Thread(target=self._worker_loop, name=f"RecorderEncode{i}", daemon=True)
+                         for i in range(self.workers)]
+        for thread in self._threads:
+            thread.start()
+        self.camera.add_frame_listener(self._on_frame)
+        print(f"⏺️ Recording {self.mode} to {self.path}")
+        return self
+
+    def stop(self):
+        """Stop taking frames, write everything still queued and close the output."""
+        if not self._running:
+            return self.stats()
+        self.camera.remove_frame_listener(self._on_frame)
+        with self._cond:
+            self._feeding = False
+            self._running = False
+            self._cond.notify_all()
+        for thread in self._threads:
+            thread.join()
+        if self._sink is not None:
+            if self.mode == "video":
+                self._sink.release()
+            else:
+                self._sink.close()
+            self._sink = None
+        self._index_file.close()
+        stats = self.stats()
+        print(f"⏹️ Recording stopped: {stats['written']} written, {stats['dropped']} dropped, "
+              f"{stats['missed']} missed")
+        return stats
+
+    def stats(self):
+        elapsed = time.monotonic() - self.started_at if self.started_at else 0.0
+        with self._cond:
+            stats = {
+                "enqueued": self.enqueued,
+                "dropped": self.dropped,
+                "missed": self.missed,
+                "queued": len(self._queue),
+            }
+        with self._write_lock:
+            stats["written"] = self.written
+            stats["failed"] = self.failed
+        stats["write_fps"] = stats["written"] / elapsed if elapsed > 0 else 0.0
+        return stats
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    # -----------------------------
+    # Capture thread -> queue
+    # -----------------------------
+    def _on_frame(self, seq, timestamp, image, compressed):
+        """Frame listener: runs on the capture thread, so it only queues and never waits."""
+        item = (seq, timestamp, image if compressed is None else None, compressed)
+        with self._cond:
+            if not self._feeding:
+                return
+            if len(self._queue) >= self.queue_size:
+                if self.policy == "drop_oldest":
+                    self._queue.popleft()
+                    self.dropped += 1
+                else:
+                    self.missed += 1
+                    return
+            self._queue.append(item)
+            self.enqueued += 1
+            self._cond.notify_all()
+
+    # -----------------------------
+    # Workers: queue -> disk
+    # -----------------------------
+    def _worker_loop(self):
+        while True:
+            with self._cond:
+                while self._running and not self._queue:
+                    self._cond.wait()
+                if not self._queue:
+                    return
+                item = self._queue.popleft()
+                index = self._next_index
+                self._next_index += 1
+            try:
+                payload = self._encode(index, item)
+            except Exception as e:
+                print(f"❌ Recorder failed on frame {item[0]}: {e}")
+                payload = None  # counted as failed by _write_in_order
+            self._write_in_order(index, item, payload)
+
+    def _encode(self, index, item):
+        seq, timestamp, image, compressed = item
+        passthrough = compressed is not None and not self.undistort
+        if self.mode == "mjpeg" or (self.mode == "images" and self.image_format in ("jpg", "jpeg")):
+            if passthrough:
+                data = compressed.tobytes()
+            else:
+                ok, buf = cv2.imencode(".jpg", self._image(image, compressed),
+                                       [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality])
+                if not ok:
+                    raise IOError("JPEG encoding failed")
+                data = buf.tobytes()
+            if self.mode == "mjpeg":
+                return data
+            with open(self._image_path(index), "wb") as f:
+                f.write(data)
+            return True
+        if self.mode == "images":
+            if not cv2.imwrite(self._image_path(index), self._image(image, compressed)):
+                raise IOError(f"Could not write {self._image_path(index)}")
+            return True
+        return self._image(image, compressed)  # video: written in order by _sink_write
+
+    def _image(self, image, compressed):
+        if image is None:
+            image = cv2.imdecode(compressed, cv2.IMREAD_COLOR)
+        if self.undistort:
+            image = self.camera.undistorter.undistort(image)
+        return image
+
+    def _image_path(self, index):
+        return os.path.join(self.path, f"frame_{index:06d}.{self.image_format}")
+
+    def _write_in_order(self, index, item, payload):
+        """Queue the result and write every consecutive finished frame (single-file outputs need order)."""
+        with self._write_lock:
+            self._results[index] = (item, payload)
+            while self._next_write in self._results:
+                (seq, timestamp, _, _), payload = self._results.pop(self._next_write)
+                if payload is None:
+                    self.failed += 1
+                else:
+                    try:
+                        self._sink_write(payload)
+                        self._index_file.write(f"{self._next_write},{seq},{timestamp:.6f}\n")
+                        self.written += 1
+                    except Exception as e:
+                        print(f"❌ Recorder failed to write frame {seq}: {e}")
+                        self.failed += 1
+                self._next_write += 1
+
+    def _sink_write(self, payload):
+        if self.mode == "mjpeg":
+            self._sink.write(payload)
+        elif self.mode == "video":
+            if self._sink is None:
+                h, w = payload.shape[:2]
+                self._sink = cv2.VideoWriter(self.path, cv2.VideoWriter_fourcc(*"MJPG"), self.fps, (w, h))
+                if not self._sink.isOpened():
+                    raise IOError(f"Could not open video writer for {self.path}")
+            self._sink.write(payload)
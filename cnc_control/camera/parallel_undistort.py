@@ -0,0 +1,135 @@
+import os
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+from cnc_control.metrics import REGISTRY
+
+
+UNDISTORT_TILED_SECONDS = REGISTRY.histogram("camera_undistort_seconds", "Undistortion of one frame", {"kind": "tiled"})
+
+
+# -----------------------------
+# Band-parallel undistortion
+# -----------------------------
+class TiledUndistortEngine:
+    def __init__(self, undistorter, bands=None, workers=None, history=100):
+        """
+        Full-resolution undistortion split into horizontal bands remapped concurrently.
+
+        cv2.remap releases the GIL, so a plain thread pool scales across cores. Each band
+        reads from the whole source frame (the map decides where) and writes into its rows
+        of a preallocated output buffer.
+
+        Args:
+            undistorter (FisheyeUndistorter): Provides resolution and full-size map1/map2.
+            bands (int or None): Number of horizontal bands; 2 per worker by default.
+            workers (int or None): Thread pool size; os.cpu_count() by default.
+            history (int): How many per-frame timings to keep in `timings`.
+        """
+        self.undistorter = undistorter
+        self.workers = workers or os.cpu_count() or 1
+        self.bands = bands or 2 * self.workers
+        width, height = undistorter.resolution
+        self.output = np.empty((height, width, 3), dtype=np.uint8)
+        self.timings = deque(maxlen=history)   # seconds per undistort() call
+        self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="Undistort")
+        self._slices = self._band_slices(height, self.bands)
+
+    @staticmethod
+    def _band_slices(height, bands):
+        edges = np.linspace(0, height, min(bands, height) + 1).astype(int)
+        return [slice(y0, y1) for y0, y1 in zip(edges[:-1], edges[1:]) if y1 > y0]
+
+    def undistort(self, frame, out=None):
+        """
+        Undistort one full-resolution frame.
+
+        Args:
+            frame (np.ndarray): BGR frame at calibration resolution.
+            out (np.ndarray or None): Destination; the engine's own buffer if None.
+
+        Returns:
+            np.ndarray: `out`, or the internal buffer (valid until the next call).
+        """
+        width, height = self.undistorter.resolution
+        if frame.shape[1] != width or frame.shape[0] != height:
+            raise ValueError(
+                f"Frame resolution {frame.shape[1]}x{frame.shape[0]} "
+                f"doesn't match calibration {width}x{height}"
+            )
+        if out is None:
+            if self.output.shape != frame.shape or self.output.dtype != frame.dtype:
+                self.output = np.empty_like(frame)
+            out = self.output
+        start = time.perf_counter()
+        map1, map2 = self.undistorter.map1, self.undistorter.map2
+        futures = [
+            self._pool.submit(self._remap_band, frame, map1[band], map2[band], out[band])
+            for band in self._slices
+        ]
+        for future in futures:
+            future.result()
+        elapsed = time.perf_counter() - start
+        self.timings.append(elapsed)
+        UNDISTORT_TILED_SECONDS.observe(elapsed)
+        return out
+
+    @staticmethod
+    def _remap_band(frame, map1, map2, dst):
+        result = cv2.remap(frame, map1, map2, interpolation=cv2.INTER_LINEAR, dst=dst)
+        if result is not dst and not np.shares_memory(result, dst):
+            dst[...] = result
+
+    def undistort_batch(self, frames):
+        """
+        Undistort a sequence of frames; yields into the internal buffer, copy to keep.
+
+        Args:
+            frames (iterable): Full-resolution BGR frames.
+
+        Yields:
+            np.ndarray: Undistorted frame (overwritten by the next one).
+        """
+        for frame in frames:
+            yield self.undistort(frame)
+
+    def stats(self):
+        """Per-frame timing summary in milliseconds."""
+        if not self.timings:
+            return {"frames": 0, "bands": self.bands, "workers": self.workers}
+        ms = np.asarray(self.timings) * 1000.0
+        return {
+            "frames": int(ms.size),
+            "bands": self.bands,
+            "workers": self.workers,
+            "mean_ms": float(ms.mean()),
+            "p50_ms": float(np.percentile(ms, 50)),
+            "max_ms": float(ms.max()),
+        }
+
+    def tune(self, frame, band_counts=(1, 2, 4, 8, 16, 32), repeats=3):
+        """
+        Time undistort() for several band counts on this CPU and keep the fastest.
+
+        Returns:
+            dict: {bands: mean ms}.
+        """
+        results = {}
+        for bands in band_counts:
+            self._slices = self._band_slices(frame.shape[0], bands)
+            samples = []
+            for _ in range(repeats):
+                start = time.perf_counter()
+                self.undistort(frame)
+                samples.append(time.perf_counter() - start)
+            results[bands] = 1000.0 * sum(samples) / len(samples)
+        self.bands = min(results, key=results.get)
+        self._slices = self._band_slices(frame.shape[0], self.bands)
+        return results
+
+    def close(self):
+        self._pool.shutdown(wait=True)
@@ -0,0 +1,211 @@
+import threading
+import time
+import queue
+import logging
+from collections import deque
+from concurrent.futures import Future
+
+import serial
+
+from cnc_control.metrics import REGISTRY
+
+# Метрики обмена (общий реестр, см. cnc_control/metrics.py)
+COMMAND_SECONDS = REGISTRY.histogram("grbl_command_seconds", "Time from writing a line to its ok/error")
+COMMAND_ERRORS = REGISTRY.counter("grbl_command_errors_total", "Lines answered with error:N")
+ALARMS = REGISTRY.counter("grbl_alarms_total", "ALARM messages from GRBL")
+RESETS = REGISTRY.counter("grbl_resets_total", "GRBL startup banners (reset or reboot)")
+
+
+class GrblError(RuntimeError):
+    """Ошибка обмена с GRBL (сброс контроллера, обрыв порта, отказ команды)"""
+
+
+class GrblResponse:
+    """Ответ GRBL на одну строку: финальный ok/error:N и все сообщения перед ним"""
+
+    __slots__ = ("command", "status", "lines", "latency")
+
+    def __init__(self, command, status, lines, latency):
+        self.command = command
+        self.status = status      # 'ok' или 'error:N'
+        self.lines = lines        # например [GC:...] для $G или $N=... для $$
+        self.latency = latency    # время от записи в порт до ответа, с
+
+    @property
+    def ok(self):
+        return self.status == "ok"
+
+    @property
+    def error_code(self):
+        if self.ok:
+            return None
+        return int(self.status.split(":", 1)[1])
+
+    def __repr__(self):
+        return f"GrblResponse({self.command!r}, {self.status!r}, {self.latency * 1000:.1f} ms)"
+
+
+class GrblSerialIO:
+    """
+    Фоновый поток, владеющий serial.Serial.
+
+    Входящие байты режутся на строки по мере поступления и раскладываются по адресатам:
+    ok/error:N завершают Future ожидающей команды (в порядке отправки), отчёты <...> идут
+    в status_queue, ALARM, [MSG:] и баннер сброса — в колбэки тревог. Никаких фиксированных
+    задержек: задержка команды равна реальному времени обмена.
+
+    trace (SerialTrace or None) получает копию всех записанных и прочитанных байтов.
+    """
+
+    STATUS_QUEUE_SIZE = 64
+    LATENCY_HISTORY = 1000
+
+    def __init__(self, serial_port_object, logger=None, trace=None):
+        self.serial_port_object = serial_port_object
+        self.logger = logger or logging.getLogger("GrblSerialIO")
+        self.trace = trace
+
+        self.status_queue = queue.Queue(maxsize=self.STATUS_QUEUE_SIZE)
+        self.latencies = deque(maxlen=self.LATENCY_HISTORY)
+        self.last_latency = None
+
+        self._pending = deque()          # [command, future, lines, t_sent]
+        self._write_lock = threading.Lock()
+        self._alarm_callbacks = []
+        self._buffer = bytearray()
+        self._running = False
+        self._thread = None
+
+    # --- Жизненный цикл ---
+    def start(self):
+        self._running = True
+        self._thread = threading.Thread(target=self._reader_loop, name="GrblSerialIO", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._running = False
+        try:
+            self.serial_port_object.cancel_read()
+        except Exception:
+            pass
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+        self._fail_pending(GrblError("Serial I/O stopped"))
+
+    # --- Отправка ---
+    def send_command(self, command):
+        """Отправляет строку G-кода, возвращает Future с GrblResponse"""
+        future = Future()
+        with self._write_lock:
+            # Сначала в очередь, потом в порт: ответ не может прийти раньше записи
+            data = (command + '\n').encode()
+            if self.trace is not None:
+                # До записи: иначе ответ может попасть в трассу раньше команды
+                self.trace.tx(data)
+            self._pending.append([command, future, [], time.perf_counter()])
+            self.serial_port_object.write(data)
+        return future
+
+    def write_realtime(self, byte):
+        """Real-time команда (?, !, ~, 0x18, 0x85, ...): не буферизуется и не получает ok"""
+        if isinstance(byte, int):
+            byte = bytes((byte,))
+        with self._write_lock:
+            if self.trace is not None:
+                self.trace.tx(byte)
+            self.serial_port_object.write(byte)
+
+    def add_alarm_callback(self, callback):
+        """callback(line) вызывается из потока чтения для ALARM:N, [MSG:...] и баннера после сброса"""
+        self._alarm_callbacks.append(callback)
+
+    @property
+    def pending_count(self):
+        return len(self._pending)
+
+    # --- Чтение и разбор ---
+    def _reader_loop(self):
+        while self._running:
+            try:
+                data = self.serial_port_object.read(self.serial_port_object.in_waiting or 1)
+            except (serial.SerialException, OSError, TypeError) as e:
+                if self._running:
+                    self.logger.error(f"Serial read failed: {e}")
+                    self._running = False
+                    self._fail_pending(GrblError(f"Serial read failed: {e}"))
+                return
+            if data:
+                if self.trace is not None:
+                    self.trace.rx(data)
+                self._feed(data)
+
+    def _feed(self, data):
+        self._buffer += data
+        while True:
+            end = self._buffer.find(b'\n')
+            if end < 0:
+                return
+            line = self._buffer[:end].decode('utf-8', errors='replace').strip()
+            del self._buffer[:end + 1]
+            if line:
+                self._dispatch(line)
+
+    def _dispatch(self, line):
+        if line == 'ok' or line.startswith('error'):
+            self._complete(line)
+        elif line.startswith('<'):
+            self._put_status(line)
+        elif line.startswith('ALARM') or line.startswith('[MSG:'):
+            if line.startswith('ALARM'):
+                ALARMS.inc()
+                self.logger.warning(f"[ALARM] {line}")
+            else:
+                self.logger.info(f"[MSG] {line}")
+            self._notify_alarm(line)
+        elif line.startswith('Grbl '):
+            # Баннер после сброса: всё, что лежало в буфере GRBL, потеряно
+            RESETS.inc()
+            self.logger.info(f"[BANNER] {line}")
+            self._fail_pending(GrblError(f"GRBL was reset: {line}"))
+            self._notify_alarm(line)
+        elif self._pending:
+            self._pending[0][2].append(line)
+        else:
+            self.logger.debug(f"[RESP] {line}")
+
+    def _notify_alarm(self, line):
+        for callback in list(self._alarm_callbacks):
+            try:
+                callback(line)
+            except Exception as e:
+                self.logger.error(f"Alarm callback failed: {e}")
+
+    def _complete(self, status):
+        if not self._pending:
+            self.logger.warning(f"Unexpected response without pending command: {status}")
+            return
+        command, future, lines, t_sent = self._pending.popleft()
+        latency = time.perf_counter() - t_sent
+        self.last_latency = latency
+        self.latencies.append(latency)
+        COMMAND_SECONDS.observe(latency)
+        if status != 'ok':
+            COMMAND_ERRORS.inc()
+        future.set_result(GrblResponse(command, status, lines, latency))
+
+    def _put_status(self, line):
+        try:
+            self.status_queue.put_nowait(line)
+        except queue.Full:
+            # Никто не забирает отчёты — выбрасываем самый старый
+            try:
+                self.status_queue.get_nowait()
+            except queue.Empty:
+                pass
+            self.status_queue.put_nowait(line)
+
+    def _fail_pending(self, exc):
+        while self._pending:
+            future = self._pending.popleft()[1]
+            if not future.done():
+                future.set_exception(exc)
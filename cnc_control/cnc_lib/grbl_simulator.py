@@ -0,0 +1,459 @@
+import os
+import re
+import pty
+import tty
+import math
+import time
+import argparse
+import threading
+import logging
+from collections import deque
+
+
+class GrblSimulator:
+    """
+    Симулятор GRBL 1.1 на псевдотерминале: CncMachineDriver(port=sim.port, ...) подключается
+    к нему как к настоящему контроллеру, железо не нужно.
+
+    Моделируется:
+      * приёмный буфер на RX_BUFFER_SIZE байт (переполнение считается в rx_overflows);
+      * очередь планировщика на PLANNER_BLOCKS блоков: пока она полна, ok на строку не приходит;
+      * ok / error:N, ALARM:N, баннер после сброса;
+      * real-time байты: ?, !, ~, 0x18, 0x85 и коррекции подачи 0x90-0x94;
+      * $X, $H, $J=, $G, $I, $$, $RST=#, G10 L20, G4, G0/G1/G2/G3 (дуги — как прямые до конечной точки).
+
+    Args:
+        response_latency (float): Задержка ответа на каждую строку, с.
+        time_scale (float): Множитель длительности движений (0 — мгновенно, 1 — реальное время).
+        rapid_rate (float): Скорость G0 и $H, мм/мин.
+        boot_delay (float): Задержка перед баннером при старте и после сброса, с.
+        travel (tuple or None): ((xmin, xmax), (ymin, ymax), (zmin, zmax)) для мягких пределов.
+    """
+
+    RX_BUFFER_SIZE = 128
+    PLANNER_BLOCKS = 15
+    VERSION = "1.1h"
+    BANNER = f"Grbl {VERSION} ['$' for help]"
+    MOTION_TICK = 0.002
+
+    _WORD_RE = re.compile(r'([A-Z])([-+]?\d*\.?\d+)')
+
+    def __init__(self, response_latency=0.0, time_scale=1.0, rapid_rate=3000.0,
+                 boot_delay=0.0, travel=None):
+        self.response_latency = response_latency
+        self.time_scale = time_scale
+        self.rapid_rate = rapid_rate
+        self.boot_delay = boot_delay
+        self.travel = travel
+        self.logger = logging.getLogger("GrblSimulator")
+
+        self.rx_overflows = 0
+        self.lines_received = 0
+        self.port = None
+
+        self._master = None
+        self._slave = None
+        self._cond = threading.Condition()
+        self._write_lock = threading.Lock()
+        self._rx = bytearray()
+        self._planner = deque()
+        self._status_reports = 0
+        self._wco_changed = True
+        self._booting = True   # как у загрузчика Arduino: до баннера входящие байты теряются
+        self._running = False
+        self._threads = []
+        self._reset_state()
+
+    def _reset_state(self):
+        self.state = 'Idle'
+        self.mpos = getattr(self, 'mpos', [0.0, 0.0, 0.0])
+        self.wco = getattr(self, 'wco', [0.0, 0.0, 0.0])
+        self.feed = 0.0
+        self.current_feed = 0.0
+        self.feed_override = 100
+        self.modal = {'motion': 'G0', 'wcs': 'G54', 'plane': 'G17', 'units': 'G21',
+                      'distance': 'G90', 'feed_mode': 'G94'}
+        self._hold = False
+        self._block = None
+        self._rx.clear()
+        self._planner.clear()
+
+    # --- Жизненный цикл ---
+    def start(self):
+        self._master, self._slave = pty.openpty()
+        tty.setraw(self._slave)
+        self.port = os.ttyname(self._slave)
+        self._running = True
+        for target in (self._reader_loop, self._protocol_loop, self._motion_loop):
+            thread = threading.Thread(target=target, name=f"GrblSimulator{target.__name__}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        threading.Thread(target=self._boot, daemon=True).start()
+        self.logger.info(f"GRBL simulator on {self.port}")
+        return self
+
+    def stop(self):
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        for fd in (self._slave, self._master):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+        for thread in self._threads:
+            thread.join(timeout=1)
+        self._threads = []
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def trigger_alarm(self, code=1):
+        """Тревога как от концевика: движение сбрасывается, GRBL ждёт $X или сброса"""
+        with self._cond:
+            self._planner.clear()
+            self._block = None
+            self.state = 'Alarm'
+            self._cond.notify_all()
+        self._write_line(f"ALARM:{code}")
+
+    @property
+    def wpos(self):
+        return [m - o for m, o in zip(self.mpos, self.wco)]
+
+    # --- Вывод ---
+    def _write_line(self, line):
+        with self._write_lock:
+            try:
+                os.write(self._master, (line + '\r\n').encode())
+            except OSError:
+                pass
+
+    def _boot(self):
+        time.sleep(self.boot_delay)
+        self._write_line("")
+        self._write_line(self.BANNER)
+        self._booting = False
+
+    # --- Приём байт (real-time команды обрабатываются сразу) ---
+    def _reader_loop(self):
+        while self._running:
+            try:
+                data = os.read(self._master, 1024)
+            except OSError:
+                return
+            for byte in data:
+                self._receive_byte(byte)
+
+    def _receive_byte(self, byte):
+        if self._booting:
+            return
+        if byte == ord('?'):
+            self._write_line(self._status_report())
+        elif byte == ord('!'):
+            with self._cond:
+                if self.state in ('Run', 'Jog'):
+                    self._hold = True
+                    self.state = 'Hold:0'
+        elif byte == ord('~'):
+            with self._cond:
+                if self._hold:
+                    self._hold = False
+                    self.state = 'Run' if self._block or self._planner else 'Idle'
+                    self._cond.notify_all()
+        elif byte == 0x18:
+            with self._cond:
+                self._booting = True
+                self._reset_state()
+                self._cond.notify_all()
+            threading.Thread(target=self._boot, daemon=True).start()
+        elif byte == 0x85:
+            with self._cond:
+                if self.state == 'Jog' or (self._block and self._block[3]):
+                    self._planner.clear()
+                    self._block = None
+                    self.state = 'Idle'
+                    self._cond.notify_all()
+        elif 0x90 <= byte <= 0x94:
+            with self._cond:
+                step = {0x90: None, 0x91: 10, 0x92: -10, 0x93: 1, 0x94: -1}[byte]
+                self.feed_override = 100 if step is None else min(200, max(10, self.feed_override + step))
+        elif byte >= 0x80:
+            pass  # остальные расширенные real-time команды игнорируются
+        else:
+            with self._cond:
+                if len(self._rx) >= self.RX_BUFFER_SIZE:
+                    self.rx_overflows += 1
+                    self.logger.warning("RX buffer overflow, byte dropped")
+                    return
+                self._rx.append(byte)
+                if byte == ord('\n'):
+                    self._cond.notify_all()
+
+    def _status_report(self):
+        with self._cond:
+            fields = [self.state,
+                      "MPos:" + ",".join(f"{v:.3f}" for v in self.mpos),
+                      f"Bf:{self.PLANNER_BLOCKS - len(self._planner)},{self.RX_BUFFER_SIZE - len(self._rx)}",
+                      f"FS:{self.current_feed:.0f},0"]
+            if self._status_reports % 10 == 0 or self._wco_changed:
+                self._wco_changed = False
+                fields.append("WCO:" + ",".join(f"{v:.3f}" for v in self.wco))
+            if self.feed_override != 100 and self._status_reports % 10 == 1:
+                fields.append(f"Ov:{self.feed_override},100,100")
+            self._status_reports += 1
+        return "<" + "|".join(fields) + ">"
+
+    # --- Исполнение строк ---
+    def _protocol_loop(self):
+        while True:
+            with self._cond:
+                while self._running and b'\n' not in self._rx:
+                    self._cond.wait()
+                if not self._running:
+                    return
+                end = self._rx.index(b'\n')
+                line = self._rx[:end].decode('ascii', errors='replace').strip()
+                del self._rx[:end + 1]
+            if not line:
+                continue
+            self.lines_received += 1
+            try:
+                response = self._execute(line)
+            except Exception as e:
+                self.logger.error(f"Simulator failed on {line!r}: {e}")
+                response = "error:1"
+            if self.response_latency:
+                time.sleep(self.response_latency)
+            if response:
+                self._write_line(response)
+
+    def _execute(self, line):
+        upper = line.upper().replace(' ', '')
+        if upper.startswith('$'):
+            return self._execute_system(upper)
+        if self.state == 'Alarm':
+            return "error:9"
+        return self._execute_gcode(upper)
+
+    def _execute_system(self, line):
+        if line == '$X':
+            with self._cond:
+                if self.state == 'Alarm':
+                    self.state = 'Idle'
+            self._write_line("[MSG:Caution: Unlocked]")
+            return "ok"
+        if line == '$H':
+            return self._home()
+        if line.startswith('$J='):
+            if self.state == 'Alarm':
+                return "error:9"
+            return self._jog(line[3:])
+        if line == '$G':
+            words = [self.modal[k] for k in ('motion', 'wcs', 'plane', 'units', 'distance', 'feed_mode')]
+            self._write_line(f"[GC:{' '.join(words)} M5 M9 T0 F{self.feed:g} S0]")
+            return "ok"
+        if line == '$I':
+            self._write_line(f"[VER:{self.VERSION}.20190825:]")
+            self._write_line(f"[OPT:V,{self.PLANNER_BLOCKS},{self.RX_BUFFER_SIZE}]")
+            return "ok"
+        if line == '$$':
+            for setting in ("$10=1", "$110=3000.000", "$111=3000.000", "$112=500.000",
+                            "$120=100.000", "$121=100.000", "$122=100.000"):
+                self._write_line(setting)
+            return "ok"
+        if line.startswith('$RST='):
+            self.wco = [0.0, 0.0, 0.0]
+            self._wco_changed = True
+            return "ok"
+        return "error:3"
+
+    def _home(self):
+        self._wait_planner_empty()
+        with self._cond:
+            self.state = 'Home'
+        distance = math.dist(self.mpos, (0.0, 0.0, 0.0))
+        self._sleep_motion(distance / (self.rapid_rate / 60.0))
+        with self._cond:
+            self.mpos = [0.0, 0.0, 0.0]
+            self.state = 'Idle'
+        return "ok"
+
+    def _jog(self, line):
+        words = self._parse_words(line)
+        if words is None or 'F' not in words:
+            return "error:2" if words is None else "error:22"
+        relative = self.modal['distance'] == 'G91'
+        scale = 25.4 if self.modal['units'] == 'G20' else 1.0
+        for g in words.get('G', []):
+            if g in (90, 91):
+                relative = g == 91
+            elif g in (20, 21):
+                scale = 25.4 if g == 20 else 1.0
+        target = self._target(words, relative, scale)
+        if not self._within_travel(target):
+            return "error:15"
+        self._queue_block(target, words['F'][-1] * scale, jog=True)
+        return "ok"
+
+    def _execute_gcode(self, line):
+        words = self._parse_words(line)
+        if words is None:
+            return "error:2"
+        gcodes = words.get('G', [])
+        for g in gcodes:
+            if g in (20, 21):
+                self.modal['units'] = f"G{g:g}"
+            elif g in (90, 91):
+                self.modal['distance'] = f"G{g:g}"
+            elif g in (17, 18, 19):
+                self.modal['plane'] = f"G{g:g}"
+            elif 54 <= g <= 59:
+                self.modal['wcs'] = f"G{g:g}"
+            elif g in (0, 1, 2, 3):
+                self.modal['motion'] = f"G{g:g}"
+            elif g == 94:
+                self.modal['feed_mode'] = "G94"
+            elif g not in (4, 10):
+                return "error:20"
+        scale = 25.4 if self.modal['units'] == 'G20' else 1.0
+        if 'F' in words:
+            self.feed = words['F'][-1] * scale
+        if 10 in gcodes:
+            if words.get('L', [None])[-1] != 20:
+                return "error:20"
+            with self._cond:
+                for i, axis in enumerate('XYZ'):
+                    if axis in words:
+                        self.wco[i] = self.mpos[i] - words[axis][-1] * scale
+                self._wco_changed = True
+            return "ok"
+        if 4 in gcodes:
+            self._wait_planner_empty()
+            self._sleep_motion(words.get('P', [0])[-1])
+            return "ok"
+        if any(axis in words for axis in 'XYZ'):
+            target = self._target(words, self.modal['distance'] == 'G91', scale)
+            if not self._within_travel(target):
+                self.trigger_alarm(2)
+                return None
+            if self.modal['motion'] == 'G0':
+                feed = self.rapid_rate
+            elif self.feed <= 0:
+                return "error:22"
+            else:
+                feed = self.feed
+            self._queue_block(target, feed, jog=False)
+        return "ok"
+
+    def _parse_words(self, line):
+        words = {}
+        consumed = 0
+        for match in self._WORD_RE.finditer(line):
+            if match.start() != consumed:
+                return None
+            consumed = match.end()
+            words.setdefault(match.group(1), []).append(float(match.group(2)))
+        if consumed != len(line):
+            return None
+        return words
+
+    def _target(self, words, relative, scale):
+        # Цель считается от конца последнего запланированного блока
+        with self._cond:
+            if self._planner:
+                base = list(self._planner[-1][0])
+            elif self._block is not None:
+                base = list(self._block[0])
+            else:
+                base = list(self.mpos)
+        for i, axis in enumerate('XYZ'):
+            if axis in words:
+                value = words[axis][-1] * scale
+                base[i] = base[i] + value if relative else value + self.wco[i]
+        return tuple(base)
+
+    def _within_travel(self, target):
+        if self.travel is None:
+            return True
+        return all(lo <= v <= hi for v, (lo, hi) in zip(target, self.travel))
+
+    # --- Планировщик и движение ---
+    def _queue_block(self, target, feed, jog):
+        with self._cond:
+            # Пока планировщик полон, ok не отправляется — как в настоящем GRBL
+            while self._running and len(self._planner) >= self.PLANNER_BLOCKS:
+                self._cond.wait()
+            self._planner.append((target, feed, time.monotonic(), jog))
+            if not self._hold:
+                self.state = 'Jog' if jog else 'Run'
+            self._cond.notify_all()
+
+    def _wait_planner_empty(self):
+        with self._cond:
+            while self._running and (self._planner or self._block is not None):
+                self._cond.wait()
+
+    def _sleep_motion(self, seconds):
+        if self.time_scale and seconds > 0:
+            time.sleep(seconds * self.time_scale)
+
+    def _motion_loop(self):
+        while True:
+            with self._cond:
+                while self._running and (not self._planner or self._hold):
+                    self._cond.wait()
+                if not self._running:
+                    return
+                self._block = self._planner.popleft()
+                self._cond.notify_all()
+                target, feed, _, jog = self._block
+                start = list(self.mpos)
+            distance = math.dist(start, target)
+            duration = distance / (feed / 60.0) * self.time_scale if feed > 0 else 0.0
+            progress = 0.0
+            last = time.monotonic()
+            while progress < 1.0:
+                time.sleep(self.MOTION_TICK if duration > 0 else 0)
+                now = time.monotonic()
+                with self._cond:
+                    if self._block is None or not self._running:
+                        break  # jog cancel, сброс или тревога
+                    if not self._hold:
+                        rate = self.feed_override / 100.0 if not jog else 1.0
+                        progress = 1.0 if duration <= 0 else min(1.0, progress + (now - last) * rate / duration)
+                        self.mpos = [s + (t - s) * progress for s, t in zip(start, target)]
+                        self.current_feed = feed * (rate if duration > 0 else 0)
+                last = now
+            with self._cond:
+                if self._block is not None:
+                    self._block = None
+                if not self._planner and not self._hold and self.state in ('Run', 'Jog'):
+                    self.state = 'Idle'
+                    self.current_feed = 0.0
+                self._cond.notify_all()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="GRBL simulator on a pseudo-terminal")
+    parser.add_argument("--latency", type=float, default=0.0, help="response latency per line, s")
+    parser.add_argument("--time-scale", type=float, default=1.0, help="motion time multiplier, 0 = instant")
+    parser.add_argument("--rapid-rate", type=float, default=3000.0, help="G0/$H rate, mm/min")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    with GrblSimulator(response_latency=args.latency, time_scale=args.time_scale,
+                       rapid_rate=args.rapid_rate) as sim:
+        print(f"GRBL simulator listening on {sim.port} (Ctrl-C to stop)")
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    main()
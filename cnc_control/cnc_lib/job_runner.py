@@ -0,0 +1,177 @@
+import os
+import re
+import time
+import threading
+import logging
+from collections import namedtuple
+
+from cnc_control.cnc_lib.grbl_io import GrblError
+
+
+# Снимок прогресса задания, передаётся в progress_callback
+JobProgress = namedtuple("JobProgress", [
+    "state",         # 'running', 'paused', 'done', 'aborted', 'failed'
+    "lines_done",    # подтверждено GRBL строк
+    "errors",        # из них отвергнуто (error:N)
+    "percent",       # 0..100 по прочитанным байтам файла
+    "lines_per_s",   # средняя скорость подтверждения строк
+    "elapsed",       # время работы без учёта пауз, с
+    "eta",           # оценка оставшегося времени, с (None пока нет данных)
+])
+
+_COMMENT_RE = re.compile(r'\([^)]*\)')
+
+
+def read_gcode_lines(path, progress=None):
+    """
+    Ленивое чтение G-кода: файл не загружается в память целиком.
+
+    Комментарии (...) и ; и все пробелы удаляются, пустые строки пропускаются — в порт
+    уходит минимум байт. Если передан список progress, progress[0] обновляется числом
+    прочитанных байт файла.
+
+    Args:
+        path (str): Путь к файлу программы.
+        progress (list or None): Счётчик прочитанных байт [int].
+
+    Yields:
+        str: Очищенная строка G-кода.
+    """
+    with open(path, 'rb') as f:
+        for raw in f:
+            if progress is not None:
+                progress[0] += len(raw)
+            line = raw.decode('utf-8', errors='replace')
+            line = line.split(';', 1)[0]
+            if '(' in line:
+                line = _COMMENT_RE.sub('', line)
+            line = ''.join(line.split()).upper()
+            if line and line != '%':
+                yield line
+
+
+class GcodeJobRunner:
+    """
+    Потоковое исполнение G-кода с диска через CncMachineDriver.stream().
+
+    Файл читается генератором read_gcode_lines, буфер GRBL держится заполненным
+    подсчётом символов. Пауза/продолжение/сброс и коррекции подачи — real-time байтами,
+    их можно вызывать из любого потока во время run().
+
+    Args:
+        driver (CncMachineDriver): Подключённый драйвер.
+        path (str): Файл программы.
+        progress_callback (callable or None): progress_callback(JobProgress), вызывается
+            не чаще раза в progress_interval секунд и в конце задания.
+        progress_interval (float): Минимальный интервал между вызовами колбэка, с.
+    """
+
+    def __init__(self, driver, path, progress_callback=None, progress_interval=0.25):
+        self.driver = driver
+        self.path = path
+        self.progress_callback = progress_callback
+        self.progress_interval = progress_interval
+        self.logger = logging.getLogger("GcodeJobRunner")
+
+        self.total_bytes = os.path.getsize(path)
+        self.errors = []
+        self.state = 'idle'
+        self._bytes_read = [0]
+        self._lines_done = 0
+        self._error_count = 0
+        self._started = None
+        self._paused_at = None
+        self._paused_total = 0.0
+        self._last_report = 0.0
+        self._aborted = False
+        self._thread = None
+
+    # --- Запуск ---
+    def run(self):
+        """Исполняет задание в текущем потоке; возвращает список отвергнутых строк"""
+        self.state = 'running'
+        self._started = time.monotonic()
+        self._aborted = False
+        try:
+            self.errors = self.driver.stream(self._lines(), on_ack=self._on_ack)
+            # Конец задания — пустой планировщик (G4 P0), а не первый отчёт Idle
+            self.driver._wait_for_planner(on_poll=self._report)
+            self.state = 'aborted' if self._aborted else 'done'
+        except GrblError as e:
+            # Soft reset сбрасывает все ожидающие строки
+            self.state = 'aborted' if self._aborted else 'failed'
+            if not self._aborted:
+                self.logger.error(f"Job failed: {e}")
+                raise
+        except Exception:
+            self.state = 'failed'
+            raise
+        finally:
+            self._report(force=True)
+        return self.errors
+
+    def start(self):
+        """Исполняет задание в фоновом потоке"""
+        self._thread = threading.Thread(target=self.run, name="GcodeJobRunner", daemon=True)
+        self._thread.start()
+
+    def wait(self, timeout=None):
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    # --- Управление во время исполнения ---
+    def pause(self):
+        if self.state == 'running':
+            self.driver.feed_hold()
+            self._paused_at = time.monotonic()
+            self.state = 'paused'
+            self._report(force=True)
+
+    def resume(self):
+        if self.state == 'paused':
+            self.driver.cycle_start()
+            self._paused_total += time.monotonic() - self._paused_at
+            self._paused_at = None
+            self.state = 'running'
+            self._report(force=True)
+
+    def abort(self):
+        """Soft reset: станок останавливается сразу, остаток программы не отправляется"""
+        self._aborted = True
+        self.driver.soft_reset()
+
+    def feed_override(self, percent_step):
+        self.driver.feed_override(percent_step)
+
+    def rapid_override(self, percent):
+        self.driver.rapid_override(percent)
+
+    # --- Прогресс ---
+    def progress(self):
+        now = self._paused_at or time.monotonic()
+        elapsed = (now - self._started - self._paused_total) if self._started else 0.0
+        fraction = self._bytes_read[0] / self.total_bytes if self.total_bytes else 1.0
+        lines_per_s = self._lines_done / elapsed if elapsed > 0 else 0.0
+        eta = elapsed * (1 - fraction) / fraction if fraction > 0 else None
+        return JobProgress(self.state, self._lines_done, self._error_count,
+                           100.0 * fraction, lines_per_s, elapsed, eta)
+
+    def _lines(self):
+        for line in read_gcode_lines(self.path, self._bytes_read):
+            if self._aborted:
+                return
+            yield line
+
+    def _on_ack(self, number, line, response):
+        self._lines_done += 1
+        if not response.ok:
+            self._error_count += 1
+        self._report()
+
+    def _report(self, force=False):
+        if self.progress_callback is None:
+            return
+        now = time.monotonic()
+        if force or now - self._last_report >= self.progress_interval:
+            self._last_report = now
+            self.progress_callback(self.progress())
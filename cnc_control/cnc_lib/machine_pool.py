@@ -0,0 +1,440 @@
+"""
+Пул станков: параллельный поиск контроллеров GRBL и одновременные команды на N станков.
+
+    with MachinePool.discover() as pool:                 # все порты, найденные за ~1 с
+        pool.run_all('home')                             # все станки в ноль одновременно
+        pool.run_all(lambda driver: driver.move_xy_path(plan, speed=3000, tolerance=0.01))
+        for snapshot in pool.snapshot().values():
+            print(snapshot)
+
+Поиск открывает все порты параллельно (без перезагрузки Arduino: DTR снят), посылает $I
+и узнаёт GRBL по ответу [VER:...] или по баннеру "Grbl x.y". Имя станка — строка
+пользователя из $I (задаётся один раз командой $I=имя), иначе имя порта.
+
+У каждого станка свой MachineWorker: поток с очередью, в котором живёт CncMachineDriver.
+Команды одному станку выполняются по порядку, разным станкам — одновременно. Состояние
+(последний отчёт '?', очередь, ошибки) доступно через snapshot(), счётчики и задержки
+команд — в общем реестре метрик с меткой machine.
+
+    python -m cnc_control.cnc_lib.machine_pool scan [порты...]
+"""
+import os
+import sys
+import time
+import queue
+import logging
+import argparse
+import threading
+from collections import namedtuple
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+import serial
+from serial.tools import list_ports
+
+from cnc_control.cnc_lib.grbl_io import GrblError
+from cnc_control.cnc_lib.new_machine_lib import CncMachineDriver
+from cnc_control.metrics import REGISTRY
+
+# Контроллер, найденный на порту
+MachineInfo = namedtuple("MachineInfo", [
+    "port",
+    "version",      # '1.1h'
+    "build",        # дата сборки из [VER:], '20190825'
+    "name",         # строка пользователя из $I ('' если не задана)
+    "options",      # содержимое [OPT:...]
+    "banner",       # баннер, если контроллер перезагрузился при открытии порта
+])
+
+# Состояние одного станка в пуле
+MachineSnapshot = namedtuple("MachineSnapshot", [
+    "name",
+    "port",
+    "connected",
+    "state",        # 'Idle', 'Run', 'Alarm', ... из последнего отчёта, None до первого
+    "wpos",         # (x, y, z) или None
+    "busy",         # выполняется команда
+    "queued",       # команд в очереди
+    "commands",     # выполнено команд
+    "errors",       # из них с ошибкой
+    "last_error",   # текст последней ошибки или None
+])
+
+
+# --- Поиск ---
+def _parse_version(line):
+    """[VER:1.1h.20190825:имя] -> ('1.1h', '20190825', 'имя')"""
+    version, _, name = line[5:-1].partition(':')
+    number, _, build = version.rpartition('.')
+    if not number:
+        number, build = version, ''
+    return number, build, name
+
+
+def probe_port(port, baud_rate=115200, timeout=1.5):
+    """
+    Проверяет, отвечает ли на порту GRBL.
+
+    Args:
+        port (str): Имя порта.
+        baud_rate (int): Скорость.
+        timeout (float): Сколько ждать ответа на $I (и баннера, если плата перезагрузилась), с.
+
+    Returns:
+        MachineInfo or None: Сведения о контроллере, None если порт не открылся или это не GRBL.
+    """
+    try:
+        ser = serial.Serial(timeout=0.05)
+        ser.port = port
+        ser.baudrate = baud_rate
+        ser.dtr = False
+        ser.open()
+    except (serial.SerialException, OSError, ValueError):
+        return None
+    version = build = name = options = banner = None
+    try:
+        ser.reset_input_buffer()
+        ser.write(b"$I\n")
+        buffer = bytearray()
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            buffer += ser.read(ser.in_waiting or 1)
+            while b'\n' in buffer:
+                raw, _, rest = buffer.partition(b'\n')
+                buffer = bytearray(rest)
+                line = raw.decode('ascii', errors='replace').strip()
+                if line.startswith('Grbl '):
+                    # Плата перезагрузилась и потеряла запрос — повторяем
+                    banner = line
+                    ser.write(b"$I\n")
+                elif line.startswith('[VER:'):
+                    version, build, name = _parse_version(line)
+                elif line.startswith('[OPT:'):
+                    options = line[5:-1]
+                elif line == 'ok' and version is not None:
+                    deadline = 0
+                    break
+                elif line.startswith('error') and banner is not None:
+                    deadline = 0
+                    break
+    except (serial.SerialException, OSError) as e:
+        logging.getLogger("MachinePool").debug(f"Probe of {port} failed: {e}")
+        return None
+    finally:
+        ser.close()
+    if version is None and banner is None:
+        return None
+    if version is None:
+        version = banner.split()[1]
+    return MachineInfo(port, version, build or '', name or '', options or '', banner)
+
+
+def discover(ports=None, baud_rate=115200, timeout=1.5, workers=None):
+    """
+    Параллельный опрос портов.
+
+    Args:
+        ports (list or None): Порты для проверки; все последовательные порты системы если None.
+        baud_rate (int): Скорость.
+        timeout (float): Время ожидания ответа на каждом порту, с (порты опрашиваются одновременно).
+        workers (int or None): Потоков опроса; по одному на порт если None.
+
+    Returns:
+        list: MachineInfo найденных контроллеров в порядке портов.
+    """
+    if ports is None:
+        ports = sorted(info.device for info in list_ports.comports())
+    if not ports:
+        return []
+    with ThreadPoolExecutor(max_workers=workers or len(ports), thread_name_prefix="GrblProbe") as pool:
+        found = pool.map(lambda port: probe_port(port, baud_rate, timeout), ports)
+        return [info for info in found if info is not None]
+
+
+# --- Один станок ---
+class MachineWorker:
+    """
+    Поток с очередью команд, владеющий одним CncMachineDriver.
+
+    submit() возвращает Future; команда — имя метода драйвера или callable(driver).
+    """
+
+    def __init__(self, name, port, baud_rate=115200, timeout=2, status_rate_hz=10, trace_file=None):
+        self.name = name
+        self.port = port
+        self.driver = CncMachineDriver(port, baud_rate, timeout, status_rate_hz, trace_file)
+        self.commands = 0
+        self.errors = 0
+        self.last_error = None
+        self.busy = False
+        self.logger = logging.getLogger(f"MachineWorker[{name}]")
+        self._queue = queue.Queue()
+        self._thread = None
+
+        labels = {"machine": name}
+        self._m_commands = REGISTRY.counter("pool_commands_total", "Commands run by machine pool workers", labels)
+        self._m_errors = REGISTRY.counter("pool_command_errors_total", "Pool commands that raised", labels)
+        self._m_seconds = REGISTRY.histogram("pool_command_seconds", "Pool command duration", labels)
+        self._m_queued = REGISTRY.gauge("pool_queue_depth", "Commands waiting per machine", labels)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name=f"Machine-{self.name}", daemon=True)
+        self._thread.start()
+        return self
+
+    def submit(self, action, *args, **kwargs):
+        future = Future()
+        self._queue.put((action, args, kwargs, future))
+        self._m_queued.set(self._queue.qsize())
+        return future
+
+    def stop(self):
+        """Дожидается уже поставленных команд, закрывает порт и останавливает поток"""
+        if self._thread is None:
+            return
+        self._queue.put(None)
+        self._thread.join()
+        self._thread = None
+
+    def snapshot(self):
+        status = self.driver.status
+        connected = self.driver.io is not None
+        return MachineSnapshot(self.name, self.port, connected,
+                               status.state if status else None, status.wpos if status else None,
+                               self.busy, self._queue.qsize(), self.commands, self.errors, self.last_error)
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            self._m_queued.set(self._queue.qsize())
+            if item is None:
+                break
+            action, args, kwargs, future = item
+            if not future.set_running_or_notify_cancel():
+                continue
+            self.busy = True
+            started = time.perf_counter()
+            try:
+                fn = getattr(self.driver, action) if isinstance(action, str) else action
+                result = fn(*args, **kwargs) if isinstance(action, str) else fn(self.driver, *args, **kwargs)
+            except Exception as e:
+                self.errors += 1
+                self.last_error = str(e)
+                self._m_errors.inc()
+                self.logger.error(f"{getattr(action, '__name__', action)} failed: {e}")
+                future.set_exception(e)
+            else:
+                future.set_result(result)
+            finally:
+                self.busy = False
+                self.commands += 1
+                self._m_commands.inc()
+                self._m_seconds.observe(time.perf_counter() - started)
+        try:
+            self.driver.close_serial_port()
+        except Exception as e:
+            self.logger.error(f"Close failed: {e}")
+
+
+class PoolError(GrblError):
+    """Команда пула завершилась ошибкой на части станков"""
+
+    def __init__(self, errors, results):
+        self.errors = errors      # имя -> исключение
+        self.results = results    # имя -> результат для успешных
+        super().__init__("Failed on " + ", ".join(f"{name}: {e}" for name, e in errors.items()))
+
+
+# --- Пул ---
+class MachinePool:
+    # Сколько станки synchronized-команды ждут друг друга на барьере, если у run_all нет timeout, с
+    BARRIER_TIMEOUT = 60.0
+    # После отмены барьера: сколько ждать, пока стоявшие на нём станки вернут BrokenBarrierError, с
+    ABORT_GRACE = 0.5
+
+    def __init__(self, machines, baud_rate=115200, timeout=2, status_rate_hz=10, trace_dir=None):
+        """
+        Args:
+            machines (list): MachineInfo (из discover) или имена портов.
+            baud_rate, timeout, status_rate_hz: Параметры CncMachineDriver.
+            trace_dir (str or None): Каталог для двоичных трасс обмена, по файлу на станок.
+        """
+        self.workers = {}
+        for machine in machines:
+            info = machine if isinstance(machine, MachineInfo) else MachineInfo(machine, '', '', '', '', None)
+            name = info.name or os.path.basename(info.port)
+            if name in self.workers:
+                name = f"{name}@{os.path.basename(info.port)}"
+            trace_file = os.path.join(trace_dir, f"{name}.trace") if trace_dir else None
+            self.workers[name] = MachineWorker(name, info.port, baud_rate, timeout, status_rate_hz, trace_file)
+        self.logger = logging.getLogger("MachinePool")
+
+    @classmethod
+    def discover(cls, ports=None, baud_rate=115200, probe_timeout=1.5, **kwargs):
+        """Поиск контроллеров и подключение ко всем найденным"""
+        machines = discover(ports, baud_rate, probe_timeout)
+        pool = cls(machines, baud_rate, **kwargs)
+        pool.connect()
+        return pool
+
+    @property
+    def names(self):
+        return list(self.workers)
+
+    def __getitem__(self, name):
+        return self.workers[name]
+
+    def __len__(self):
+        return len(self.workers)
+
+    # --- Подключение ---
+    def connect(self):
+        """Подключает все станки параллельно; не ответившие выводятся из пула"""
+        for worker in self.workers.values():
+            worker.start()
+        futures = {name: worker.submit(self._connect_driver) for name, worker in self.workers.items()}
+        failed = {}
+        for name, future in futures.items():
+            try:
+                future.result()
+            except Exception as e:
+                failed[name] = e
+        for name, e in failed.items():
+            self.logger.error(f"{name} ({self.workers[name].port}) not connected: {e}")
+            self.workers.pop(name).stop()
+        self.logger.info(f"{len(self.workers)} machines connected")
+        return self
+
+    @staticmethod
+    def _connect_driver(driver):
+        driver.open_serial_port()
+        driver.unlock()
+        driver.set_units_and_mode()
+
+    def close(self):
+        for worker in self.workers.values():
+            worker.stop()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    # --- Команды ---
+    def broadcast(self, action, *args, names=None, synchronized=False, **kwargs):
+        """
+        Ставит команду в очередь каждого станка.
+
+        Args:
+            action (str or callable): Имя метода CncMachineDriver или callable(driver, *args).
+            names (list or None): Только эти станки.
+            synchronized (bool): Станки начинают команду одновременно (барьер), даже если
+                у них разная длина очереди.
+
+        Returns:
+            dict: Имя -> Future.
+        """
+        futures, _ = self._broadcast(action, args, kwargs, names, synchronized, self.BARRIER_TIMEOUT)
+        return futures
+
+    def _broadcast(self, action, args, kwargs, names, synchronized, barrier_timeout):
+        """broadcast(), возвращающий ещё и барьер (None без synchronized), чтобы его можно было отменить"""
+        targets = [self.workers[name] for name in (names or self.workers)]
+        barrier = None
+        if synchronized and len(targets) > 1:
+            barrier = threading.Barrier(len(targets), timeout=barrier_timeout)
+            action = self._synchronized(action, barrier)
+        return {worker.name: worker.submit(action, *args, **kwargs) for worker in targets}, barrier
+
+    @staticmethod
+    def _synchronized(action, barrier):
+        def run(driver, *args, **kwargs):
+            try:
+                barrier.wait()
+            except threading.BrokenBarrierError:
+                # Другой станок не дошёл до барьера вовремя или run_all отменил ожидание
+                raise threading.BrokenBarrierError("synchronized start aborted") from None
+            if isinstance(action, str):
+                return getattr(driver, action)(*args, **kwargs)
+            return action(driver, *args, **kwargs)
+        run.__name__ = getattr(action, '__name__', str(action))
+        return run
+
+    def run_all(self, action, *args, names=None, synchronized=False, timeout=None, **kwargs):
+        """
+        broadcast() с ожиданием всех станков.
+
+        С timeout тот же предел действует и на барьер synchronized-команды. Когда время
+        вышло, барьер отменяется: станки, ещё не начавшие команду, её не выполняют и
+        получают BrokenBarrierError, не начатые команды снимаются с очередей.
+
+        Returns:
+            dict: Имя -> результат.
+
+        Raises:
+            PoolError: Если команда упала хотя бы на одном станке (после завершения на всех)
+                или не завершилась за timeout (TimeoutError для этого станка).
+        """
+        futures, barrier = self._broadcast(action, args, kwargs, names, synchronized,
+                                           self.BARRIER_TIMEOUT if timeout is None else timeout)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        results, errors, timed_out = {}, {}, []
+        for name, future in futures.items():
+            try:
+                remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+                results[name] = future.result(remaining)
+            except FutureTimeout:
+                timed_out.append(name)
+            except Exception as e:
+                errors[name] = e
+        if timed_out:
+            if barrier is not None:
+                barrier.abort()
+            grace = time.monotonic() + self.ABORT_GRACE
+            for name in timed_out:
+                future = futures[name]
+                if future.cancel():
+                    errors[name] = TimeoutError(f"not started within {timeout} s")
+                    continue
+                try:
+                    results[name] = future.result(max(0.0, grace - time.monotonic()))
+                except FutureTimeout:
+                    errors[name] = TimeoutError(f"not finished within {timeout} s")
+                except Exception as e:
+                    errors[name] = e
+        if errors:
+            raise PoolError(errors, results)
+        return results
+
+    def home_all(self):
+        return self.run_all('home', synchronized=True)
+
+    def feed_hold_all(self):
+        """Real-time стоп всем станкам сразу, минуя очереди"""
+        for worker in self.workers.values():
+            if worker.driver.io is not None:
+                worker.driver.feed_hold()
+
+    def snapshot(self):
+        """Имя -> MachineSnapshot для всех станков"""
+        return {name: worker.snapshot() for name, worker in self.workers.items()}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Find GRBL controllers on serial ports")
+    parser.add_argument("command", choices=["scan"])
+    parser.add_argument("ports", nargs="*", help="ports to probe (all serial ports if omitted)")
+    parser.add_argument("--baud", type=int, default=115200)
+    parser.add_argument("--timeout", type=float, default=1.5)
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    machines = discover(args.ports or None, args.baud, args.timeout)
+    for info in machines:
+        print(f"{info.port:16} GRBL {info.version} {info.build:10} {info.name or '-':16} {info.options}")
+    print(f"{len(machines)} controllers found in {time.perf_counter() - started:.2f} s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
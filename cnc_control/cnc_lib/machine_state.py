@@ -0,0 +1,193 @@
+import threading
+import time
+import queue
+import logging
+from collections import namedtuple
+
+from cnc_control.metrics import REGISTRY
+
+STATUS_REPORTS = REGISTRY.counter("grbl_status_reports_total", "Status reports parsed")
+STATUS_JITTER = REGISTRY.histogram("grbl_status_poll_jitter_seconds",
+                                   "Deviation of the interval between status reports from the poll period")
+
+
+# Снимок состояния станка из одного отчёта GRBL <...>. Неизменяемый, поэтому его можно
+# свободно передавать между потоками.
+MachineStatus = namedtuple("MachineStatus", [
+    "state",         # 'Idle', 'Run', 'Hold:0', 'Jog', 'Alarm', ...
+    "mpos",          # (x, y, z) машинные координаты, мм
+    "wpos",          # (x, y, z) рабочие координаты, мм
+    "wco",           # (x, y, z) смещение рабочей системы координат, мм
+    "feed",          # текущая подача, мм/мин
+    "spindle",       # текущие обороты шпинделя
+    "planner_free",  # свободных блоков планировщика (Bf), None если не сообщается
+    "rx_free",       # свободных байт приёмного буфера (Bf), None если не сообщается
+    "pins",          # активные входы (Pn), например 'XZP'
+    "timestamp",     # time.monotonic() в момент разбора
+])
+
+
+def _parse_xyz(text):
+    values = [float(v) for v in text.split(',')]
+    values += [0.0] * (3 - len(values))
+    return tuple(values[:3])
+
+
+def parse_status_report(line, previous=None):
+    """
+    Разбор отчёта GRBL 1.1 вида <Idle|MPos:0.000,0.000,0.000|FS:0,0|WCO:0.000,0.000,0.000>.
+
+    WCO GRBL присылает не в каждом отчёте, поэтому недостающие поля берутся из previous.
+
+    Args:
+        line (str): Строка отчёта вместе с угловыми скобками.
+        previous (MachineStatus or None): Предыдущий снимок.
+
+    Returns:
+        MachineStatus: Новый снимок.
+    """
+    if not (line.startswith('<') and line.endswith('>')):
+        raise ValueError(f"Not a GRBL status report: {line!r}")
+    fields = line[1:-1].split('|')
+    state = fields[0]
+    mpos = wpos = None
+    wco = previous.wco if previous else (0.0, 0.0, 0.0)
+    feed = previous.feed if previous else 0.0
+    spindle = previous.spindle if previous else 0.0
+    planner_free = rx_free = None
+    pins = ''
+    for field in fields[1:]:
+        name, _, value = field.partition(':')
+        if name == 'MPos':
+            mpos = _parse_xyz(value)
+        elif name == 'WPos':
+            wpos = _parse_xyz(value)
+        elif name == 'WCO':
+            wco = _parse_xyz(value)
+        elif name == 'FS':
+            feed, _, spindle = value.partition(',')
+            feed, spindle = float(feed), float(spindle or 0)
+        elif name == 'F':
+            feed = float(value)
+        elif name == 'Bf':
+            planner_free, rx_free = (int(v) for v in value.split(','))
+        elif name == 'Pn':
+            pins = value
+    if mpos is None and wpos is None:
+        mpos = previous.mpos if previous else (0.0, 0.0, 0.0)
+    if mpos is None:
+        mpos = tuple(w + o for w, o in zip(wpos, wco))
+    if wpos is None:
+        wpos = tuple(m - o for m, o in zip(mpos, wco))
+    return MachineStatus(state, mpos, wpos, wco, feed, spindle,
+                         planner_free, rx_free, pins, time.monotonic())
+
+
+class MachineState:
+    """
+    Потокобезопасное хранилище последнего MachineStatus с подписчиками.
+
+    Подписчики вызываются из потока опроса только при изменении состояния станка.
+    """
+
+    def __init__(self):
+        self._status = None
+        self._cond = threading.Condition()
+        self._subscribers = []
+
+    @property
+    def status(self):
+        return self._status
+
+    def subscribe(self, callback):
+        """callback(status: MachineStatus) при каждом изменении состояния"""
+        self._subscribers.append(callback)
+
+    def unsubscribe(self, callback):
+        if callback in self._subscribers:
+            self._subscribers.remove(callback)
+
+    def update(self, status):
+        with self._cond:
+            previous = self._status
+            self._status = status
+            self._cond.notify_all()
+        if previous is None or previous[:-1] != status[:-1]:
+            for callback in list(self._subscribers):
+                try:
+                    callback(status)
+                except Exception as e:
+                    logging.getLogger("MachineState").error(f"Subscriber failed: {e}")
+
+    def clear(self):
+        with self._cond:
+            self._status = None
+
+    def wait_for(self, predicate, timeout):
+        """Ждёт снимок, для которого predicate(status) истинно; возвращает его или None"""
+        with self._cond:
+            if self._cond.wait_for(lambda: self._status is not None and predicate(self._status),
+                                   timeout=timeout):
+                return self._status
+            return None
+
+
+class StatusPoller:
+    """
+    Фоновый опрос GRBL real-time байтом '?' с частотой rate_hz.
+
+    Отчёты из GrblSerialIO.status_queue разбираются в MachineStatus и публикуются в MachineState.
+    """
+
+    MIN_RATE_HZ, MAX_RATE_HZ = 5, 20
+
+    def __init__(self, io, state, rate_hz=10):
+        if not self.MIN_RATE_HZ <= rate_hz <= self.MAX_RATE_HZ:
+            raise ValueError(f"Status rate must be in range [{self.MIN_RATE_HZ}, {self.MAX_RATE_HZ}] Hz")
+        self.io = io
+        self.state = state
+        self.period = 1.0 / rate_hz
+        self.logger = logging.getLogger("StatusPoller")
+        self._running = False
+        self._thread = None
+
+    def start(self):
+        self._running = True
+        self._thread = threading.Thread(target=self._poll_loop, name="StatusPoller", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._running = False
+        if self._thread is not None:
+            self._thread.join()
+
+    def _poll_loop(self):
+        next_poll = time.monotonic()
+        last_report = None
+        while self._running:
+            try:
+                self.io.write_realtime(b'?')
+            except Exception as e:
+                self.logger.error(f"Status request failed: {e}")
+                return
+            next_poll += self.period
+            # Забираем всё, что пришло до следующего опроса
+            while True:
+                remaining = next_poll - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    line = self.io.status_queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                try:
+                    status = parse_status_report(line, self.state.status)
+                    self.state.update(status)
+                    STATUS_REPORTS.inc()
+                    if last_report is not None:
+                        STATUS_JITTER.observe(abs(status.timestamp - last_report - self.period))
+                    last_report = status.timestamp
+                except ValueError as e:
+                    self.logger.warning(f"Bad status report {line!r}: {e}")
+            if next_poll < time.monotonic():
+                next_poll = time.monotonic()
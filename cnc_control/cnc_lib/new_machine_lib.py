@@ -1,27 +1,78 @@
 import serial
+import re
 import time
 import logging
+import threading
+from collections import deque
+from concurrent.futures import TimeoutError as FutureTimeout
+from itertools import chain
+
+from cnc_control.cnc_lib.grbl_io import GrblSerialIO, GrblError
+from cnc_control.cnc_lib.machine_state import MachineState, StatusPoller
+from cnc_control.cnc_lib.serial_trace import SerialTrace
+from cnc_control.cnc_lib.path_compress import compress_path
+from cnc_control.metrics import REGISTRY
+
+MOVE_SECONDS = REGISTRY.histogram("grbl_move_seconds", "Single move from sending to confirmed Idle")
 
 
 class CncMachineDriver:
     
     BAUD_RATE = 115200
     TIMEOUT = 2
+    RX_BUFFER_SIZE = 128  # размер приёмного буфера GRBL (байт)
+    RESOLUTION = 0.001    # шаг округления координат в сжатых путях (мм)
+    MOVE_TIMEOUT = 60     # максимальное время одного перемещения (с)
+    BOOT_TIMEOUT = 5      # сколько ждать готовности GRBL после открытия порта (с)
+
+    # Модальные группы GRBL, состояние которых кэшируется драйвером
+    MODAL_GROUPS = {
+        'G20': 'units', 'G21': 'units',
+        'G90': 'distance', 'G91': 'distance',
+        'G17': 'plane', 'G18': 'plane', 'G19': 'plane',
+        'G54': 'wcs', 'G55': 'wcs', 'G56': 'wcs', 'G57': 'wcs', 'G58': 'wcs', 'G59': 'wcs',
+    }
+    # Real-time команды GRBL
+    FEED_HOLD = b'!'
+    CYCLE_START = b'~'
+    SOFT_RESET = 0x18
+    FEED_OVERRIDE_RESET = 0x90
+    FEED_OVERRIDE_STEPS = {10: 0x91, -10: 0x92, 1: 0x93, -1: 0x94}
+    RAPID_OVERRIDE = {100: 0x95, 50: 0x96, 25: 0x97}
+
+    # Непрерывный jog ($J=)
+    JOG_CANCEL = 0x85      # real-time байт отмены jog
+    JOG_STEP_TIME = 0.05   # длительность одного шага $J= на заданной подаче (с)
+    JOG_QUEUE_DEPTH = 4    # сколько шагов держать неподтверждёнными в планировщике
+
+    _WORD_RE = re.compile(r'([GF])\s*([-+]?\d*\.?\d+)')
 
     # Ограничения по координатам (мм)
     X_MIN, X_MAX = -1000, 1000
     Y_MIN, Y_MAX = -1000, 1000
+    Z_MIN, Z_MAX = -100, 100
 
-    def __init__(self, port, baud_rate, timeout):
+    def __init__(self, port, baud_rate, timeout, status_rate_hz=10, trace_file=None):
         self.port = port
         self.baud_rate = baud_rate
         self.timeout = timeout
+        self.status_rate_hz = status_rate_hz
+        self.trace_file = trace_file   # двоичная трасса обмена (см. serial_trace.py)
         self.serial_port_object = None
+        self.io = None
+        self.trace = None
+        self.state = MachineState()
+        self.poller = None
+        self.modal = {}   # известное модальное состояние GRBL: группа -> слово, 'feed' -> F
+        self._jog_active = False
+        self._jog_thread = None
+        self._jog_lock = threading.Lock()
+        self._jog_stops = 0   # растёт при каждом jog_stop(); см. jog_stops
         self.logger = logging.getLogger("CncMachineDriver")
-        logging.basicConfig(level=logging.INFO)
 
         self.X = 0
         self.Y = 0
+        self.Z = 0
 
     # --- Контекстный менеджер ---
     def __enter__(self):
@@ -36,91 +87,390 @@ class CncMachineDriver:
         return self
     def __exit__(self, exc_type, exc_val, exc_tb):
         self.home()
-        time.sleep(1)
         self._send_gcode("$X")
         self.close_serial_port()
 
     # --- Подключение ---
     def open_serial_port(self):
+        """
+        Открывает порт и ждёт готовности GRBL вместо фиксированной паузы.
+
+        DTR снимается до открытия, чтобы плата Arduino по возможности не перезагружалась.
+        Готовность — первый ответ на опрос '?': если контроллер уже работал, он приходит
+        через миллисекунды, если перезагрузился — сразу после баннера
+        "Grbl x.y ['$' for help]".
+        """
         if not self.serial_port_object or not self.serial_port_object.is_open:
-            self.serial_port_object = serial.Serial(
-                port=self.port,
-                baudrate=self.baud_rate,
-                timeout=self.timeout
-            )
-            time.sleep(2)
-            self.logger.info("Serial port opened.")
+            started = time.monotonic()
+            self.serial_port_object = serial.Serial(timeout=self.timeout)
+            self.serial_port_object.port = self.port
+            self.serial_port_object.baudrate = self.baud_rate
+            self.serial_port_object.dtr = False
+            self.serial_port_object.open()
+            self.serial_port_object.reset_input_buffer()
+            if self.trace_file:
+                self.trace = SerialTrace(self.trace_file).start()
+            self.io = GrblSerialIO(self.serial_port_object, self.logger, self.trace)
+            self.io.add_alarm_callback(self._on_alarm)
+            self.io.start()
+            self.poller = StatusPoller(self.io, self.state, self.status_rate_hz)
+            self.poller.start()
+            if self.state.wait_for(lambda status: True, self.BOOT_TIMEOUT) is None:
+                self.close_serial_port()
+                raise GrblError(f"No response from GRBL on {self.port}")
+            self.logger.info(f"Serial port opened, GRBL ready in {(time.monotonic() - started) * 1000:.0f} ms.")
         else:
             self.logger.info("Serial port already open.")
 
     def close_serial_port(self):
+        if self.poller is not None:
+            self.poller.stop()
+            self.poller = None
+        self.state.clear()
+        if self.io is not None:
+            self.io.stop()
+            self.io = None
         if self.serial_port_object and self.serial_port_object.is_open:
             self.serial_port_object.close()
             self.logger.info("Serial port closed.")
+        if self.trace is not None:
+            self.trace.stop()
+            self.trace = None
 
     # --- Настройка GRBL ---
     def unlock(self):
         """Разблокировка GRBL"""
         self._send_gcode("$X")
-        self._log_response("GRBL Unlock")
 
     def set_units_and_mode(self):
-        """Устанавливаем миллиметры и абсолютные координаты"""
-        self._send_gcode("G21")  # миллиметры
-        self._send_gcode("G90")  # абсолютный режим
-        self._log_response("Units = mm, Absolute mode")
+        """Устанавливаем миллиметры и абсолютные координаты (одной строкой и только если нужно)"""
+        words = self._modal_changes(units='G21', distance='G90')
+        if words:
+            self._send_gcode(' '.join(words))
+
+    # --- Кэш модального состояния ---
+    def sync_modal_state(self):
+        """Перечитывает модальное состояние из $G (после сброса или тревоги)"""
+        self.modal.clear()
+        response = self._send_gcode("$G")
+        for line in response.lines:
+            if line.startswith('[GC:'):
+                self._track_modal(line[4:-1])
+        return dict(self.modal)
+
+    def invalidate_modal_state(self):
+        """Забыть кэш: следующие команды заново отправят все модальные слова"""
+        self.modal.clear()
+
+    def _modal_changes(self, **groups):
+        """Модальные слова из groups (units='G21', distance='G91', ...), отличающиеся от кэша"""
+        return [word for group, word in groups.items() if self.modal.get(group) != word]
+
+    def _track_modal(self, line):
+        """Обновляет кэш по модальным словам строки, принятой GRBL"""
+        if line.startswith('$'):
+            return  # $-команды (в т.ч. $J=) не меняют состояние парсера G-кода
+        for letter, value in self._WORD_RE.findall(line.upper()):
+            if letter == 'F':
+                self.modal['feed'] = float(value)
+                continue
+            word = f"G{float(value):g}"
+            group = self.MODAL_GROUPS.get(word)
+            if group:
+                self.modal[group] = word
+
+    def _motion_line(self, axes, speed, distance):
+        """Строка G1 с модальными словами только там, где состояние меняется"""
+        words = self._modal_changes(units='G21', distance=distance)
+        words.append(f"G1 {axes}")
+        if self.modal.get('feed') != float(speed):
+            words.append(f"F{speed}")
+        return ' '.join(words)
+
+    def _on_alarm(self, line):
+        # После тревоги или сброса состояние парсера GRBL неизвестно
+        if line.startswith('ALARM') or line.startswith('Grbl '):
+            self.modal.clear()
 
     # --- Основные команды движения ---
     def move_x(self, x_mm, speed=1000):
         self._check_limits(x_mm, axis='X')
-        command = f"G1 X{x_mm} F{speed}"
+        command = self._motion_line(f"X{x_mm}", speed, distance='G90')
         self._execute_move(command)
         self.X = x_mm
 
     def move_y(self, y_mm, speed=1000):
         self._check_limits(y_mm, axis='Y')
-        command = f"G1 Y{y_mm} F{speed}"
+        command = self._motion_line(f"Y{y_mm}", speed, distance='G90')
         self._execute_move(command)
         self.Y = y_mm
 
     def move_xy(self, x_mm, y_mm, speed=1000):
         self._check_limits(x_mm, axis='X')
         self._check_limits(y_mm, axis='Y')
-        command = f"G1 X{x_mm} Y{y_mm} F{speed}"
+        command = self._motion_line(f"X{x_mm} Y{y_mm}", speed, distance='G90')
         self._execute_move(command)
         self.X, self.Y = x_mm, y_mm
 
+    def move_z(self, z_mm, speed=500, wait=True):
+        """
+        Перемещение по Z. С wait=False команда только ставится в планировщик GRBL
+        (например, для съёмки кадров во время движения) и self.Z не обновляется до
+        следующего перемещения с ожиданием.
+        """
+        self._check_limits(z_mm, axis='Z')
+        command = self._motion_line(f"Z{z_mm}", speed, distance='G90')
+        if wait:
+            self._execute_move(command)
+        else:
+            response = self._send_gcode(command)
+            if not response.ok:
+                raise GrblError(f"GRBL rejected move {command!r}: {response.status}")
+        self.Z = z_mm
+
     # --- Относительное перемещение ---
+    # G91 остаётся активным после перемещения: абсолютные команды сами вернут G90 через кэш
     def move_x_rel(self, dx_mm, speed=1000):
-        self._send_gcode("G21")
-        self._send_gcode("G91")
-        command = f"G1 X{dx_mm} F{speed}"
+        command = self._motion_line(f"X{dx_mm}", speed, distance='G91')
         self._execute_move(command)
         self.X += dx_mm
-        self._send_gcode("G90")
 
     def move_y_rel(self, dy_mm, speed=1000):
-        self._send_gcode("G21")
-        self._send_gcode("G91")
-        command = f"G1 Y{dy_mm} F{speed}"
+        command = self._motion_line(f"Y{dy_mm}", speed, distance='G91')
         self._execute_move(command)
         self.Y += dy_mm
-        self._send_gcode("G90")
+
+    def move_z_rel(self, dz_mm, speed=500):
+        self._check_limits(self.Z + dz_mm, axis='Z')
+        command = self._motion_line(f"Z{dz_mm}", speed, distance='G91')
+        self._execute_move(command)
+        self.Z += dz_mm
 
     def move_xy_rel(self, dx_mm, dy_mm, speed=1000):
-        self._send_gcode("G21")
-        self._send_gcode("G91")
-        command = f"G1 X{dx_mm} Y{dy_mm} F{speed}"
+        command = self._motion_line(f"X{dx_mm} Y{dy_mm}", speed, distance='G91')
         self._execute_move(command)
         self.X += dx_mm
         self.Y += dy_mm
-        self._send_gcode("G90")
+
+    # --- Потоковая передача G-кода ---
+    def stream(self, lines, on_ack=None):
+        """
+        Потоковая отправка G-кода с подсчётом символов (character-counting).
+
+        Приёмный буфер GRBL держится заполненным: следующая строка уходит, как только
+        для неё освободилось место, а каждый ответ ok/error сопоставляется со своей строкой.
+        Планировщик станка не простаивает, и многосегментные пути идут на реальной подаче.
+
+        Args:
+            lines (iterable): Любой итерируемый объект со строками G-кода (список, генератор, файл).
+            on_ack (callable or None): on_ack(номер, строка, GrblResponse) на каждый ответ GRBL.
+
+        Returns:
+            list: [(номер строки, строка, ответ)] для строк, отвергнутых GRBL (error:N).
+        """
+        pending = deque()   # неподтверждённые строки: (номер, строка, длина в байтах, Future)
+        buffered = 0        # сколько байт сейчас лежит в приёмном буфере GRBL
+        errors = []
+        for number, line in enumerate(lines, 1):
+            line = line.strip()
+            if not line:
+                continue
+            data = (line + '\n').encode()
+            if len(data) > self.RX_BUFFER_SIZE:
+                raise ValueError(f"Line {number} is longer than GRBL RX buffer: {line!r}")
+            while pending and buffered + len(data) > self.RX_BUFFER_SIZE:
+                buffered -= self._ack_stream_line(pending, errors, on_ack)
+            pending.append((number, line, len(data), self.io.send_command(line)))
+            self._track_modal(line)
+            buffered += len(data)
+            self.logger.debug(f"[STREAM] {line}")
+        while pending:
+            self._ack_stream_line(pending, errors, on_ack)
+        return errors
+
+    def move_xy_path(self, points, speed=1000, tolerance=None):
+        """
+        Проход по ломаной [(x, y), ...] одним потоком без остановок на каждом сегменте.
+
+        С tolerance (мм) путь сначала сжимается (см. path_compress.py): почти коллинеарные
+        сегменты сливаются, дуги уходят как G2/G3, координаты округляются до RESOLUTION.
+        Возвращает CompressedPath (его stats() — степень сжатия и сэкономленные байты) или None.
+        """
+        if tolerance is None:
+            points = list(points)
+            for x_mm, y_mm in points:
+                self._check_limits(x_mm, axis='X')
+                self._check_limits(y_mm, axis='Y')
+            lines = (f"G1 X{x_mm} Y{y_mm} F{speed}" for x_mm, y_mm in points)
+            end, path = (points[-1] if points else None), None
+        else:
+            path = compress_path(points, tolerance, self.RESOLUTION)
+            if len(path):
+                # Вершины и дуги не выходят за охватывающий прямоугольник входа больше чем на tolerance
+                for axis, column in (('X', 0), ('Y', 1)):
+                    self._check_limits(float(path.source[:, column].min()), axis=axis)
+                    self._check_limits(float(path.source[:, column].max()), axis=axis)
+            self.logger.info(f"Path compressed: {len(path.source)} points -> {len(path)} lines "
+                             f"({path.arc_count} arcs)")
+            lines = path.gcode(speed)
+            end = tuple(path.points[-1].tolist()) if len(path) else None
+        modal = {'units': 'G21', 'distance': 'G90'}
+        if tolerance is not None:
+            modal['plane'] = 'G17'   # дуги G2/G3 — в плоскости XY
+        words = self._modal_changes(**modal)
+        errors = self.stream(chain([' '.join(words)] if words else [], lines))
+        if errors:
+            raise RuntimeError(f"GRBL rejected path segments: {errors}")
+        # После stream() в планировщике ещё до 15 блоков
+        self._wait_for_planner()
+        if end is not None:
+            self.X, self.Y = end
+        return path
+
+    # --- Real-time управление ---
+    def feed_hold(self):
+        """Плавная остановка с сохранением программы (!)"""
+        self.io.write_realtime(self.FEED_HOLD)
+
+    def cycle_start(self):
+        """Продолжение после feed hold (~)"""
+        self.io.write_realtime(self.CYCLE_START)
+
+    def soft_reset(self):
+        """Мгновенный сброс GRBL (Ctrl-X): планировщик и буфер очищаются"""
+        self.io.write_realtime(self.SOFT_RESET)
+        self.modal.clear()
+
+    def feed_override(self, percent_step):
+        """Коррекция подачи на ±1 или ±10 %, 0 — сброс в 100 %"""
+        if percent_step == 0:
+            self.io.write_realtime(self.FEED_OVERRIDE_RESET)
+        elif percent_step in self.FEED_OVERRIDE_STEPS:
+            self.io.write_realtime(self.FEED_OVERRIDE_STEPS[percent_step])
+        else:
+            raise ValueError("Feed override step must be one of 0, ±1, ±10")
+
+    def rapid_override(self, percent):
+        """Коррекция ускоренных перемещений: 100, 50 или 25 %"""
+        if percent not in self.RAPID_OVERRIDE:
+            raise ValueError("Rapid override must be 100, 50 or 25")
+        self.io.write_realtime(self.RAPID_OVERRIDE[percent])
+
+    # --- Непрерывный jog ---
+    def jog_start(self, axis, direction, speed=1000, limits=None, stops=None):
+        """
+        Начинает непрерывное движение по оси, пока не вызван jog_stop().
+
+        Короткие шаги $J= длиной speed * JOG_STEP_TIME подаются потоком так, чтобы в
+        планировщике GRBL всегда лежало не больше JOG_QUEUE_DEPTH шагов: движение плавное,
+        а остановка по jog_stop() занимает только торможение.
+
+        Args:
+            axis (str): 'X', 'Y' или 'Z'.
+            direction (int): +1 или -1.
+            speed (float): Подача, мм/мин.
+            limits (tuple or None): (min, max) для оси; по умолчанию X_MIN/X_MAX, Y_MIN/Y_MAX, Z_MIN/Z_MAX.
+            stops (int or None): Значение jog_stops, прочитанное в момент нажатия. Если с тех
+                пор был jog_stop(), jog не начинается. None — значение на входе в jog_start().
+
+        Returns:
+            bool: Начат ли jog.
+        """
+        if axis not in ('X', 'Y', 'Z'):
+            raise ValueError(f"Unknown jog axis: {axis}")
+        if stops is None:
+            stops = self._jog_stops
+        self._cancel_jog(wait=True)
+        if limits is None:
+            limits = {'X': (self.X_MIN, self.X_MAX), 'Y': (self.Y_MIN, self.Y_MAX),
+                      'Z': (self.Z_MIN, self.Z_MAX)}[axis]
+        with self._jog_lock:
+            # Отпускание кнопки могло прийти, пока команда ждала в очереди или шёл join выше
+            if self._jog_stops != stops:
+                return False
+            self._jog_active = True
+            self._jog_thread = threading.Thread(
+                target=self._jog_loop, args=(axis, 1 if direction > 0 else -1, speed, limits),
+                name="CncJog", daemon=True)
+            self._jog_thread.start()
+        return True
+
+    @property
+    def jog_stops(self):
+        """Счётчик вызовов jog_stop(): прочитать при нажатии и передать в jog_start(stops=...)"""
+        return self._jog_stops
+
+    def jog_stop(self, wait=False):
+        """Отмена jog: байт 0x85 уходит сразу, без ожидания ответов. Можно вызывать из любого потока"""
+        with self._jog_lock:
+            self._jog_stops += 1
+        self._cancel_jog(wait)
+
+    def _cancel_jog(self, wait):
+        with self._jog_lock:
+            if not self._jog_active and self._jog_thread is None:
+                return
+            thread = self._jog_thread
+            self._jog_active = False
+        self._write_jog_cancel()
+        if wait and thread is not None:
+            thread.join()
+
+    def _write_jog_cancel(self):
+        # jog_stop() приходит и из GUI-потока, в том числе во время отключения
+        io = self.io
+        if io is None:
+            return
+        try:
+            io.write_realtime(self.JOG_CANCEL)
+        except (serial.SerialException, OSError) as e:
+            self.logger.warning(f"Jog cancel not sent: {e}")
+
+    def jog_wait(self):
+        """Блокирует до окончания jog: jog_stop() из другого потока или упор в границу оси"""
+        thread = self._jog_thread
+        if thread is not None:
+            thread.join()
+
+    def _jog_loop(self, axis, direction, speed, limits):
+        index = 'XYZ'.index(axis)
+        target = self.position[index]
+        step = speed / 60.0 * self.JOG_STEP_TIME
+        pending = deque()
+        try:
+            while self._jog_active:
+                if len(pending) >= self.JOG_QUEUE_DEPTH:
+                    if not pending.popleft().result(timeout=self.timeout).ok:
+                        break
+                    continue
+                next_target = target + direction * step
+                if limits is not None:
+                    next_target = min(next_target, limits[1]) if direction > 0 else max(next_target, limits[0])
+                if (next_target - target) * direction <= 0:
+                    break  # упёрлись в границу
+                pending.append(self.io.send_command(
+                    f"$J=G91 G21 {axis}{next_target - target:.3f} F{speed}"))
+                target = next_target
+            for future in pending:
+                future.result(timeout=self.timeout)
+        except Exception as e:
+            self.logger.error(f"Jog failed: {e}")
+        finally:
+            # Шаги, принятые из буфера уже после первой отмены, отменяем повторно
+            self._write_jog_cancel()
+            self._jog_active = False
+            try:
+                self._wait_for_idle()
+                self.X, self.Y, self.Z = self.position
+            except TimeoutError:
+                self.logger.warning("GRBL did not stop after jog cancel")
+            self._jog_thread = None
 
     # --- Домашнее положение ---
     def home(self):
-        self._send_gcode("$H")
+        self._send_gcode("$H", timeout=self.MOVE_TIMEOUT)
         # self._wait_for_idle()
-        self.X, self.Y = 0, 0
+        self.X, self.Y, self.Z = 0, 0, 0
 
     # --- Вспомогательные ---
     def _check_limits(self, value, axis):
@@ -128,44 +478,118 @@ class CncMachineDriver:
             raise ValueError(f"X must be in range [{self.X_MIN}, {self.X_MAX}]")
         if axis == 'Y' and not (self.Y_MIN <= value <= self.Y_MAX):
             raise ValueError(f"Y must be in range [{self.Y_MIN}, {self.Y_MAX}]")
+        if axis == 'Z' and not (self.Z_MIN <= value <= self.Z_MAX):
+            raise ValueError(f"Z must be in range [{self.Z_MIN}, {self.Z_MAX}]")
 
     def _execute_move(self, command):
-        self._send_gcode(command)
-        self._send_gcode("M400")  # Ждём окончания движения
+        started = time.perf_counter()
+        response = self._send_gcode(command)
+        if not response.ok:
+            raise GrblError(f"GRBL rejected move {command!r}: {response.status}")
+        self._wait_for_planner()
+        MOVE_SECONDS.observe(time.perf_counter() - started)
+
+    def _wait_for_planner(self, on_poll=None):
+        """
+        Ждёт окончания всех движений в планировщике и состояния Idle. Пауза (Hold) может
+        длиться сколько угодно; on_poll() вызывается раз в self.timeout, пока ждём.
+        """
+        # G4 P0 подтверждается только после опустошения планировщика
+        response = self._await_response(self.io.send_command("G4 P0"), "G4 P0", on_poll)
+        if not response.ok:
+            raise GrblError(f"GRBL rejected G4 P0: {response.status}")
         self._wait_for_idle()
-        self._log_response("Movement complete")
 
     def _wait_for_idle(self, timeout=5):
-        start_time = time.time()
-        while time.time() - start_time < timeout:
-            self._send_gcode("?")
-            time.sleep(0.2)
-            responses = self._read_response()
-            print("DEBUG", responses)
-            for line in responses:
-                self.logger.info(f"[STATUS] {line}")   # Показываем ответ GRBL
-            
-                if line.startswith("<Idle"):
-                    self.logger.info("GRBL is Idle. Movement complete.")
-                    return
-        raise TimeoutError("GRBL did not return to Idle state")
-    
-    def _send_gcode(self, command):
-        self.serial_port_object.write((command + '\n').encode())
-        self.logger.info(f"[SEND] {command}")
-
-    def _read_response(self, wait_time=0.5):
-        """Чтение ответа от GRBL"""
-        responses = []
-        time.sleep(wait_time)   # Даем GRBL время ответить
-        while self.serial_port_object.in_waiting:
-            line = self.serial_port_object.readline().decode('utf-8').strip()
-            if line:
-                responses.append(line)
-        return responses
-    
-    def _log_response(self, context=""):
-        responses = self._read_response()
-        for res in responses:
-            self.logger.info(f"[RESP][{context}] {res}")
+        started = time.monotonic()
+        status = self.state.wait_for(
+            lambda st: st.timestamp > started and st.state == "Idle", timeout)
+        if status is None:
+            raise TimeoutError("GRBL did not return to Idle state")
+        self.logger.debug("GRBL is Idle. Movement complete.")
+
+    def _send_gcode(self, command, timeout=None):
+        """Отправляет строку и ждёт ответ ok/error:N, возвращает GrblResponse"""
+        future = self.io.send_command(command)
+        response = future.result(timeout=self.timeout if timeout is None else timeout)
+        if response.ok:
+            self._track_modal(command)
+        for line in response.lines:
+            self.logger.debug(f"[RESP][{command}] {line}")
+        self.logger.debug(f"[SEND] {command} -> {response.status} ({response.latency * 1000:.1f} ms)")
+        return response
+
+    # --- Состояние станка ---
+    @property
+    def status(self):
+        """Последний MachineStatus из опроса '?' (None до первого отчёта)"""
+        return self.state.status
+
+    @property
+    def position(self):
+        """Реальное положение (x, y, z) в рабочих координатах; до первого отчёта — заданное"""
+        status = self.state.status
+        if status is None:
+            return (float(self.X), float(self.Y), float(self.Z))
+        return status.wpos
+
+    def subscribe(self, callback):
+        """Подписка на изменения состояния станка: callback(MachineStatus) из потока опроса"""
+        self.state.subscribe(callback)
+
+    def unsubscribe(self, callback):
+        self.state.unsubscribe(callback)
+
+    # --- Задержка обмена ---
+    @property
+    def last_latency(self):
+        """Время последнего обмена команда -> ответ, с (None до первой команды)"""
+        return self.io.last_latency if self.io else None
+
+    def latency_stats(self):
+        """Статистика задержки обмена по последним командам: count, mean, p50, p95, max (с)"""
+        samples = sorted(self.io.latencies) if self.io else []
+        if not samples:
+            return {"count": 0}
+        return {
+            "count": len(samples),
+            "mean": sum(samples) / len(samples),
+            "p50": samples[len(samples) // 2],
+            "p95": samples[min(len(samples) - 1, int(len(samples) * 0.95))],
+            "max": samples[-1],
+        }
+
+    def _await_response(self, future, what, on_poll=None):
+        """
+        Ждёт ответ на уже отправленную строку. Ответ может идти долго (место в планировщике,
+        G4 P0 после длинных движений), поэтому ошибкой считается только молчание GRBL или
+        отсутствие ответа дольше MOVE_TIMEOUT вне паузы (Hold/Door).
+        """
+        deadline = time.monotonic() + self.MOVE_TIMEOUT
+        while True:
+            try:
+                return future.result(timeout=self.timeout)
+            except FutureTimeout:
+                now = time.monotonic()
+                status = self.state.status
+                if status is None or now - status.timestamp > self.timeout:
+                    raise GrblError(f"GRBL stopped responding while waiting for {what}")
+                if status.state.startswith(('Hold', 'Door')):
+                    deadline = now + self.MOVE_TIMEOUT
+                elif now > deadline:
+                    raise GrblError(f"No response to {what} in {self.MOVE_TIMEOUT} s")
+                if on_poll is not None:
+                    on_poll()
 
+    def _ack_stream_line(self, pending, errors, on_ack=None):
+        """Ждёт ответ ok/error на самую старую неподтверждённую строку, возвращает её длину"""
+        number, line, size, future = pending.popleft()
+        # ok на строку приходит, когда для неё есть место в планировщике
+        response = self._await_response(future, f"streamed line {number} {line!r}")
+        if not response.ok:
+            self.modal.clear()  # отвергнутая строка могла не применить свои модальные слова
+            self.logger.warning(f"[STREAM] line {number} {line!r} -> {response.status}")
+            errors.append((number, line, response.status))
+        if on_ack is not None:
+            on_ack(number, line, response)
+        return size
@@ -0,0 +1,516 @@
+"""
+Сжатие плотных ломаных перед потоковой отправкой в GRBL.
+
+    path = compress_path(points, tolerance=0.01, resolution=0.001)
+    driver.stream(path.gcode(feed=1500))
+    print(path.stats(feed=1500))
+
+или сразу driver.move_xy_path(points, speed=1500, tolerance=0.01).
+
+Этапы (все тяжёлые шаги — операции NumPy над массивами, а не циклы по точкам):
+  1. Округление к сетке resolution (шаг станка) и удаление повторяющихся точек.
+  2. Удаление точно коллинеарных точек: на целочисленной сетке проверка точная.
+  3. Упрощение Рамера-Дугласа-Пекера с допуском tolerance (итеративно, все отрезки
+     одного поколения деления считаются одним векторным выражением).
+  4. Подбор дуг по вершинам из п.3: окружность через начало, середину и конец участка
+     принимается, если все входные точки участка (и выброшенные при округлении и слиянии)
+     лежат на ней в пределах tolerance, обход монотонный и хорды не отходят от дуги
+     дальше tolerance. Короткие участки проверяются пачкой для всех кандидатов сразу,
+     дальше участки растут экспоненциально и уточняются бинарным поиском. Дуги выдаются
+     как G2/G3 с I/J.
+
+Результат сверяется со входными точками; дуга, отошедшая дальше tolerance, заменяется
+отрезками из п.3, которые укладываются в допуск по построению.
+"""
+import math
+import bisect
+import logging
+from collections import namedtuple
+
+import numpy as np
+
+# Сводка по сжатию пути
+PathStats = namedtuple("PathStats", [
+    "input_points",   # точек во входной ломаной
+    "output_lines",   # строк G-кода после сжатия
+    "arcs",           # из них дуг G2/G3
+    "input_bytes",    # байт без сжатия (по строке G1 на точку, как в move_xy_path)
+    "output_bytes",   # байт после сжатия
+    "bytes_saved",
+    "ratio",          # во сколько раз меньше строк
+])
+
+LINE, CW, CCW = 1, 2, 3   # G1, G2, G3
+
+
+def _quantize(points, resolution):
+    """Точки на целочисленной сетке resolution без повторов подряд; индексы исходных точек"""
+    grid = np.rint(points / resolution).astype(np.int64)
+    keep = np.ones(len(grid), dtype=bool)
+    keep[1:] = np.any(grid[1:] != grid[:-1], axis=1)
+    return grid[keep], np.flatnonzero(keep)
+
+
+def _drop_collinear(grid):
+    """Маска точек, не лежащих точно на прямой между соседями (разворот назад сохраняется)"""
+    keep = np.ones(len(grid), dtype=bool)
+    if len(grid) > 2:
+        d = np.diff(grid, axis=0)
+        cross = d[:-1, 0] * d[1:, 1] - d[:-1, 1] * d[1:, 0]
+        dot = d[:-1, 0] * d[1:, 0] + d[:-1, 1] * d[1:, 1]
+        keep[1:-1] = (cross != 0) | (dot <= 0)
+    return keep
+
+
+def _spans(lo, hi):
+    """Склеенные диапазоны lo[k]..hi[k] включительно: (индексы, номер диапазона, начало каждого)"""
+    lengths = hi - lo + 1
+    offsets = np.cumsum(lengths) - lengths
+    owner = np.repeat(np.arange(len(lo)), lengths)
+    return np.arange(int(lengths.sum())) - offsets[owner] + lo[owner], owner, offsets
+
+
+def simplify(points, tolerance):
+    """
+    Рамер-Дуглас-Пекер без рекурсии.
+
+    Отрезки обрабатываются поколениями: за один проход считаются расстояния для всех
+    отрезков, ещё требующих деления, поэтому число вызовов NumPy растёт с глубиной
+    деления, а не с числом сохранённых вершин.
+
+    Args:
+        points (np.ndarray): (N, 2) вершины ломаной.
+        tolerance (float): Максимальное отклонение, мм.
+
+    Returns:
+        np.ndarray: Индексы сохранённых вершин (первая и последняя всегда).
+    """
+    n = len(points)
+    if n < 3:
+        return np.arange(n)
+    keep = np.zeros(n, dtype=bool)
+    keep[0] = keep[-1] = True
+    x, y = np.ascontiguousarray(points[:, 0]), np.ascontiguousarray(points[:, 1])
+    starts, ends = np.array([0]), np.array([n - 1])
+    while len(starts):
+        inner = ends - starts > 1
+        starts, ends = starts[inner], ends[inner]
+        if not len(starts):
+            break
+        index, owner, offsets = _spans(starts + 1, ends - 1)
+        vx, vy = x[ends] - x[starts], y[ends] - y[starts]
+        length2 = vx * vx + vy * vy
+        with np.errstate(divide="ignore"):
+            scale = np.where(length2 > 0, 1.0 / length2, 0.0)
+        wx, wy = x[index] - x[starts][owner], y[index] - y[starts][owner]
+        vx, vy = vx[owner], vy[owner]
+        t = np.clip((wx * vx + wy * vy) * scale[owner], 0.0, 1.0)
+        d = np.hypot(wx - t * vx, wy - t * vy)
+        # Первый максимум каждого отрезка, как у np.argmax
+        worst = np.maximum.reduceat(d, offsets)
+        at_max = np.flatnonzero(d == worst[owner])
+        first_of_owner = np.ones(len(at_max), dtype=bool)
+        first_of_owner[1:] = owner[at_max[1:]] != owner[at_max[:-1]]
+        first = at_max[first_of_owner]
+        split = worst > tolerance
+        middle = index[first[split]]
+        keep[middle] = True
+        starts, ends = np.concatenate((starts[split], middle)), np.concatenate((middle, ends[split]))
+    return np.flatnonzero(keep)
+
+
+def _turns(points):
+    """Знак поворота и радиус окружности для каждой тройки подряд идущих вершин"""
+    a, b, c = points[:-2], points[1:-1], points[2:]
+    ab = np.hypot(*(b - a).T)
+    bc = np.hypot(*(c - b).T)
+    ca = np.hypot(*(a - c).T)
+    cross = (b - a)[:, 0] * (c - b)[:, 1] - (b - a)[:, 1] * (c - b)[:, 0]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        radius = ab * bc * ca / (2.0 * np.abs(cross))
+    return np.sign(cross), radius
+
+
+class _ArcFitter:
+    """
+    Проверка дуг пачками. Дуга через points[i0], points[(i0 + i1) // 2] и points[i1]
+    сверяется со всеми входными точками участка source[source_index[i0]..source_index[i1]],
+    включая выброшенные при округлении и слиянии коллинеарных.
+    """
+
+    CHUNK = 1 << 20   # сколько точек проверяется за один проход fit_many()
+
+    def __init__(self, points, source, source_index, tolerance, resolution, min_radius, max_radius):
+        self.points = points
+        self.source = source
+        self.source_index = source_index
+        self.tolerance = tolerance
+        self.resolution = resolution
+        self.min_radius = min_radius
+        self.max_radius = max_radius
+
+    def fit(self, i0, i1):
+        """Дуга по точкам points[i0..i1]: (центр, направление) или None"""
+        ok, centers, kinds = self.fit_many(np.array([i0]), np.array([i1]))
+        return (centers[0], int(kinds[0])) if ok[0] else None
+
+    def fit_many(self, i0, i1):
+        """
+        Пачка участков points[i0[k]..i1[k]].
+
+        Returns:
+            tuple: (годна ли дуга, центры, CW/CCW) — массивы длины len(i0).
+        """
+        ok = np.zeros(len(i0), dtype=bool)
+        centers = np.full((len(i0), 2), np.nan)
+        kinds = np.zeros(len(i0), dtype=np.int8)
+        size = np.cumsum((i1 - i0 + 1) + (self.source_index[i1] - self.source_index[i0] + 1))
+        bounds = np.unique(np.concatenate(([0], np.searchsorted(size, np.arange(self.CHUNK, size[-1] if len(size) else 0,
+                                                                                 self.CHUNK)), [len(i0)])))
+        for lo, hi in zip(bounds[:-1], bounds[1:]):
+            ok[lo:hi], centers[lo:hi], kinds[lo:hi] = self._fit_chunk(i0[lo:hi], i1[lo:hi])
+        return ok, centers, kinds
+
+    def _fit_chunk(self, i0, i1):
+        p = self.points
+        a, m, b = p[i0], p[(i0 + i1) // 2], p[i1]
+        d = 2.0 * (a[:, 0] * (m[:, 1] - b[:, 1]) + m[:, 0] * (b[:, 1] - a[:, 1]) + b[:, 0] * (a[:, 1] - m[:, 1]))
+        ok = np.abs(d) >= 1e-12
+        d = np.where(ok, d, 1.0)
+        a2, m2, b2 = np.einsum('ij,ij->i', a, a), np.einsum('ij,ij->i', m, m), np.einsum('ij,ij->i', b, b)
+        ux = (a2 * (m[:, 1] - b[:, 1]) + m2 * (b[:, 1] - a[:, 1]) + b2 * (a[:, 1] - m[:, 1])) / d
+        uy = (a2 * (b[:, 0] - m[:, 0]) + m2 * (a[:, 0] - b[:, 0]) + b2 * (m[:, 0] - a[:, 0])) / d
+        # Центр тоже уходит в G-код с шагом resolution
+        center = np.rint(np.stack((ux, uy), axis=1) / self.resolution) * self.resolution
+        radius = np.hypot(*(a - center).T)
+        ok &= (radius >= self.min_radius) & (radius <= self.max_radius)
+        # GRBL проверяет, что начало и конец на одной окружности (error:33)
+        ok &= np.abs(np.hypot(*(b - center).T) - radius) <= 2 * self.resolution
+        kinds = np.zeros(len(i0), dtype=np.int8)
+        k = np.flatnonzero(ok)
+        if not len(k):
+            return ok, center, kinds
+        c, r = center[k], radius[k]
+
+        # Обход по вершинам участка монотонный и меньше полного оборота
+        index, owner, offsets = _spans(i0[k], i1[k])
+        run = p[index] - c[owner]
+        step = np.diff(np.arctan2(run[:, 1], run[:, 0]))
+        step = (step + np.pi) % (2 * np.pi) - np.pi
+        inner = owner[1:] == owner[:-1]
+        step_offsets = offsets - np.arange(len(k))   # у каждого участка на шаг меньше, чем точек
+        step = step[inner]
+        total = np.add.reduceat(step, step_offsets)
+        direction = np.sign(total)
+        backward = np.add.reduceat(step * direction[owner[1:][inner]] <= 0, step_offsets)
+        good = (direction != 0) & (backward == 0) & (np.abs(total) < 2 * np.pi - 1e-3)
+        # Хорда длиной L отходит от дуги на r - sqrt(r^2 - L^2/4)
+        chord = np.maximum.reduceat(np.hypot(*np.diff(p[index], axis=0).T)[inner], step_offsets)
+        good &= r - np.sqrt(np.maximum(r * r - chord * chord / 4, 0.0)) <= self.tolerance
+        # Все входные точки участка в пределах допуска от окружности
+        index, owner, offsets = _spans(self.source_index[i0[k]], self.source_index[i1[k]])
+        off = np.abs(np.hypot(*(self.source[index] - c[owner]).T) - r[owner])
+        good &= np.maximum.reduceat(off, offsets) <= self.tolerance
+
+        ok[k] = good
+        kinds[k] = np.where(direction > 0, CCW, CW)
+        return ok, center, kinds
+
+
+def fit_arcs(points, vertices, tolerance, resolution, min_vertices=3,
+             min_radius=None, max_radius=1000.0, source=None, source_index=None):
+    """
+    Замена цепочек вершин дугами.
+
+    Короткие участки (min_vertices - 1 .. 2 * (min_vertices - 1) шагов по вершинам)
+    проверяются заранее одной пачкой для всех кандидатов; поштучно проверяются только
+    дуги, растущие дальше.
+
+    Args:
+        points (np.ndarray): (N, 2) точки ломаной после округления.
+        vertices (np.ndarray): Индексы вершин после simplify().
+        tolerance (float): Допуск, мм.
+        resolution (float): Шаг сетки координат, мм.
+        min_vertices (int): Сколько вершин минимум должна заменять одна дуга.
+        min_radius, max_radius (float): Допустимые радиусы, мм.
+        source (np.ndarray or None): Входные точки, по которым проверяется отклонение; points, если None.
+        source_index (np.ndarray or None): Индекс в source для каждой точки points.
+
+    Returns:
+        list: [(номер начальной вершины, номер конечной вершины, центр, LINE/CW/CCW)]
+    """
+    min_radius = min_radius if min_radius is not None else 10 * resolution
+    arcs = []
+    if len(vertices) < max(3, min_vertices):
+        return arcs
+    if source is None:
+        source, source_index = points, np.arange(len(points))
+    fitter = _ArcFitter(points, source, source_index, tolerance, resolution, min_radius, max_radius)
+    # Кандидаты: тройки вершин с разумным радиусом и одним направлением поворота подряд
+    sign, radius = _turns(points[vertices])
+    good = (sign != 0) & (radius >= min_radius) & (radius <= max_radius)
+    run_sign = np.where(good, sign, 0)
+    change = np.flatnonzero(np.diff(run_sign) != 0) + 1
+    starts = np.concatenate(([0], change))
+    ends = np.concatenate((change, [len(run_sign)]))
+    # Тройки t0..t1-1 покрывают вершины t0..t1+1
+    use = (run_sign[starts] != 0) & (ends - starts + 2 >= min_vertices)
+    first, last_vertex = starts[use], ends[use] + 1
+
+    min_span = max(2, min_vertices - 1)
+    # Начала самых коротких участков, целиком лежащих внутри одного из отрезков first..last_vertex
+    inside = last_vertex - min_span >= first
+    marks = np.zeros(len(vertices) + 1, dtype=np.int64)
+    np.add.at(marks, first[inside], 1)
+    np.add.at(marks, last_vertex[inside] - min_span + 1, -1)
+    starts = np.flatnonzero(np.cumsum(marks[:-1]) > 0)
+    table = {}
+    for span in range(min_span, 2 * min_span + 1):
+        # Участки длиннее нужны только там, где годится самый короткий
+        a = starts[starts + span < len(vertices)]
+        ok = np.zeros(len(vertices), dtype=bool)
+        centers = np.full((len(vertices), 2), np.nan)
+        kinds = np.zeros(len(vertices), dtype=np.int8)
+        ok[a], centers[a], kinds[a] = fitter.fit_many(vertices[a], vertices[a + span])
+        table[span] = ok, centers, kinds
+        if span == min_span:
+            starts = np.flatnonzero(ok)
+    candidates = starts.tolist()
+
+    def check(a, b):
+        if b - a in table:
+            ok, centers, kinds = table[b - a]
+            return (centers[a], int(kinds[a])) if ok[a] else None
+        return fitter.fit(vertices[a], vertices[b])
+
+    # Участки, где не годится ни одна короткая дуга, пропускаются сразу
+    pos = np.searchsorted(starts, first)
+    has_arc = pos < len(starts)
+    has_arc[has_arc] = starts[pos[has_arc]] + min_span <= last_vertex[has_arc]
+    previous_end = 0
+    for t0, last in zip(first[has_arc].tolist(), last_vertex[has_arc].tolist()):
+        # Соседние участки делят две вершины, поэтому новая дуга начинается не раньше
+        # конца предыдущей
+        a = max(t0, previous_end)
+        while True:
+            # Следующее начало, с которого годится хотя бы самая короткая дуга
+            pos = bisect.bisect_left(candidates, a)
+            if pos == len(candidates):
+                break
+            a = candidates[pos]
+            if a + min_span > last:
+                break
+            span = min_span
+            good_b, good_fit = a + span, check(a, a + span)
+            # Экспоненциальный рост, затем бинарный поиск последней подходящей вершины
+            bad_b = None
+            while True:
+                span *= 2
+                b = a + span
+                if b > last:
+                    b = last
+                    if b == good_b:
+                        break
+                found = check(a, b)
+                if found is None:
+                    bad_b = b
+                    break
+                good_b, good_fit = b, found
+                if b == last:
+                    break
+            while bad_b is not None and bad_b - good_b > 1:
+                b = (good_b + bad_b) // 2
+                found = check(a, b)
+                if found is None:
+                    bad_b = b
+                else:
+                    good_b, good_fit = b, found
+            arcs.append((a, good_b, good_fit[0], good_fit[1]))
+            a = previous_end = good_b
+    return arcs
+
+
+class CompressedPath:
+    """
+    Результат compress_path: вершины и тип сегмента, ведущего в каждую из них.
+
+    Attributes:
+        points (np.ndarray): (M, 2) вершины, мм; points[0] — начало пути.
+        kinds (np.ndarray): (M,) LINE/CW/CCW для сегмента, заканчивающегося в вершине
+            (kinds[0] = LINE — подход к началу пути).
+        centers (np.ndarray): (M, 2) центры дуг (NaN для прямых).
+        source_index (np.ndarray): (M,) индексы вершин во входном массиве.
+        source (np.ndarray): (N, 2) входные точки.
+    """
+
+    def __init__(self, points, kinds, centers, source_index, resolution, source):
+        self.points = points
+        self.kinds = kinds
+        self.centers = centers
+        self.source_index = source_index
+        self.resolution = resolution
+        self.source = source    # входные точки (ссылка, без копии) для stats()
+        self.decimals = max(0, -int(math.floor(math.log10(resolution) + 1e-9)))
+
+    def __len__(self):
+        return len(self.points)
+
+    @property
+    def arc_count(self):
+        return int(np.count_nonzero(self.kinds != LINE))
+
+    def _format(self, value):
+        text = f"{value:.{self.decimals}f}"
+        if '.' in text:
+            text = text.rstrip('0').rstrip('.')
+        return "0" if text in ("-0", "") else text
+
+    def gcode(self, feed=None):
+        """
+        Строки G-кода без пробелов: G1/G2/G3 только при смене, F один раз в первой строке,
+        неизменные оси опускаются.
+
+        Yields:
+            str: Строка G-кода (абсолютные координаты, G17, мм).
+        """
+        fmt = self._format
+        mode = None
+        last_x = last_y = None
+        px = py = 0.0
+        for (x, y), kind, (cx, cy) in zip(self.points.tolist(), self.kinds.tolist(), self.centers.tolist()):
+            words = [] if kind == mode else [f"G{kind}"]
+            sx, sy = fmt(x), fmt(y)
+            if sx != last_x or kind != LINE:
+                words.append("X" + sx)
+            if sy != last_y or kind != LINE:
+                words.append("Y" + sy)
+            if kind != LINE:
+                # I/J — смещение центра от начала дуги (предыдущей вершины)
+                words.append("I" + fmt(cx - px))
+                words.append("J" + fmt(cy - py))
+            if feed is not None and last_x is None:
+                words.append(f"F{feed:g}")
+            yield ''.join(words)
+            mode = kind
+            last_x, last_y = sx, sy
+            px, py = x, y
+
+    def max_deviation(self):
+        """
+        Наибольшее расстояние от входной точки до её сегмента сжатого пути, мм.
+
+        Точки между source_index[i-1] и source_index[i] проверяются против сегмента i:
+        отрезка или дуги (по радиусу; монотонность обхода проверена при подборе).
+        """
+        n = len(self.source)
+        if n == 0 or len(self.points) < 2:
+            return 0.0 if n == 0 else float(np.hypot(*(self.source - self.points[0]).T).max())
+        segment, distance = self._deviations()
+        return float(distance.max())
+
+    def _deviations(self):
+        """Для каждой входной точки: номер её сегмента и расстояние до него (не меньше двух вершин)"""
+        n = len(self.source)
+        segment = np.searchsorted(self.source_index, np.arange(n), side='left')
+        segment = np.clip(segment, 1, len(self.points) - 1)
+        start, end = self.points[segment - 1], self.points[segment]
+        v = end - start
+        w = self.source - start
+        length2 = np.einsum('ij,ij->i', v, v)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            t = np.clip(np.einsum('ij,ij->i', w, v) / length2, 0.0, 1.0)
+        t = np.where(length2 > 0, t, 0.0)
+        distance = np.hypot(w[:, 0] - t * v[:, 0], w[:, 1] - t * v[:, 1])
+        arc = self.kinds[segment] != LINE
+        if np.any(arc):
+            center = self.centers[segment[arc]]
+            radius = np.hypot(*(start[arc] - center).T)
+            distance[arc] = np.abs(np.hypot(*(self.source[arc] - center).T) - radius)
+        return segment, distance
+
+    def stats(self, feed=1000):
+        """
+        Размер пути до и после сжатия.
+
+        Несжатый путь считается так, как его отправил бы move_xy_path: строка
+        "G1 X.. Y.. F.." на каждую исходную точку.
+
+        Returns:
+            PathStats: Сводка.
+        """
+        output_lines = 0
+        output_bytes = 0
+        for line in self.gcode(feed):
+            output_lines += 1
+            output_bytes += len(line) + 1
+        input_bytes = sum(len(f"G1 X{x} Y{y} F{feed}") + 1 for x, y in self.source.tolist())
+        return PathStats(len(self.source), output_lines, self.arc_count, input_bytes, output_bytes,
+                         input_bytes - output_bytes, len(self.source) / max(1, output_lines))
+
+
+def compress_path(points, tolerance=0.01, resolution=0.001, fit_arcs_enabled=True,
+                  min_arc_vertices=3, max_radius=1000.0):
+    """
+    Сжатие ломаной: округление, слияние (почти) коллинеарных сегментов, дуги G2/G3.
+
+    Args:
+        points (array-like): (N, 2) точки XY, мм.
+        tolerance (float): Максимальное отклонение от исходной ломаной, мм.
+        resolution (float): Шаг округления координат (разрешение станка), мм.
+        fit_arcs_enabled (bool): Подбирать дуги.
+        min_arc_vertices (int): Сколько вершин после упрощения должна заменять дуга.
+        max_radius (float): Дуги большего радиуса остаются отрезками.
+
+    Returns:
+        CompressedPath: Вершины и сегменты.
+    """
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    if tolerance <= resolution:
+        raise ValueError("tolerance must be larger than the resolution")
+    if len(points) == 0:
+        empty = np.empty((0, 2))
+        return CompressedPath(empty, np.empty(0, dtype=np.int8), empty, np.empty(0, dtype=np.int64),
+                              resolution, points)
+
+    grid, index = _quantize(points, resolution)
+    keep = _drop_collinear(grid)
+    grid, index = grid[keep], index[keep]
+    dense = grid * resolution
+    # Округление уже сдвинуло точки до resolution/sqrt(2), остаток допуска — упрощению
+    budget = tolerance - resolution * math.sqrt(0.5)
+    vertices = simplify(dense, budget)
+    if not fit_arcs_enabled:
+        return _build_path(dense, vertices, index, [], resolution, points)
+
+    # Дуги сверяются со входными точками с полным допуском
+    arcs = fit_arcs(dense, vertices, tolerance, resolution, min_arc_vertices,
+                    max_radius=max_radius, source=points, source_index=index)
+    path = _build_path(dense, vertices, index, arcs, resolution, points)
+    if not arcs:
+        return path
+    segment, distance = path._deviations()
+    bad = np.unique(segment[distance > tolerance])
+    if len(bad):
+        # Не должно случаться; дуги с превышением заменяются отрезками RDP, которые
+        # укладываются в budget по построению
+        ends = set(path.source_index[bad].tolist())
+        logging.getLogger("PathCompress").warning(f"{len(bad)} fitted arcs exceed the tolerance, replaced with lines")
+        arcs = [arc for arc in arcs if int(index[vertices[arc[1]]]) not in ends]
+        path = _build_path(dense, vertices, index, arcs, resolution, points)
+        if path.max_deviation() > tolerance:
+            path = _build_path(dense, vertices, index, [], resolution, points)
+    return path
+
+
+def _build_path(dense, vertices, index, arcs, resolution, source):
+    """CompressedPath из вершин simplify() и дуг fit_arcs(); вершины внутри дуг выбрасываются"""
+    keep_vertex = np.ones(len(vertices), dtype=bool)
+    kinds = np.full(len(vertices), LINE, dtype=np.int8)
+    centers = np.full((len(vertices), 2), np.nan)
+    for a, b, center, kind in arcs:
+        keep_vertex[a + 1:b] = False
+        kinds[b] = kind
+        centers[b] = center
+    vertices = vertices[keep_vertex]
+    return CompressedPath(dense[vertices], kinds[keep_vertex], centers[keep_vertex],
+                          index[vertices], resolution, source)
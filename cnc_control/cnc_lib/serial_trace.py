@@ -0,0 +1,293 @@
+"""
+Двоичная трасса обмена с GRBL и её воспроизведение.
+
+Запись:
+    driver = CncMachineDriver(port, 115200, 2, trace_file="logs/grbl.trace")
+
+Каждый write() в порт (TX) и каждый прочитанный кусок (RX) сохраняется как запись
+    <d B I> time.monotonic(), направление (0 = TX, 1 = RX), длина  + сами байты
+Поток чтения только кладёт кортеж в очередь, форматированием и записью на диск
+занимается фоновый поток. Файл ротируется как у RotatingFileHandler: grbl.trace,
+grbl.trace.1, ... grbl.trace.N (самый старый).
+
+Воспроизведение (полная скорость или с исходными интервалами):
+    python -m cnc_control.cnc_lib.serial_trace replay logs/grbl.trace [--realtime]
+    python -m cnc_control.cnc_lib.serial_trace dump logs/grbl.trace
+
+RX-байты прогоняются через тот же GrblSerialIO._feed, что и при работе со станком,
+TX-строки ставятся в очередь ожидания ответа, поэтому ok/error сопоставляются с
+командами так же, как в поле.
+"""
+import os
+import sys
+import time
+import struct
+import logging
+import argparse
+import threading
+from collections import deque, namedtuple, Counter
+
+from cnc_control.cnc_lib.grbl_io import GrblSerialIO
+from cnc_control.cnc_lib.machine_state import parse_status_report
+
+MAGIC = b"GRBLTRC1"
+RECORD = struct.Struct("<dBI")
+TX, RX = 0, 1
+
+TraceRecord = namedtuple("TraceRecord", ["timestamp", "direction", "data"])
+
+
+# --- Запись ---
+class SerialTrace:
+    """Неблокирующая запись TX/RX байтов в ротируемый двоичный файл"""
+
+    FLUSH_INTERVAL = 0.2   # как часто фоновый поток сбрасывает накопленное (с)
+
+    def __init__(self, path, max_bytes=16 * 1024 * 1024, backup_count=5, max_pending=100000):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.max_pending = max_pending
+        self.records = 0
+        self.dropped = 0     # записи, выброшенные из-за переполнения очереди
+        self._pending = deque()
+        self._wakeup = threading.Event()
+        self._file = None
+        self._size = 0
+        self._running = False
+        self._thread = None
+        self.logger = logging.getLogger("SerialTrace")
+
+    def start(self):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        self._open()
+        self._running = True
+        self._thread = threading.Thread(target=self._writer_loop, name="SerialTrace", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if not self._running:
+            return
+        self._running = False
+        self._wakeup.set()
+        self._thread.join()
+        self._file.close()
+        self._file = None
+        if self.dropped:
+            self.logger.warning(f"Trace dropped {self.dropped} records")
+
+    def record(self, direction, data):
+        """Вызывается из потоков обмена: только append, без блокировок и форматирования"""
+        if len(self._pending) >= self.max_pending:
+            self.dropped += 1
+            return
+        self._pending.append((time.monotonic(), direction, bytes(data)))
+
+    def tx(self, data):
+        self.record(TX, data)
+
+    def rx(self, data):
+        self.record(RX, data)
+
+    # --- Фоновая запись ---
+    def _open(self):
+        self._file = open(self.path, "wb")
+        self._file.write(MAGIC)
+        self._size = len(MAGIC)
+
+    def _rotate(self):
+        self._file.close()
+        if self.backup_count > 0:
+            for i in range(self.backup_count - 1, 0, -1):
+                src = f"{self.path}.{i}"
+                if os.path.exists(src):
+                    os.replace(src, f"{self.path}.{i + 1}")
+            os.replace(self.path, f"{self.path}.1")
+        self._open()
+
+    def _writer_loop(self):
+        while True:
+            self._wakeup.wait(self.FLUSH_INTERVAL)
+            self._wakeup.clear()
+            running = self._running
+            chunks = []
+            while self._pending:
+                timestamp, direction, data = self._pending.popleft()
+                chunks.append(RECORD.pack(timestamp, direction, len(data)) + data)
+            try:
+                self._write(chunks)
+            except OSError as e:
+                self.logger.error(f"Trace write failed: {e}")
+            if not running:
+                return
+
+    def _write(self, chunks):
+        for chunk in chunks:
+            if self.max_bytes and self._size + len(chunk) > self.max_bytes and self._size > len(MAGIC):
+                self._rotate()
+            self._file.write(chunk)
+            self._size += len(chunk)
+            self.records += 1
+        self._file.flush()
+
+
+# --- Чтение ---
+def trace_files(path):
+    """Файлы трассы от самого старого к текущему: path.N, ..., path.1, path"""
+    files = []
+    i = 1
+    while os.path.exists(f"{path}.{i}"):
+        files.append(f"{path}.{i}")
+        i += 1
+    files.reverse()
+    if os.path.exists(path):
+        files.append(path)
+    return files
+
+
+def read_trace(path):
+    """Генератор TraceRecord одного файла; обрезанная последняя запись пропускается"""
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a GRBL trace file")
+        while True:
+            header = f.read(RECORD.size)
+            if len(header) < RECORD.size:
+                return
+            timestamp, direction, length = RECORD.unpack(header)
+            data = f.read(length)
+            if len(data) < length:
+                return
+            yield TraceRecord(timestamp, direction, data)
+
+
+# --- Воспроизведение ---
+class _ReplayPort:
+    """Заглушка serial.Serial для GrblSerialIO: запись никуда не уходит"""
+
+    def write(self, data):
+        return len(data)
+
+    def cancel_read(self):
+        pass
+
+
+def replay(records, realtime=False, speed=1.0, on_line=None, on_status=None):
+    """
+    Прогоняет трассу через GrblSerialIO и разбор отчётов о состоянии.
+
+    Args:
+        records (iterable): TraceRecord в порядке записи.
+        realtime (bool): Выдерживать исходные интервалы между записями.
+        speed (float): Ускорение при realtime=True.
+        on_line (callable or None): on_line(response) для каждого завершённого GrblResponse.
+        on_status (callable or None): on_status(status) для каждого MachineStatus
+            (timestamp — время из трассы).
+
+    Returns:
+        dict: Сводка: команды, ответы, ошибки, отчёты, тревоги, задержки ответов.
+    """
+    io = GrblSerialIO(_ReplayPort(), logging.getLogger("GrblReplay"))
+    summary = Counter()
+    latencies = []
+    futures = deque()
+    alarms = []
+    io.add_alarm_callback(alarms.append)
+    status = None
+    first_record = first_wall = None
+
+    def collect(now):
+        while futures and futures[0][1].done():
+            sent_at, future = futures.popleft()
+            try:
+                response = future.result()
+            except Exception:
+                summary["failed"] += 1
+                continue
+            summary["responses"] += 1
+            if not response.ok:
+                summary["errors"] += 1
+            # Задержка по времени трассы, а не по времени воспроизведения
+            latencies.append(now - sent_at)
+            if on_line is not None:
+                on_line(response)
+
+    for record in records:
+        if realtime:
+            if first_record is None:
+                first_record, first_wall = record.timestamp, time.monotonic()
+            delay = (record.timestamp - first_record) / speed - (time.monotonic() - first_wall)
+            if delay > 0:
+                time.sleep(delay)
+        if record.direction == TX:
+            text = record.data.decode("utf-8", errors="replace")
+            if text.endswith("\n"):
+                futures.append((record.timestamp, io.send_command(text[:-1])))
+                summary["commands"] += 1
+            else:
+                summary["realtime"] += 1
+            continue
+        io._feed(record.data)
+        collect(record.timestamp)
+        while not io.status_queue.empty():
+            line = io.status_queue.get_nowait()
+            try:
+                status = parse_status_report(line, status)._replace(timestamp=record.timestamp)
+            except ValueError:
+                summary["bad_status"] += 1
+                continue
+            summary["status"] += 1
+            if on_status is not None:
+                on_status(status)
+
+    summary["alarms"] = sum(1 for line in alarms if line.startswith("ALARM"))
+    summary["unanswered"] = len(futures)
+    result = dict(summary)
+    if latencies:
+        latencies.sort()
+        result["latency_p50_ms"] = latencies[len(latencies) // 2] * 1000
+        result["latency_p99_ms"] = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000
+        result["latency_max_ms"] = latencies[-1] * 1000
+    return result
+
+
+def _records(path):
+    for file in trace_files(path):
+        yield from read_trace(file)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="GRBL serial trace tools")
+    sub = parser.add_subparsers(dest="command", required=True)
+    dump = sub.add_parser("dump", help="print records as text")
+    dump.add_argument("path")
+    rep = sub.add_parser("replay", help="feed the trace through the response parser")
+    rep.add_argument("path")
+    rep.add_argument("--realtime", action="store_true", help="keep the recorded timing")
+    rep.add_argument("--speed", type=float, default=1.0)
+    rep.add_argument("--verbose", action="store_true", help="print every response and status")
+    args = parser.parse_args(argv)
+
+    if args.command == "dump":
+        start = None
+        for record in _records(args.path):
+            start = record.timestamp if start is None else start
+            arrow = ">>" if record.direction == TX else "<<"
+            print(f"{record.timestamp - start:10.6f} {arrow} {record.data!r}")
+        return 0
+
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.WARNING)
+    started = time.perf_counter()
+    result = replay(_records(args.path), args.realtime, args.speed,
+                    on_line=print if args.verbose else None,
+                    on_status=print if args.verbose else None)
+    result["replay_s"] = time.perf_counter() - started
+    for key, value in sorted(result.items()):
+        print(f"{key:16} {value:.3f}" if isinstance(value, float) else f"{key:16} {value}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
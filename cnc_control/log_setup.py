@@ -0,0 +1,52 @@
+"""
+Non-blocking logging: every logger call only puts the LogRecord on a queue, and a
+QueueListener thread formats it and writes it to the real handlers.
+
+    listener = setup_queue_logging(logging.INFO, log_file="logs/cnc.log")
+    ...
+    listener.stop()   # flushes what is still queued
+
+The serial reader, the status poller and the jog thread log from time-critical
+loops; with this setup they never wait for a terminal or a disk.
+"""
+import os
+import queue
+import logging
+import logging.handlers
+
+
+LOG_FORMAT = "%(asctime)s %(levelname)s %(name)s: %(message)s"
+
+
+def setup_queue_logging(level=logging.INFO, log_file=None, max_bytes=10 * 1024 * 1024, backup_count=3):
+    """
+    Route the root logger through a QueueHandler.
+
+    Args:
+        level (int): Root logger level.
+        log_file (str or None): Also write to this rotating file.
+        max_bytes (int): Rotation size of log_file.
+        backup_count (int): Rotated log files to keep.
+
+    Returns:
+        logging.handlers.QueueListener: Running listener; call stop() at exit.
+    """
+    formatter = logging.Formatter(LOG_FORMAT)
+    handlers = [logging.StreamHandler()]
+    if log_file:
+        os.makedirs(os.path.dirname(os.path.abspath(log_file)), exist_ok=True)
+        handlers.append(logging.handlers.RotatingFileHandler(
+            log_file, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8"))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    log_queue = queue.SimpleQueue()
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(logging.handlers.QueueHandler(log_queue))
+    root.setLevel(level)
+
+    listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    return listener
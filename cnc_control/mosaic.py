@@ -0,0 +1,257 @@
+"""
+Mosaic stitching from stage positions into a memory-mapped image pyramid on disk.
+
+    with MosaicBuilder("scan_mosaic", region=(-100, 0, -20, 60), pixels_per_mm=200) as mosaic:
+        for shot in acquisition.run(plan):
+            mosaic.add_acquired(shot)
+
+Each frame is placed at its stage XY, nudged by phase correlation against what is
+already on the canvas, and written into level 0 plus every pyramid level above it.
+Canvases are .npy memmaps, so memory use depends on the frame size, not on the
+scan size, and MosaicReader (or another process with np.load(mmap_mode='r')) can
+view the mosaic while the scan is still running.
+"""
+import os
+import json
+import threading
+
+import cv2
+import numpy as np
+
+
+METADATA_FILE = "mosaic.json"
+
+
+def _level_path(directory, level):
+    return os.path.join(directory, f"level{level}.npy")
+
+
+class MosaicBuilder:
+    def __init__(self, directory, region, pixels_per_mm, camera_pixels_per_mm=None, levels=5,
+                 x_direction=1, y_direction=1, refine=True, max_shift_mm=0.5,
+                 min_overlap=0.05, min_response=0.1, on_update=None):
+        """
+        Args:
+            directory (str): Output directory (created); existing canvases are overwritten.
+            region (tuple): (x_min, y_min, x_max, y_max) stage area in mm covered by the canvas.
+            pixels_per_mm (float): Canvas resolution at level 0.
+            camera_pixels_per_mm (float or None): Resolution of incoming frames; frames are
+                resized to the canvas resolution if it differs. Same as pixels_per_mm if None.
+            levels (int): Pyramid levels, each half the size of the previous one.
+            x_direction, y_direction (int): +1 if the image axis grows with the stage axis,
+                -1 if it is mirrored (image rows grow downwards).
+            refine (bool): Refine placement with phase correlation on overlaps.
+            max_shift_mm (float): Largest correction accepted from phase correlation.
+            min_overlap (float): Overlap fraction of a frame needed to attempt refinement.
+            min_response (float): Minimum phase correlation peak to trust the shift.
+            on_update (callable or None): on_update(level0_rect) after each frame,
+                rect = (x0, y0, x1, y1) in level 0 pixels.
+        """
+        self.directory = directory
+        self.region = tuple(float(v) for v in region)
+        self.pixels_per_mm = float(pixels_per_mm)
+        self.camera_pixels_per_mm = float(camera_pixels_per_mm or pixels_per_mm)
+        self.x_direction = 1 if x_direction >= 0 else -1
+        self.y_direction = 1 if y_direction >= 0 else -1
+        self.refine = refine
+        self.max_shift_px = max_shift_mm * self.pixels_per_mm
+        self.min_overlap = min_overlap
+        self.min_response = min_response
+        self.on_update = on_update
+        self.placements = []   # (commanded px x, y, refined x, y, response) per frame
+        self._lock = threading.Lock()
+
+        x_min, y_min, x_max, y_max = self.region
+        width = int(np.ceil((x_max - x_min) * self.pixels_per_mm))
+        height = int(np.ceil((y_max - y_min) * self.pixels_per_mm))
+        if width <= 0 or height <= 0:
+            raise ValueError("Mosaic region must have a positive size")
+        os.makedirs(directory, exist_ok=True)
+
+        self.levels = []
+        for level in range(max(1, levels)):
+            shape = (-(-height // 2 ** level), -(-width // 2 ** level), 3)
+            canvas = np.lib.format.open_memmap(_level_path(directory, level), mode="w+",
+                                               dtype=np.uint8, shape=shape)
+            self.levels.append(canvas)
+            if min(shape[:2]) == 1:
+                break
+        # Which level-0 pixels hold image data, used to find overlaps
+        self.coverage = np.lib.format.open_memmap(os.path.join(directory, "coverage.npy"), mode="w+",
+                                                  dtype=np.uint8, shape=(height, width))
+        self._write_metadata()
+
+    def _write_metadata(self):
+        meta = {
+            "region": self.region,
+            "pixels_per_mm": self.pixels_per_mm,
+            "x_direction": self.x_direction,
+            "y_direction": self.y_direction,
+            "levels": [list(level.shape) for level in self.levels],
+            "frames": len(self.placements),
+        }
+        tmp = os.path.join(self.directory, METADATA_FILE + ".tmp")
+        with open(tmp, "w") as f:
+            json.dump(meta, f, indent=2)
+        os.replace(tmp, os.path.join(self.directory, METADATA_FILE))
+
+    # -----------------------------
+    # Coordinates
+    # -----------------------------
+    def stage_to_pixel(self, x_mm, y_mm):
+        """Level-0 canvas pixel (column, row) for a stage position."""
+        x_min, y_min, x_max, y_max = self.region
+        col = (x_mm - x_min if self.x_direction > 0 else x_max - x_mm) * self.pixels_per_mm
+        row = (y_mm - y_min if self.y_direction > 0 else y_max - y_mm) * self.pixels_per_mm
+        return col, row
+
+    # -----------------------------
+    # Adding frames
+    # -----------------------------
+    def add_frame(self, image, x_mm, y_mm):
+        """
+        Place one frame whose centre was at stage (x_mm, y_mm).
+
+        Args:
+            image (np.ndarray): BGR frame (already undistorted if needed).
+
+        Returns:
+            tuple: (col, row) of the frame's top-left corner on level 0 after refinement.
+        """
+        if self.camera_pixels_per_mm != self.pixels_per_mm:
+            scale = self.pixels_per_mm / self.camera_pixels_per_mm
+            size = (max(1, round(image.shape[1] * scale)), max(1, round(image.shape[0] * scale)))
+            image = cv2.resize(image, size, interpolation=cv2.INTER_AREA if scale < 1 else cv2.INTER_LINEAR)
+        h, w = image.shape[:2]
+        cx, cy = self.stage_to_pixel(x_mm, y_mm)
+        col, row = int(round(cx - w / 2)), int(round(cy - h / 2))
+
+        with self._lock:
+            response = None
+            if self.refine:
+                shift, response = self._refine(image, col, row)
+                if shift is not None:
+                    col, row = col + shift[0], row + shift[1]
+            rect = self._blit(image, col, row)
+            self.placements.append((int(round(cx - w / 2)), int(round(cy - h / 2)), col, row, response))
+            if rect is not None:
+                self._update_pyramid(rect)
+                self._write_metadata()
+        if rect is not None and self.on_update is not None:
+            self.on_update(rect)
+        return col, row
+
+    def add_acquired(self, frame):
+        """Add an AcquiredFrame from MoveAndCapture, at its reported (or commanded) position."""
+        image = frame.image if frame.image is not None else cv2.imread(frame.path, cv2.IMREAD_COLOR)
+        if image is None:
+            raise IOError(f"Could not read frame {frame.path}")
+        x, y = (frame.reported or frame.commanded)[:2]
+        return self.add_frame(image, x, y)
+
+    def _clip(self, col, row, w, h):
+        """Intersection of a frame rectangle with the canvas: canvas and frame slices."""
+        height, width = self.coverage.shape
+        x0, y0 = max(col, 0), max(row, 0)
+        x1, y1 = min(col + w, width), min(row + h, height)
+        if x0 >= x1 or y0 >= y1:
+            return None
+        return (x0, y0, x1, y1), (x0 - col, y0 - row, x1 - col, y1 - row)
+
+    def _refine(self, image, col, row):
+        """Phase-correlate the frame against covered canvas pixels under it."""
+        h, w = image.shape[:2]
+        clipped = self._clip(col, row, w, h)
+        if clipped is None:
+            return None, None
+        (x0, y0, x1, y1), (fx0, fy0, fx1, fy1) = clipped
+        covered = self.coverage[y0:y1, x0:x1]
+        if covered.mean() < self.min_overlap:
+            return None, None
+        # Correlate only the bounding box of the overlap, not the empty canvas around it
+        rows = np.flatnonzero(covered.any(axis=1))
+        cols = np.flatnonzero(covered.any(axis=0))
+        by0, by1, bx0, bx1 = rows[0], rows[-1] + 1, cols[0], cols[-1] + 1
+        if by1 - by0 < 16 or bx1 - bx0 < 16:
+            return None, None
+        canvas = self.levels[0][y0 + by0:y0 + by1, x0 + bx0:x0 + bx1]
+        tile = image[fy0 + by0:fy0 + by1, fx0 + bx0:fx0 + bx1]
+        a = cv2.cvtColor(np.ascontiguousarray(canvas), cv2.COLOR_BGR2GRAY).astype(np.float32)
+        b = cv2.cvtColor(np.ascontiguousarray(tile), cv2.COLOR_BGR2GRAY).astype(np.float32)
+        window = cv2.createHanningWindow(a.shape[::-1], cv2.CV_32F)
+        (dx, dy), response = cv2.phaseCorrelate(b, a, window)
+        if response < self.min_response or np.hypot(dx, dy) > self.max_shift_px:
+            return None, response
+        return (int(round(dx)), int(round(dy))), response
+
+    def _blit(self, image, col, row):
+        h, w = image.shape[:2]
+        clipped = self._clip(col, row, w, h)
+        if clipped is None:
+            return None
+        (x0, y0, x1, y1), (fx0, fy0, fx1, fy1) = clipped
+        self.levels[0][y0:y1, x0:x1] = image[fy0:fy1, fx0:fx1]
+        self.coverage[y0:y1, x0:x1] = 1
+        return x0, y0, x1, y1
+
+    def _update_pyramid(self, rect):
+        """Re-downsample only the changed rectangle into every level above 0."""
+        x0, y0, x1, y1 = rect
+        for level in range(1, len(self.levels)):
+            src, dst = self.levels[level - 1], self.levels[level]
+            # Align to even pixels so each output pixel sees its full 2x2 block
+            x0, y0 = x0 // 2 * 2, y0 // 2 * 2
+            x1, y1 = min(-(-x1 // 2) * 2, src.shape[1]), min(-(-y1 // 2) * 2, src.shape[0])
+            out_w, out_h = -(-(x1 - x0) // 2), -(-(y1 - y0) // 2)
+            block = cv2.resize(np.ascontiguousarray(src[y0:y1, x0:x1]), (out_w, out_h),
+                               interpolation=cv2.INTER_AREA)
+            x0, y0 = x0 // 2, y0 // 2
+            x1, y1 = x0 + out_w, y0 + out_h
+            dst[y0:y1, x0:x1] = block
+
+    def flush(self):
+        for canvas in self.levels:
+            canvas.flush()
+        self.coverage.flush()
+
+    def close(self):
+        self.flush()
+        self._write_metadata()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class MosaicReader:
+    """
+    Read-only view of a mosaic directory, usable while MosaicBuilder is still writing.
+
+    Levels are opened as memmaps; pages that the builder has written become visible
+    without reopening.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        with open(os.path.join(directory, METADATA_FILE)) as f:
+            self.metadata = json.load(f)
+        self.levels = [np.load(_level_path(directory, level), mmap_mode="r")
+                       for level in range(len(self.metadata["levels"]))]
+
+    @property
+    def shape(self):
+        return self.levels[0].shape
+
+    def level_for_scale(self, scale):
+        """Coarsest level that still has at least `scale` level-0 pixels per screen pixel."""
+        level = 0
+        while level + 1 < len(self.levels) and 2 ** (level + 1) <= 1.0 / max(scale, 1e-9):
+            level += 1
+        return level
+
+    def region(self, x0, y0, x1, y1, level=0):
+        """Pixels of a level-0 rectangle taken from the given pyramid level."""
+        f = 2 ** level
+        return self.levels[level][y0 // f:-(-y1 // f), x0 // f:-(-x1 // f)]
@@ -0,0 +1,251 @@
+"""
+Raster scan planning: tile a rectangular region, check the whole plan against the
+machine's soft limits, estimate how long it takes and emit it as G-code.
+
+    plan = grid_plan(-100, 0, -20, 60, tile=(8.0, 6.0), overlap=0.2)
+    plan.check_limits(driver)
+    print(plan.travel_time(feed=3000, acceleration=100))
+    driver.stream(plan.gcode(feed=3000, dwell=0.2))
+
+Waypoints are kept as an (N, 2) float array so the checks and estimates are
+vectorised over the whole plan.
+"""
+import numpy as np
+
+
+class ScanPlan:
+    def __init__(self, waypoints, tile=None, shape=None):
+        """
+        Args:
+            waypoints (array-like): (N, 2) XY positions in mm, in visiting order.
+            tile (tuple or None): (width, height) of one tile in mm, for reference.
+            shape (tuple or None): (rows, cols) of the grid the plan came from.
+        """
+        self.waypoints = np.asarray(waypoints, dtype=np.float64).reshape(-1, 2)
+        self.tile = tile
+        self.shape = shape
+
+    def __len__(self):
+        return len(self.waypoints)
+
+    def __iter__(self):
+        return iter(map(tuple, self.waypoints.tolist()))
+
+    # -----------------------------
+    # Preflight
+    # -----------------------------
+    def out_of_limits(self, x_limits, y_limits):
+        """Indices of waypoints outside [min, max] on either axis."""
+        x, y = self.waypoints[:, 0], self.waypoints[:, 1]
+        bad = (x < x_limits[0]) | (x > x_limits[1]) | (y < y_limits[0]) | (y > y_limits[1])
+        return np.flatnonzero(bad)
+
+    def check_limits(self, driver):
+        """
+        Raise ValueError if any waypoint is outside the driver's X_MIN/X_MAX, Y_MIN/Y_MAX.
+
+        Checks the whole plan before anything moves, unlike the per-move check in
+        CncMachineDriver.
+        """
+        bad = self.out_of_limits((driver.X_MIN, driver.X_MAX), (driver.Y_MIN, driver.Y_MAX))
+        if bad.size:
+            first = tuple(self.waypoints[bad[0]].tolist())
+            raise ValueError(
+                f"{bad.size} of {len(self)} scan positions are outside "
+                f"X[{driver.X_MIN}, {driver.X_MAX}] Y[{driver.Y_MIN}, {driver.Y_MAX}], "
+                f"first is #{bad[0]} at {first}"
+            )
+
+    def segment_times(self, feed, acceleration, max_rate=None, start=None):
+        """
+        Per-move durations in seconds with a trapezoidal velocity profile.
+
+        Every waypoint is treated as a full stop (move, settle, capture). The
+        acceleration along a diagonal is limited so that no axis exceeds its own
+        limit, the same way GRBL's planner does.
+
+        Args:
+            feed (float): Programmed feed rate, mm/min.
+            acceleration (float or tuple): mm/s^2, one value or (ax, ay).
+            max_rate (float or tuple or None): Axis max rates, mm/min ($110/$111).
+            start (tuple or None): Position before the first waypoint; the first
+                waypoint itself if None.
+
+        Returns:
+            np.ndarray: Duration of each move, len(self) values.
+        """
+        points = self.waypoints
+        origin = points[:1] if start is None else np.asarray(start, dtype=np.float64).reshape(1, 2)
+        delta = np.diff(np.vstack([origin, points]), axis=0)
+        distance = np.hypot(delta[:, 0], delta[:, 1])
+        moving = distance > 0
+        unit = np.zeros_like(delta)
+        unit[moving] = np.abs(delta[moving]) / distance[moving, None]
+
+        accel_axes = np.broadcast_to(np.asarray(acceleration, dtype=np.float64), (2,))
+        with np.errstate(divide="ignore"):
+            accel = np.min(accel_axes / unit, axis=1)
+        speed = np.full(len(points), feed / 60.0)
+        if max_rate is not None:
+            rate_axes = np.broadcast_to(np.asarray(max_rate, dtype=np.float64) / 60.0, (2,))
+            with np.errstate(divide="ignore"):
+                speed = np.minimum(speed, np.min(rate_axes / unit, axis=1))
+
+        times = np.zeros(len(points))
+        d, v, a = distance[moving], speed[moving], accel[moving]
+        # Reaches cruise speed if accelerating and braking fit in the move
+        cruise = d >= v * v / a
+        times[moving] = np.where(cruise, d / v + v / a, 2.0 * np.sqrt(d / a))
+        return times
+
+    def travel_time(self, feed, acceleration, max_rate=None, dwell=0.0, start=None):
+        """Total plan time in seconds: moves plus `dwell` at every waypoint."""
+        return float(self.segment_times(feed, acceleration, max_rate, start).sum() + dwell * len(self))
+
+    def travel_distance(self, start=None):
+        points = self.waypoints if start is None else np.vstack([start, self.waypoints])
+        return float(np.hypot(*np.diff(points, axis=0).T).sum())
+
+    # -----------------------------
+    # Ordering and output
+    # -----------------------------
+    def optimized(self, start=None, passes=10):
+        """Copy of the plan reordered by order_points() (grid shape is dropped)."""
+        return ScanPlan(self.waypoints[order_points(self.waypoints, start, passes)], tile=self.tile)
+
+    def gcode(self, feed, dwell=None, rapid=False):
+        """
+        Yield the plan as streamable G-code lines for CncMachineDriver.stream().
+
+        Args:
+            feed (float): Feed rate, mm/min (ignored with rapid=True).
+            dwell (float or None): G4 pause after each waypoint, s.
+            rapid (bool): Use G0 instead of G1.
+        """
+        yield "G21 G90"
+        motion = "G0" if rapid else f"G1 F{feed:g}"
+        for i, (x, y) in enumerate(self.waypoints.tolist()):
+            yield f"{motion} X{x:.3f} Y{y:.3f}" if i == 0 else f"X{x:.3f} Y{y:.3f}"
+            if dwell:
+                yield f"G4 P{dwell:.3f}"
+
+
+def grid_plan(x_min, y_min, x_max, y_max, tile, overlap=0.0, pattern="serpentine"):
+    """
+    Tile centres covering the rectangle [x_min, x_max] x [y_min, y_max].
+
+    Tiles are spaced by tile * (1 - overlap); the grid is centred on the region so
+    the leftover margin is split evenly between both sides.
+
+    Args:
+        tile (tuple or float): (width, height) of the camera field of view, mm.
+        overlap (float or tuple): Fraction of a tile shared with its neighbour, 0 <= overlap < 1.
+        pattern (str): 'serpentine' (alternate row direction) or 'raster' (row-major).
+
+    Returns:
+        ScanPlan: Waypoints row by row, starting at the lowest-x, lowest-y tile centre
+        (inset from (x_min, y_min) by the centring margin, not at the corner itself).
+    """
+    if pattern not in ("serpentine", "raster"):
+        raise ValueError("pattern must be 'serpentine' or 'raster'")
+    tile = np.broadcast_to(np.asarray(tile, dtype=np.float64), (2,))
+    overlap = np.broadcast_to(np.asarray(overlap, dtype=np.float64), (2,))
+    if np.any(tile <= 0) or np.any(overlap < 0) or np.any(overlap >= 1):
+        raise ValueError("tile must be positive and overlap in [0, 1)")
+    step = tile * (1.0 - overlap)
+    lo = np.array([x_min, y_min], dtype=np.float64)
+    size = np.array([x_max, y_max], dtype=np.float64) - lo
+    counts = np.maximum(1, np.ceil((size - tile) / step - 1e-9).astype(int) + 1)
+    covered = (counts - 1) * step
+    first = lo + (size - covered) / 2.0
+
+    cols, rows = counts
+    xs = first[0] + step[0] * np.arange(cols)
+    ys = first[1] + step[1] * np.arange(rows)
+    grid_x = np.tile(xs, (rows, 1))
+    if pattern == "serpentine":
+        grid_x[1::2] = grid_x[1::2, ::-1]
+    grid_y = np.repeat(ys, cols).reshape(rows, cols)
+    return ScanPlan(np.stack([grid_x.ravel(), grid_y.ravel()], axis=1),
+                    tile=tuple(tile.tolist()), shape=(int(rows), int(cols)))
+
+
+def order_points(points, start=None, passes=10):
+    """
+    Visiting order for a sparse point set: nearest neighbour, then 2-opt.
+
+    Args:
+        points (array-like): (N, 2) positions.
+        start (tuple or None): Current machine position; the first point if None.
+        passes (int): Maximum 2-opt improvement passes.
+
+    Returns:
+        np.ndarray: Permutation of range(N).
+    """
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    n = len(points)
+    if n < 3:
+        return np.arange(n)
+
+    # Nearest neighbour, one vectorised distance row per step
+    visited = np.zeros(n, dtype=bool)
+    order = np.empty(n, dtype=int)
+    if start is None:
+        current = 0
+    else:
+        current = int(np.argmin(np.hypot(*(points - np.asarray(start, dtype=np.float64)).T)))
+    for i in range(n):
+        order[i] = current
+        visited[current] = True
+        if i == n - 1:
+            break
+        d = np.hypot(*(points - points[current]).T)
+        d[visited] = np.inf
+        current = int(np.argmin(d))
+
+    # 2-opt on an open path: reverse order[i+1..j] when it shortens the route.
+    # For a fixed i all candidate j are evaluated at once.
+    route = points[order]
+    for _ in range(passes):
+        improved = False
+        for i in range(n - 2):
+            a, b = route[i], route[i + 1]
+            c, d = route[i + 2:], np.vstack([route[i + 3:], [np.nan, np.nan]])
+            before = np.hypot(*(a - b)) + np.nan_to_num(np.hypot(*(c - d).T), nan=0.0)
+            after = np.hypot(*(a - c).T) + np.nan_to_num(np.hypot(*(b - d).T), nan=0.0)
+            gain = before - after
+            j = int(np.argmax(gain))
+            if gain[j] > 1e-9:
+                j += i + 2
+                order[i + 1:j + 1] = order[i + 1:j + 1][::-1].copy()
+                route = points[order]
+                improved = True
+        if not improved:
+            break
+    return order
+
+
+def machine_motion_settings(driver):
+    """
+    Read axis max rates ($110/$111, mm/min) and accelerations ($120/$121, mm/s^2) from GRBL.
+
+    Returns:
+        tuple: ((rate_x, rate_y), (accel_x, accel_y)) for travel_time().
+
+    Raises:
+        ValueError: If GRBL did not report one of the settings.
+    """
+    response = driver._send_gcode("$$")
+    settings = {}
+    for line in response.lines:
+        if line.startswith("$") and "=" in line:
+            key, _, value = line.partition("=")
+            try:
+                settings[key] = float(value.split()[0])
+            except (ValueError, IndexError):
+                continue
+    missing = [key for key in ("$110", "$111", "$120", "$121") if key not in settings]
+    if missing:
+        raise ValueError(f"GRBL did not report motion settings: {', '.join(missing)}")
+    return ((settings["$110"], settings["$111"]),
+            (settings["$120"], settings["$121"]))
@@ -1,10 +1,30 @@
+import os
 import sys
+import logging
 
 from PyQt6.QtWidgets import QMainWindow, QApplication, QLabel 
+from PyQt6.QtCore import QTimer
 from mainwindow_controller import MainWindowController
+from cnc_control.metrics import REGISTRY
+from cnc_control.log_setup import setup_queue_logging
 
 if __name__ == "__main__":
+    # CNC_LOG_FILE=/path/cnc.log additionally writes a rotating log file
+    log_listener = setup_queue_logging(logging.INFO, os.environ.get("CNC_LOG_FILE"))
     app = QApplication(sys.argv)
     window = MainWindowController()
     window.show()
-    sys.exit(app.exec())
\ No newline at end of file
+
+    # Metrics export: CNC_METRICS_PORT=9100 serves http://127.0.0.1:9100/metrics,
+    # CNC_METRICS_FILE=/path/cnc.prom rewrites a textfile every 5 s
+    if os.environ.get("CNC_METRICS_PORT"):
+        REGISTRY.serve(int(os.environ["CNC_METRICS_PORT"]))
+    metrics_file = os.environ.get("CNC_METRICS_FILE")
+    if metrics_file:
+        metrics_timer = QTimer()
+        metrics_timer.timeout.connect(lambda: REGISTRY.write_file(metrics_file))
+        metrics_timer.start(5000)
+
+    code = app.exec()
+    log_listener.stop()
+    sys.exit(code)
@@ -1,14 +1,23 @@
 import sys
-import cv2
 import time
-from PyQt6.QtWidgets import QMainWindow, QApplication, QLabel
-from PyQt6.QtCore import QTimer, Qt
-from PyQt6.QtGui import QImage, QPixmap
+from PyQt6.QtWidgets import QMainWindow, QApplication, QPushButton, QFileDialog, QVBoxLayout, QLabel
+from PyQt6.QtCore import QTimer
+from PyQt6.QtGui import QKeySequence, QShortcut
 from mainwindow_ui import Ui_MainWindow  # Generated UI file
-from cnc_control.cnc_lib.new_machine_lib import CncMachineDriver
+from preview_worker import PreviewWorker
+from tiled_viewer import TiledImageView
+from motion_worker import MotionWorker
 from cnc_control.camera.camera_reader import ThreadSafeCameraReader
+from cnc_control.camera.frame_recorder import FrameRecorder
+from cnc_control.metrics import REGISTRY
+
+FRAMES_DISPLAYED = REGISTRY.counter("preview_frames_displayed_total", "Frames shown in the image view")
+DISPLAY_SECONDS = REGISTRY.histogram("preview_display_seconds", "Handing one frame to the image view (GUI thread)")
 
 class MainWindowController(QMainWindow):
+    JOG_HOLD_DELAY_MS = 300  # hold longer than this to jog continuously
+    PREVIEW_SCALE = 4        # decode preview frames at 1/4 of the sensor resolution
+
     def __init__(self):
         super().__init__()
         self.ui = Ui_MainWindow()
@@ -16,19 +25,44 @@ class MainWindowController(QMainWindow):
 
         # Camera variables
         self.cam = None
-        self.timer = QTimer()
-        self.timer.timeout.connect(self.update_frame)
-
-        # image_label
-        self.image_label = QLabel(self.ui.image_displayer)
-        self.image_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
-        self.image_label.setScaledContents(False)
-        self.image_label.resize(self.ui.image_displayer.size())
+        self.preview = None
+        self.recorder = None
+
+        # Zoomable view filling image_displayer (wheel = zoom, drag = pan, double click = fit)
+        self.image_view = TiledImageView(self.ui.image_displayer)
+        layout = QVBoxLayout(self.ui.image_displayer)
+        layout.setContentsMargins(0, 0, 0, 0)
+        layout.addWidget(self.image_view)
+        self.image_view.zoom_changed.connect(self.on_zoom_changed)
         self.clear_image_display()
 
+        # Metrics overlay over the image (F3)
+        self.metrics_label = QLabel(self.image_view)
+        self.metrics_label.setStyleSheet(
+            "background-color: rgba(0, 0, 0, 160); color: #9f9; font-family: monospace; padding: 4px;")
+        self.metrics_label.move(8, 8)
+        self.metrics_label.hide()
+        self.metrics_timer = QTimer(self)
+        self.metrics_timer.setInterval(500)
+        self.metrics_timer.timeout.connect(self.update_metrics_overlay)
+        self._metrics_last = None
+        QShortcut(QKeySequence("F3"), self, self.toggle_metrics_overlay)
+
         # CNC-related variables
         self.cnc_connected = False
-        self.driver = None
+        self._jog_request = None
+        self._jogging = False
+        self.jog_hold_timer = QTimer(self)
+        self.jog_hold_timer.setSingleShot(True)
+        self.jog_hold_timer.timeout.connect(self.on_jog_hold)
+        self.motion = MotionWorker(self)
+        self.motion.connected.connect(self.on_cnc_connected)
+        self.motion.disconnected.connect(self.on_cnc_disconnected)
+        self.motion.position_changed.connect(self.on_position_changed)
+        self.motion.error.connect(self.on_motion_error)
+        self.motion.job_progress.connect(self.on_job_progress)
+        self.motion.focus_found.connect(self.on_focus_found)
+        self.motion.start()
 
         # Connect signals
         self.setup_connections()
@@ -36,20 +70,26 @@ class MainWindowController(QMainWindow):
     def setup_connections(self):
         # Camera
         self.ui.connect_camera_button.clicked.connect(self.toggle_camera)
-        # Joystick buttons (X-axis)
-        self.ui.left_1_button.clicked.connect(lambda: self.move_axis('X', -1))
-        self.ui.left_10_button.clicked.connect(lambda: self.move_axis('X', -10))
-        self.ui.left_50_button.clicked.connect(lambda: self.move_axis('X', -50))
-        self.ui.right_1_button.clicked.connect(lambda: self.move_axis('X', 1))
-        self.ui.right_10_button.clicked.connect(lambda: self.move_axis('X', 10))
-        self.ui.right_50_button.clicked.connect(lambda: self.move_axis('X', 50))
-        # Joystick buttons (Y-axis)
-        self.ui.up_1_button.clicked.connect(lambda: self.move_axis('Y', 1))
-        self.ui.up10_button.clicked.connect(lambda: self.move_axis('Y', 10))
-        self.ui.up50_button.clicked.connect(lambda: self.move_axis('Y', 50))
-        self.ui.pushButton_4.clicked.connect(lambda: self.move_axis('Z', 1))    # Assuming V = Z
-        self.ui.pushButton_5.clicked.connect(lambda: self.move_axis('Z', 10))
-        self.ui.pushButton_6.clicked.connect(lambda: self.move_axis('Z', 50))
+        self.record_button = QPushButton("Запись", self.ui.camera_settings_groupbox)
+        self.ui.verticalLayout.insertWidget(self.ui.verticalLayout.count() - 1, self.record_button)
+        self.record_button.setEnabled(False)
+        self.record_button.clicked.connect(self.toggle_recording)
+        # Joystick buttons: click = fixed step, hold = continuous jog
+        # X-axis
+        self.setup_jog_button(self.ui.left_1_button, 'X', -1)
+        self.setup_jog_button(self.ui.left_10_button, 'X', -10)
+        self.setup_jog_button(self.ui.left_50_button, 'X', -50)
+        self.setup_jog_button(self.ui.right_1_button, 'X', 1)
+        self.setup_jog_button(self.ui.right_10_button, 'X', 10)
+        self.setup_jog_button(self.ui.right_50_button, 'X', 50)
+        # Y-axis
+        self.setup_jog_button(self.ui.up_1_button, 'Y', 1)
+        self.setup_jog_button(self.ui.up10_button, 'Y', 10)
+        self.setup_jog_button(self.ui.up50_button, 'Y', 50)
+        # Z-axis
+        self.setup_jog_button(self.ui.pushButton_4, 'Z', 1)    # Assuming V = Z
+        self.setup_jog_button(self.ui.pushButton_5, 'Z', 10)
+        self.setup_jog_button(self.ui.pushButton_6, 'Z', 50)
         # Zeroing buttons
         self.ui.pushButton.clicked.connect(lambda: self.zero_axis('X'))         # zero X
         self.ui.pushButton_2.clicked.connect(lambda: self.zero_axis('Y'))       # zero Y
@@ -61,136 +101,296 @@ class MainWindowController(QMainWindow):
         # CNC connection
         self.ui.connect_cnc_button.clicked.connect(self.toggle_cnc_connection)
 
+        # G-code job controls (not in the .ui file yet)
+        self.job_button = QPushButton("Запустить G-code...", self.ui.cnc_settings_groupbox)
+        self.job_pause_button = QPushButton("Пауза", self.ui.cnc_settings_groupbox)
+        self.job_stop_button = QPushButton("Стоп", self.ui.cnc_settings_groupbox)
+        for index, button in enumerate((self.job_button, self.job_pause_button, self.job_stop_button)):
+            self.ui.verticalLayout_2.insertWidget(2 + index, button)
+        self.job_pause_button.setEnabled(False)
+        self.job_stop_button.setEnabled(False)
+        self.job_button.clicked.connect(self.start_job)
+        self.job_pause_button.clicked.connect(self.toggle_job_pause)
+        self.job_stop_button.clicked.connect(self.motion.job_abort)
+
+        self.autofocus_button = QPushButton("Автофокус", self.ui.cnc_settings_groupbox)
+        self.ui.verticalLayout_2.insertWidget(5, self.autofocus_button)
+        self.autofocus_button.clicked.connect(self.start_autofocus)
+
+    def setup_jog_button(self, button, axis, steps):
+        button.pressed.connect(lambda: self.on_jog_pressed(axis, steps))
+        button.released.connect(lambda: self.on_jog_released(axis, steps))
+
+    def on_jog_pressed(self, axis, steps):
+        # Jog starts only if the button is still held after JOG_HOLD_DELAY_MS
+        self._jog_request = (axis, steps)
+        self._jogging = False
+        self.jog_hold_timer.start(self.JOG_HOLD_DELAY_MS)
+
+    def on_jog_hold(self):
+        if self._jog_request is None or not self.cnc_connected:
+            return
+        axis, steps = self._jog_request
+        self._jogging = True
+        self.motion.jog_start(axis, 1 if steps > 0 else -1)
+
+    def on_jog_released(self, axis, steps):
+        self.jog_hold_timer.stop()
+        self._jog_request = None
+        if self._jogging:
+            self._jogging = False
+            self.motion.jog_stop()
+        else:
+            self.move_axis(axis, steps)
+
     def clear_image_display(self):
-        self.image_label.clear()
-        self.ui.image_displayer.setStyleSheet("background-color: black;")
-        self.image_label.move(0, 0)
-        self.image_label.resize(self.ui.image_displayer.size())
+        self.image_view.clear()
 
     def toggle_camera(self):
         if self.cam is None:
             port_text = self.ui.camera_port_lineEdit.text()
             try:
                 port = int(port_text) if port_text.isdigit() else port_text
-                self.cam = ThreadSafeCameraReader(camera_id=port)
-                self.timer.start(200)
+                self.cam = ThreadSafeCameraReader(camera_id=port, preview_scale=self.PREVIEW_SCALE)
+                self.image_view.set_image_size(self.cam.width, self.cam.height)
+                self.start_preview()
+                self.record_button.setEnabled(True)
                 self.ui.connect_camera_button.setText("Отключить камеру")
             except Exception as e:
                 self.show_error(f"Ошибка при открытии камеры: {str(e)}")
                 self.cam = None
                 self.clear_image_display()
         else:
-            self.timer.stop()
+            self.stop_camera()
+
+    def start_preview(self):
+        size = self.ui.image_displayer.size()
+        self.preview = PreviewWorker(self.cam, size.width(), size.height(), self)
+        self.preview.frame_ready.connect(self.update_frame)
+        self.preview.full_frame_ready.connect(self.update_full_frame)
+        self.preview.set_full_resolution(self.image_view.zoomed_in)
+        self.preview.error.connect(self.on_preview_error)
+        self.preview.start()
+
+    def toggle_recording(self):
+        if self.recorder is None:
+            path, _ = QFileDialog.getSaveFileName(self, "Запись", "recording.mjpeg",
+                                                  "MJPEG (*.mjpeg);;Video (*.avi)")
+            if not path or self.cam is None:
+                return
+            mode = "video" if path.lower().endswith(".avi") else "mjpeg"
             try:
-                self.cam.stop()
-            except Exception:
-                pass
-            self.cam = None
-            self.ui.connect_camera_button.setText("Подключить")
-            self.clear_image_display()
-
-    def update_frame(self):
-        if not self.cam:
+                self.recorder = FrameRecorder(self.cam, path, mode=mode).start()
+            except Exception as e:
+                self.show_error(f"Не удалось начать запись: {str(e)}")
+                return
+            self.record_button.setText("Остановить запись")
+        else:
+            self.stop_recording()
+
+    def stop_recording(self):
+        if self.recorder is None:
             return
+        stats = self.recorder.stop()
+        self.recorder = None
+        self.record_button.setText("Запись")
+        self.statusBar().showMessage(
+            f"Запись: {stats['written']} кадров, потеряно {stats['dropped'] + stats['missed']}")
+
+    def stop_camera(self):
+        self.stop_recording()
+        self.record_button.setEnabled(False)
+        if self.preview is not None:
+            self.preview.stop()
+            self.preview = None
         try:
-            frame = self.cam.get_image()
-        except Exception as e:
-            self.timer.stop()
-            self.show_error(f"Ошибка чтения кадра с камеры: {str(e)}")
-            self.clear_image_display()
-            return
+            self.cam.stop()
+        except Exception:
+            pass
+        self.cam = None
+        self.ui.connect_camera_button.setText("Подключить")
+        self.clear_image_display()
 
-        if frame is None or getattr(frame, "size", 0) == 0:
-            self.clear_image_display()
+    def update_frame(self, image):
+        # image is already scaled to the displayer by PreviewWorker
+        start = time.perf_counter()
+        try:
+            self.image_view.set_preview(image)
+        except Exception as e:
+            self.show_error(f"Ошибка при отображении кадра: {str(e)}")
+            self.stop_camera()
             return
+        DISPLAY_SECONDS.observe(time.perf_counter() - start)
+        FRAMES_DISPLAYED.inc()
+        if self.preview is not None:
+            self.preview.frame_consumed()
 
+    def update_full_frame(self, seq, levels):
+        # Full-resolution pyramid while zoomed in; only visible tiles get converted
+        start = time.perf_counter()
         try:
-            rgb_image = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            h, w, ch = rgb_image.shape
-            bytes_per_line = ch * w
-            qt_image = QImage(rgb_image.data, w, h, bytes_per_line, QImage.Format.Format_RGB888)
-            pixmap = QPixmap.fromImage(qt_image)
-            scaled_pixmap = pixmap.scaled(
-                self.ui.image_displayer.width(),
-                self.ui.image_displayer.height(),
-                Qt.AspectRatioMode.KeepAspectRatio,
-                Qt.TransformationMode.SmoothTransformation
-            )
-            self.image_label.setPixmap(scaled_pixmap)
-            self.image_label.resize(self.ui.image_displayer.size())
-            self.ui.image_displayer.setStyleSheet("")
+            self.image_view.set_frame(levels, seq)
         except Exception as e:
-            self.timer.stop()
             self.show_error(f"Ошибка при отображении кадра: {str(e)}")
-            self.clear_image_display()
+            self.stop_camera()
+            return
+        DISPLAY_SECONDS.observe(time.perf_counter() - start)
+        FRAMES_DISPLAYED.inc()
+        if self.preview is not None:
+            self.preview.frame_consumed()
+
+    def on_zoom_changed(self, zoomed_in):
+        if self.preview is not None:
+            self.preview.set_full_resolution(zoomed_in)
+
+    def toggle_metrics_overlay(self):
+        if self.metrics_label.isVisible():
+            self.metrics_timer.stop()
+            self.metrics_label.hide()
+            return
+        self._metrics_last = None
+        self.update_metrics_overlay()
+        self.metrics_label.show()
+        self.metrics_timer.start()
+
+    def update_metrics_overlay(self):
+        def count(name, **labels):
+            metric = REGISTRY.get(name, labels)
+            return metric.value if metric is not None else 0
+
+        def ms(name, q, **labels):
+            metric = REGISTRY.get(name, labels)
+            value = metric.quantile(q) if metric is not None else None
+            return "   -" if value is None else f"{value * 1000:6.1f}"
+
+        now = time.monotonic()
+        captured = count("camera_frames_total", state="captured")
+        displayed = count("preview_frames_displayed_total")
+        capture_fps = display_fps = 0.0
+        if self._metrics_last is not None:
+            then, last_captured, last_displayed = self._metrics_last
+            if now > then:
+                capture_fps = (captured - last_captured) / (now - then)
+                display_fps = (displayed - last_displayed) / (now - then)
+        self._metrics_last = (now, captured, displayed)
+
+        lines = [
+            f"камера    {capture_fps:5.1f} fps   экран {display_fps:5.1f} fps",
+            f"пропущено {count('camera_frames_total', state='dropped')}   "
+            f"ошибок {count('camera_frames_total', state='failed')}",
+            f"команда   p50 {ms('grbl_command_seconds', 0.5)}  p99 {ms('grbl_command_seconds', 0.99)} мс",
+            f"движение  p50 {ms('grbl_move_seconds', 0.5)}  p99 {ms('grbl_move_seconds', 0.99)} мс",
+            f"опрос '?' джиттер p99 {ms('grbl_status_poll_jitter_seconds', 0.99)} мс",
+            f"get_image p50 {ms('camera_get_image_seconds', 0.5)}   "
+            f"undistort p50 {ms('camera_undistort_seconds', 0.5, kind='preview')} мс",
+            f"рендер    p50 {ms('preview_render_seconds', 0.5)}   "
+            f"вывод p50 {ms('preview_display_seconds', 0.5)} мс",
+        ]
+        self.metrics_label.setText("\n".join(lines))
+        self.metrics_label.adjustSize()
+        self.metrics_label.raise_()
+
+    def on_preview_error(self, message):
+        self.show_error(f"Ошибка чтения кадра с камеры: {message}")
+        self.stop_camera()
 
     def resizeEvent(self, event):
-        if hasattr(self, 'image_label') and self.image_label:
-            self.image_label.resize(self.ui.image_displayer.size())
+        if getattr(self, 'preview', None) is not None:
+            size = self.ui.image_displayer.size()
+            self.preview.set_target_size(size.width(), size.height())
         super().resizeEvent(event)
 
     def move_axis(self, axis, steps):
-        if self.driver:
-            print(f"Moving {axis} by {steps} mm")
-            if axis == 'X':
-                current = float(self.ui.cur_x_label.text() or "0")
-                if current + steps <= 0:
-                    self.driver.move_x_rel(int(steps))
-                    self.ui.cur_x_label.setText(str(round(current + steps, 2)))
-                else:
-                    self.ui.cur_x_label.setText("0.0")
-                    self.driver.move_x(0)
-                    print('Out of range axis X')
-            # TODO: Make out of range checker for y axis
-            elif axis == 'Y':
-                self.driver.move_y_rel(int(steps))
-                current = float(self.ui.cur_y_label.text() or "0")
-                self.ui.cur_y_label.setText(str(round(current + steps, 2)))
+        if self.cnc_connected:
+            self.motion.move_rel(axis, steps)
         else: print('ERROR! Connect to CNC')
 
     def zero_axis(self, axis):
-        if self.driver:
-            if axis == 'X':        
-                self.ui.cur_x_label.setText("0.0")
-                self.driver.move_x(0)
-            elif axis == 'Y':
-                self.ui.cur_y_label.setText("0.0")
-                self.driver.move_y(0)
-            print(f"Zeroing {axis} axis")
+        if self.cnc_connected:
+            self.motion.move_to(axis, 0)
         else: print('ERROR! Connect to CNC')
 
     def zero_all(self):
-        if self.driver:
-            self.driver.move_x(0)
-            self.driver.move_y(0)
-            self.ui.cur_x_label.setText("0.0")
-            self.ui.cur_y_label.setText("0.0")
-            print("Zeroing all axes")
+        if self.cnc_connected:
+            self.motion.zero_all()
         else: print('ERROR! Connect to CNC')
 
     def toggle_cnc_connection(self):
+        self.ui.connect_cnc_button.setEnabled(False)
         if not self.cnc_connected:
-            port = self.ui.port_lineEdit.text()
-            try:
-                self.driver = CncMachineDriver(port, baud_rate=115200, timeout=2)
-                self.driver.open_serial_port()
-                self.driver.unlock()
-                self.driver.set_units_and_mode()
-                self.cnc_connected = True
-                self.ui.connect_cnc_button.setText("Отключить CNC")
-                print(f"Подключено к CNC на {port}")
-            except Exception as e:
-                self.show_error(f"Не удалось подключиться к CNC: {str(e)}")
+            self.motion.connect_cnc(self.ui.port_lineEdit.text())
         else:
-            self.ui.cur_x_label.setText("0.0")
-            self.ui.cur_y_label.setText("0.0")
-            self.driver.move_x(0)
-            self.driver.move_y(0)
-            self.cnc_connected = False
-            self.ui.connect_cnc_button.setText("Подключить")
-            self.driver.close_serial_port()
-            self.driver = None
-            print("CNC отключён")
+            self.motion.disconnect_cnc()
+
+    def on_cnc_connected(self, port):
+        self.cnc_connected = True
+        self.ui.connect_cnc_button.setEnabled(True)
+        self.ui.connect_cnc_button.setText("Отключить CNC")
+        print(f"Подключено к CNC на {port}")
+
+    def on_cnc_disconnected(self):
+        self.cnc_connected = False
+        self.ui.connect_cnc_button.setEnabled(True)
+        self.ui.connect_cnc_button.setText("Подключить")
+        self.ui.cur_x_label.setText("0.0")
+        self.ui.cur_y_label.setText("0.0")
+        print("CNC отключён")
+
+    def on_position_changed(self, x, y):
+        self.ui.cur_x_label.setText(str(round(x, 2)))
+        self.ui.cur_y_label.setText(str(round(y, 2)))
+
+    def start_job(self):
+        if not self.cnc_connected:
+            print('ERROR! Connect to CNC')
+            return
+        path, _ = QFileDialog.getOpenFileName(self, "G-code", "", "G-code (*.nc *.gcode *.ngc *.tap);;All (*)")
+        if path:
+            self.job_button.setEnabled(False)
+            self.job_pause_button.setEnabled(True)
+            self.job_stop_button.setEnabled(True)
+            self.motion.run_job(path)
+
+    def toggle_job_pause(self):
+        if self.job_pause_button.text() == "Пауза":
+            self.motion.job_pause()
+        else:
+            self.motion.job_resume()
+
+    def on_job_progress(self, progress):
+        eta = "--:--:--" if progress.eta is None else time.strftime("%H:%M:%S", time.gmtime(progress.eta))
+        self.statusBar().showMessage(
+            f"G-code: {progress.state} {progress.percent:.1f}%  "
+            f"{progress.lines_done} строк ({progress.lines_per_s:.0f}/с), осталось {eta}"
+            + (f", ошибок: {progress.errors}" if progress.errors else ""))
+        self.job_pause_button.setText("Продолжить" if progress.state == 'paused' else "Пауза")
+        if progress.state in ('done', 'aborted', 'failed'):
+            self.job_button.setEnabled(True)
+            self.job_pause_button.setEnabled(False)
+            self.job_stop_button.setEnabled(False)
+
+    def start_autofocus(self):
+        if not self.cnc_connected:
+            print('ERROR! Connect to CNC')
+            return
+        if self.cam is None:
+            self.show_error("Для автофокуса нужна подключённая камера")
+            return
+        self.autofocus_button.setEnabled(False)
+        self.statusBar().showMessage("Автофокус...")
+        self.motion.autofocus(self.cam)
+
+    def on_focus_found(self, z):
+        self.autofocus_button.setEnabled(True)
+        self.statusBar().showMessage(f"Автофокус: Z = {z:.3f} мм")
+
+    def on_motion_error(self, message):
+        self.autofocus_button.setEnabled(True)
+        self.ui.connect_cnc_button.setEnabled(True)
+        if not self.cnc_connected:
+            self.show_error(f"Не удалось подключиться к CNC: {message}")
+        else:
+            self.show_error(f"Ошибка станка: {message}")
 
     def show_error(self, message):
         print("ERROR:", message)
@@ -199,11 +399,10 @@ class MainWindowController(QMainWindow):
 
     def closeEvent(self, event):
         if self.cam:
-            self.cam.stop()
-        if self.driver:
-            self.driver.move_x(0)
-            self.driver.move_y(0)
-            self.driver.close_serial_port()
+            self.stop_camera()
+        if self.cnc_connected:
+            self.motion.disconnect_cnc()
+        self.motion.stop()
         event.accept()
 
 
@@ -0,0 +1,237 @@
+import os
+import logging
+import threading
+from collections import deque
+
+from PyQt6.QtCore import QThread, pyqtSignal
+
+from cnc_control.cnc_lib.new_machine_lib import CncMachineDriver
+from cnc_control.cnc_lib.job_runner import GcodeJobRunner
+from cnc_control.autofocus import Autofocus
+
+
+class MotionWorker(QThread):
+    """
+    Поток, в котором живёт CncMachineDriver.
+
+    GUI только кладёт команды в очередь (submit и обёртки над ним) и получает результат
+    через сигналы, поэтому цикл событий Qt никогда не ждёт станок. Идущие подряд
+    относительные перемещения по одной оси склеиваются: пять нажатий "+10" превращаются
+    в одно перемещение на +50.
+    """
+
+    connected = pyqtSignal(str)                  # порт
+    disconnected = pyqtSignal()
+    position_changed = pyqtSignal(float, float)  # реальные X, Y (мм) из отчётов GRBL
+    status_changed = pyqtSignal(object)          # MachineStatus
+    job_progress = pyqtSignal(object)            # JobProgress
+    command_done = pyqtSignal(str)
+    focus_found = pyqtSignal(float)              # Z лучшего фокуса (мм)
+    error = pyqtSignal(str)
+
+    JOG_SPEED = 1000       # подача непрерывного jog, мм/мин
+    AUTOFOCUS_RANGE = 1.0  # автофокус ищет в пределах ±AUTOFOCUS_RANGE мм от текущего Z
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.driver = None
+        self.job = None
+        self._queue = deque()
+        self._cond = threading.Condition()
+        self._running = True
+        self.logger = logging.getLogger("MotionWorker")
+
+    # --- API для GUI-потока ---
+    def submit(self, name, *args):
+        with self._cond:
+            self._queue.append((name, args))
+            self._cond.notify()
+
+    def connect_cnc(self, port):
+        self.submit('connect', port)
+
+    def disconnect_cnc(self):
+        self.jog_stop()
+        self.submit('disconnect')
+
+    def move_rel(self, axis, delta):
+        self.submit('move_rel', axis, delta)
+
+    def move_to(self, axis, value):
+        self.submit('move_to', axis, value)
+
+    def zero_all(self):
+        self.submit('zero_all')
+
+    def jog_start(self, axis, direction):
+        # Номер последней остановки на момент нажатия: отпускание, пришедшее раньше, чем
+        # поток станка дошёл до команды, отменяет её и в драйвере
+        driver = self.driver
+        self.submit('jog_start', axis, direction, driver.jog_stops if driver is not None else None)
+
+    def jog_stop(self):
+        """Остановка jog сразу из GUI-потока, минуя очередь: важна задержка остановки"""
+        with self._cond:
+            self._queue = deque(item for item in self._queue if item[0] != 'jog_start')
+        driver = self.driver
+        if driver is not None:
+            driver.jog_stop()
+
+    def run_job(self, path):
+        self.submit('run_job', path)
+
+    def autofocus(self, camera):
+        self.submit('autofocus', camera)
+
+    # Управление заданием идёт real-time байтами в обход очереди
+    def job_pause(self):
+        if self.job is not None:
+            self.job.pause()
+
+    def job_resume(self):
+        if self.job is not None:
+            self.job.resume()
+
+    def job_abort(self):
+        if self.job is not None:
+            self.job.abort()
+
+    def stop(self):
+        """Останавливает поток после уже поставленных в очередь команд"""
+        self.jog_stop()
+        with self._cond:
+            self._running = False
+            self._cond.notify()
+        self.wait()
+
+    # --- Поток станка ---
+    def run(self):
+        while True:
+            with self._cond:
+                while self._running and not self._queue:
+                    self._cond.wait()
+                if not self._queue:
+                    return
+                name, args = self._queue.popleft()
+                if name == 'move_rel':
+                    args = self._merge_rel_moves(*args)
+            try:
+                getattr(self, f"_do_{name}")(*args)
+                self.command_done.emit(name)
+            except Exception as e:
+                self.error.emit(f"{name}: {e}")
+
+    def _merge_rel_moves(self, axis, delta):
+        """Забирает из головы очереди следующие move_rel по той же оси (вызывать под _cond)"""
+        while self._queue and self._queue[0][0] == 'move_rel' and self._queue[0][1][0] == axis:
+            delta += self._queue.popleft()[1][1]
+        return axis, delta
+
+    def _on_status(self, status):
+        # Вызывается из потока опроса драйвера; сигналы Qt доставят данные в GUI-поток
+        self.status_changed.emit(status)
+        self.position_changed.emit(status.wpos[0], status.wpos[1])
+
+    def _do_connect(self, port):
+        if self.driver is not None:
+            return
+        # CNC_SERIAL_TRACE=/path/grbl.trace пишет двоичную трассу обмена для serial_trace replay
+        driver = CncMachineDriver(port, baud_rate=115200, timeout=2,
+                                  trace_file=os.environ.get("CNC_SERIAL_TRACE"))
+        driver.subscribe(self._on_status)
+        try:
+            driver.open_serial_port()
+            driver.unlock()
+            driver.set_units_and_mode()
+        except Exception:
+            driver.close_serial_port()
+            raise
+        self.driver = driver
+        self.connected.emit(port)
+
+    def _do_disconnect(self):
+        if self.driver is None:
+            return
+        try:
+            self.driver.move_x(0)
+            self.driver.move_y(0)
+        finally:
+            self.driver.unsubscribe(self._on_status)
+            self.driver.close_serial_port()
+            self.driver = None
+            self.disconnected.emit()
+
+    def _do_move_rel(self, axis, delta):
+        if self.driver is None:
+            raise RuntimeError("CNC is not connected")
+        self.logger.info(f"Moving {axis} by {delta} mm")
+        if axis == 'X':
+            if self.driver.position[0] + delta <= 0:
+                self.driver.move_x_rel(delta)
+            else:
+                self.driver.move_x(0)
+                self.logger.warning('Out of range axis X')
+        elif axis == 'Y':
+            # Y ограничен Y_MIN/Y_MAX драйвера, как и при jog: за границей встаём на неё
+            target = self.driver.position[1] + delta
+            if self.driver.Y_MIN <= target <= self.driver.Y_MAX:
+                self.driver.move_y_rel(delta)
+            else:
+                self.driver.move_y(min(max(target, self.driver.Y_MIN), self.driver.Y_MAX))
+                self.logger.warning('Out of range axis Y')
+        elif axis == 'Z':
+            self.driver.move_z_rel(delta)
+
+    def _do_move_to(self, axis, value):
+        if self.driver is None:
+            raise RuntimeError("CNC is not connected")
+        if axis == 'X':
+            self.driver.move_x(value)
+        elif axis == 'Y':
+            self.driver.move_y(value)
+        elif axis == 'Z':
+            self.driver.move_z(value)
+        if value == 0:
+            self.logger.info(f"Zeroing {axis} axis")
+        else:
+            self.logger.info(f"Moving {axis} to {value} mm")
+
+    def _do_jog_start(self, axis, direction, stops=None):
+        if self.driver is None:
+            raise RuntimeError("CNC is not connected")
+        # Та же граница, что и для шагов: X не выходит в положительную область
+        limits = (self.driver.X_MIN, 0) if axis == 'X' else None
+        if not self.driver.jog_start(axis, direction, speed=self.JOG_SPEED, limits=limits, stops=stops):
+            return
+        # Следующие команды очереди ждут конца jog (jog_stop() приходит из GUI-потока
+        # напрямую в драйвер), иначе они ушли бы в GRBL вперемешку с шагами $J=
+        self.driver.jog_wait()
+
+    def _do_run_job(self, path):
+        if self.driver is None:
+            raise RuntimeError("CNC is not connected")
+        self.job = GcodeJobRunner(self.driver, path, progress_callback=self.job_progress.emit)
+        try:
+            errors = self.job.run()
+        finally:
+            self.job = None
+        if errors:
+            # Исключение уходит в GUI сигналом error вместо command_done
+            number, line, status = errors[0]
+            self.logger.warning(f"G-code job finished with {len(errors)} rejected lines")
+            raise RuntimeError(f"{len(errors)} G-code lines rejected, first: line {number} {line!r} -> {status}")
+
+    def _do_autofocus(self, camera):
+        if self.driver is None:
+            raise RuntimeError("CNC is not connected")
+        z = self.driver.position[2]
+        best = Autofocus(self.driver, camera).run(z - self.AUTOFOCUS_RANGE, z + self.AUTOFOCUS_RANGE)
+        self.logger.info(f"Autofocus: Z = {best:.3f} mm")
+        self.focus_found.emit(best)
+
+    def _do_zero_all(self):
+        if self.driver is None:
+            raise RuntimeError("CNC is not connected")
+        self.driver.move_x(0)
+        self.driver.move_y(0)
+        self.logger.info("Zeroing all axes")
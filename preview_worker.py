@@ -0,0 +1,107 @@
+import threading
+import time
+
+import cv2
+from PyQt6.QtCore import QThread, pyqtSignal
+from PyQt6.QtGui import QImage
+
+from cnc_control.metrics import REGISTRY
+from tiled_viewer import build_pyramid
+
+RENDER_SECONDS = REGISTRY.histogram("preview_render_seconds", "Undistort, resize and QImage wrap of one preview")
+
+
+def render_preview(frame, width, height):
+    """
+    Resize a BGR frame to fit (width, height) and wrap it as a QImage.
+
+    Resizing happens first (INTER_AREA) and the colour order is handled by
+    Format_BGR888, so the cost depends on the widget size, not the sensor size.
+    """
+    h, w = frame.shape[:2]
+    scale = min(width / w, height / h)
+    if scale != 1.0:
+        size = (max(1, int(w * scale)), max(1, int(h * scale)))
+        frame = cv2.resize(frame, size, interpolation=cv2.INTER_AREA if scale < 1.0 else cv2.INTER_LINEAR)
+    h, w = frame.shape[:2]
+    # copy(): the QImage must own its pixels once the numpy buffer goes away
+    return QImage(frame.data, w, h, frame.strides[0], QImage.Format.Format_BGR888).copy()
+
+
+class PreviewWorker(QThread):
+    """
+    Builds preview images off the GUI thread.
+
+    Waits for new camera frames, renders them at the displayer's current size and
+    hands finished QImages to the GUI via frame_ready. A new frame is rendered only
+    after the GUI called frame_consumed(), always from the newest capture, so stale
+    frames are dropped instead of queueing up in the event loop.
+
+    With set_full_resolution(True) (the view is zoomed in) frames are decoded at
+    sensor resolution, undistorted, cut into a half-size pyramid (build_pyramid) and
+    sent with their sequence number via full_frame_ready instead; the same
+    frame_consumed() handshake applies.
+    """
+
+    frame_ready = pyqtSignal(QImage)
+    full_frame_ready = pyqtSignal(int, object)   # seq, pyramid levels
+    error = pyqtSignal(str)
+
+    def __init__(self, camera, width, height, parent=None):
+        super().__init__(parent)
+        self.camera = camera
+        self.set_target_size(width, height)
+        self._consumed = threading.Event()
+        self._consumed.set()
+        self._full_resolution = False
+        self._running = True
+
+    def set_target_size(self, width, height):
+        self._size = (max(1, width), max(1, height))
+        self.camera.fit_preview_scale(*self._size)
+
+    def set_full_resolution(self, enabled):
+        self._full_resolution = enabled
+
+    def frame_consumed(self):
+        self._consumed.set()
+
+    def stop(self):
+        self._running = False
+        self._consumed.set()
+        self.wait()
+
+    def run(self):
+        last_seq = 0
+        while self._running:
+            if not self._consumed.wait(timeout=0.5):
+                continue
+            lease = self.camera.wait_for_new(last_seq, timeout=0.5)
+            if lease is None:
+                continue
+            start = time.perf_counter()
+            try:
+                with lease:
+                    last_seq = lease.seq
+                    if self._full_resolution:
+                        # Owned (or cached read-only) full frame, safe to keep after release
+                        full = self.camera.get_full_resolution(lease)
+                        if self.camera.undistorter is not None:
+                            full = self.camera.undistorter.undistort(full)
+                        full = build_pyramid(full)
+                    else:
+                        full = None
+                        frame = lease.image
+                        if self.camera.undistorter is not None:
+                            # Straight from the raw (possibly reduced) frame to display size
+                            frame = self.camera.undistorter.undistort_preview(frame, *self._size)
+                        image = render_preview(frame, *self._size)
+            except Exception as e:
+                self.error.emit(str(e))
+                return
+            RENDER_SECONDS.observe(time.perf_counter() - start)
+            self._consumed.clear()
+            if full is not None:
+                self.full_frame_ready.emit(last_seq, full)
+            else:
+                self.frame_ready.emit(image)
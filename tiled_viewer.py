@@ -0,0 +1,285 @@
+import math
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+from PyQt6.QtCore import Qt, QRectF, QPointF, pyqtSignal
+from PyQt6.QtGui import QImage, QPainter, QPixmap
+from PyQt6.QtWidgets import QWidget
+
+
+def build_pyramid(frame, min_size=256):
+    """
+    Half-size levels of a frame for TiledImageView, level 0 being `frame` itself (not
+    copied), down to the first level no larger than min_size on either side.
+    """
+    levels = [frame]
+    while max(levels[-1].shape[:2]) > min_size:
+        src = levels[-1]
+        size = (max(1, -(-src.shape[1] // 2)), max(1, -(-src.shape[0] // 2)))
+        levels.append(cv2.resize(src, size, interpolation=cv2.INTER_AREA))
+    return levels
+
+
+class TiledImageView(QWidget):
+    """
+    Zoomable, pannable view of a large frame.
+
+    At fit zoom it shows the display-sized preview QImages from PreviewWorker. Zoomed
+    in, it draws a full-resolution frame from a pyramid of half-size levels cut into
+    TILE x TILE tiles. Only tiles that are visible at the current zoom are converted
+    to QPixmaps, and those are kept in an LRU cache, so repaints while panning don't
+    rescale the whole image. The pyramid comes ready-made from PreviewWorker
+    (build_pyramid), so the GUI thread never resizes a full frame.
+
+    Mouse: wheel zooms around the cursor, left drag pans, double click fits.
+    """
+
+    TILE = 256
+    MAX_ZOOM = 8.0       # screen pixels per image pixel
+    CACHE_TILES = 192    # ~37 MB of 256x256 RGB pixmaps
+
+    # True when zoomed in past fit (full-resolution frames are needed)
+    zoom_changed = pyqtSignal(bool)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setMouseTracking(False)
+        self.setFocusPolicy(Qt.FocusPolicy.WheelFocus)
+        self._preview = None        # QPixmap of the latest preview
+        self._levels = []           # pyramid of the current full frame, level 0 first
+        self._generation = 0        # bumps with every full frame, part of the tile key
+        self._seq = None            # camera sequence number of the shown frame
+        self._tiles = OrderedDict()
+        self._image_size = None     # (width, height) in full-resolution pixels
+        self._zoom = 1.0
+        self._origin = QPointF(0, 0)  # image point at the widget's top-left corner
+        self._fit = True
+        self._drag_from = None
+        self.tiles_converted = 0
+        self.tile_hits = 0
+
+    # -----------------------------
+    # Content
+    # -----------------------------
+    def set_image_size(self, width, height):
+        """Full-resolution size that zoom and pan coordinates refer to."""
+        if self._image_size != (width, height):
+            self._image_size = (width, height)
+            self.fit()
+
+    def set_preview(self, image):
+        """Show a (display-sized) preview QImage."""
+        self._preview = QPixmap.fromImage(image)
+        if self._image_size is None:
+            self.set_image_size(image.width(), image.height())
+        self.update()
+
+    def set_frame(self, frame, seq=None):
+        """
+        Show a full-resolution BGR frame.
+
+        Args:
+            frame (np.ndarray or list): The frame, or its levels from build_pyramid()
+                (preferred: a bare array has its pyramid built here, on the GUI thread).
+                Arrays are referenced, not copied, and must not change while displayed.
+            seq (int or None): Camera sequence number; cached tiles are kept while it
+                stays the same, None always replaces them.
+        """
+        levels = frame if isinstance(frame, (list, tuple)) else build_pyramid(frame)
+        base = levels[0]
+        if base.ndim != 3 or base.shape[2] != 3:
+            raise ValueError("Expected a BGR frame")
+        if seq is None or seq != self._seq or not self._levels:
+            self._levels = list(levels)
+            self._seq = seq
+            self._generation += 1
+            self._tiles.clear()
+        self.set_image_size(base.shape[1], base.shape[0])
+        self.update()
+
+    def clear(self):
+        self._preview = None
+        self._levels = []
+        self._seq = None
+        self._tiles.clear()
+        self._image_size = None
+        self._fit = True
+        self.update()
+
+    @property
+    def zoomed_in(self):
+        return not self._fit
+
+    # -----------------------------
+    # Zoom and pan
+    # -----------------------------
+    def _fit_zoom(self):
+        w, h = self._image_size
+        return min(self.width() / w, self.height() / h)
+
+    def fit(self):
+        was_fit = self._fit
+        if self._image_size is not None:
+            self._zoom = self._fit_zoom()
+        self._fit = True
+        self._drop_frame()
+        self._clamp()
+        self.update()
+        if not was_fit:
+            self.zoom_changed.emit(False)
+
+    def zoom_at(self, factor, pos):
+        """Multiply zoom by `factor` keeping the image point under widget `pos` fixed."""
+        if self._image_size is None:
+            return
+        fit_zoom = self._fit_zoom()
+        zoom = min(max(self._zoom * factor, fit_zoom), self.MAX_ZOOM)
+        if zoom <= fit_zoom * 1.0001:
+            self.fit()
+            return
+        anchor = self._origin + pos / self._zoom
+        self._zoom = zoom
+        self._origin = anchor - pos / zoom
+        self._clamp()
+        if self._fit:
+            self._fit = False
+            self.zoom_changed.emit(True)
+        self.update()
+
+    def pan(self, delta):
+        self._origin -= delta / self._zoom
+        self._clamp()
+        self.update()
+
+    def _clamp(self):
+        """Centre the image on an axis where it is smaller than the widget, else keep it in view."""
+        if self._image_size is None:
+            return
+        w, h = self._image_size
+        view_w, view_h = self.width() / self._zoom, self.height() / self._zoom
+        x = (w - view_w) / 2 if view_w >= w else min(max(self._origin.x(), 0.0), w - view_w)
+        y = (h - view_h) / 2 if view_h >= h else min(max(self._origin.y(), 0.0), h - view_h)
+        self._origin = QPointF(x, y)
+
+    def _drop_frame(self):
+        # Back at fit the previews are enough, release the full-resolution pyramid
+        if self._preview is None:
+            return
+        self._levels = []
+        self._seq = None
+        self._tiles.clear()
+
+    # -----------------------------
+    # Tiles
+    # -----------------------------
+    def _tile(self, level, tx, ty):
+        key = (self._generation, level, tx, ty)
+        pixmap = self._tiles.get(key)
+        if pixmap is not None:
+            self._tiles.move_to_end(key)
+            self.tile_hits += 1
+            return pixmap
+        data = self._levels[level]
+        block = np.ascontiguousarray(data[ty * self.TILE:(ty + 1) * self.TILE,
+                                          tx * self.TILE:(tx + 1) * self.TILE])
+        h, w = block.shape[:2]
+        pixmap = QPixmap.fromImage(QImage(block.data, w, h, block.strides[0], QImage.Format.Format_BGR888))
+        self._tiles[key] = pixmap
+        if len(self._tiles) > self.CACHE_TILES:
+            self._tiles.popitem(last=False)
+        self.tiles_converted += 1
+        return pixmap
+
+    # -----------------------------
+    # Painting
+    # -----------------------------
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        painter.fillRect(self.rect(), Qt.GlobalColor.black)
+        if self._image_size is None:
+            return
+        if self._levels and (not self._fit or self._preview is None):
+            self._paint_tiles(painter)
+        elif self._preview is not None:
+            self._paint_preview(painter)
+
+    def _image_rect_on_screen(self, x, y, w, h):
+        return QRectF((x - self._origin.x()) * self._zoom, (y - self._origin.y()) * self._zoom,
+                      w * self._zoom, h * self._zoom)
+
+    def _paint_preview(self, painter):
+        w, h = self._image_size
+        pixmap = self._preview
+        if not self._fit:
+            # Placeholder until a full-resolution frame arrives: crop the preview
+            scale_x, scale_y = pixmap.width() / w, pixmap.height() / h
+            view_w, view_h = self.width() / self._zoom, self.height() / self._zoom
+            source = QRectF(self._origin.x() * scale_x, self._origin.y() * scale_y,
+                            view_w * scale_x, view_h * scale_y)
+            painter.setRenderHint(QPainter.RenderHint.SmoothPixmapTransform)
+            painter.drawPixmap(QRectF(self.rect()), pixmap, source)
+            return
+        target = self._image_rect_on_screen(0, 0, w, h)
+        if abs(target.width() - pixmap.width()) > 1 or abs(target.height() - pixmap.height()) > 1:
+            painter.setRenderHint(QPainter.RenderHint.SmoothPixmapTransform)
+        painter.drawPixmap(target, pixmap, QRectF(pixmap.rect()))
+
+    def _paint_tiles(self, painter):
+        # Coarsest level that still has at least one pixel per screen pixel
+        level = max(0, int(math.floor(math.log2(1.0 / self._zoom)))) if self._zoom < 1 else 0
+        level = min(level, len(self._levels) - 1)
+        data = self._levels[level]
+        factor = 2 ** level
+        step = self.TILE * factor  # tile size in full-resolution pixels
+
+        view_w, view_h = self.width() / self._zoom, self.height() / self._zoom
+        x0, y0 = max(0.0, self._origin.x()), max(0.0, self._origin.y())
+        x1 = min(self._image_size[0], self._origin.x() + view_w)
+        y1 = min(self._image_size[1], self._origin.y() + view_h)
+        if self._zoom < 1:
+            painter.setRenderHint(QPainter.RenderHint.SmoothPixmapTransform)
+        for ty in range(int(y0 // step), int(math.ceil(y1 / step))):
+            for tx in range(int(x0 // step), int(math.ceil(x1 / step))):
+                if tx * self.TILE >= data.shape[1] or ty * self.TILE >= data.shape[0]:
+                    continue
+                pixmap = self._tile(level, tx, ty)
+                target = self._image_rect_on_screen(tx * step, ty * step,
+                                                    pixmap.width() * factor, pixmap.height() * factor)
+                painter.drawPixmap(target, pixmap, QRectF(pixmap.rect()))
+
+    # -----------------------------
+    # Events
+    # -----------------------------
+    def wheelEvent(self, event):
+        steps = event.angleDelta().y() / 120.0
+        if steps:
+            self.zoom_at(1.25 ** steps, event.position())
+        event.accept()
+
+    def mousePressEvent(self, event):
+        if event.button() == Qt.MouseButton.LeftButton:
+            self._drag_from = event.position()
+            self.setCursor(Qt.CursorShape.ClosedHandCursor)
+
+    def mouseMoveEvent(self, event):
+        if self._drag_from is not None and not self._fit:
+            self.pan(event.position() - self._drag_from)
+            self._drag_from = event.position()
+
+    def mouseReleaseEvent(self, event):
+        if event.button() == Qt.MouseButton.LeftButton:
+            self._drag_from = None
+            self.unsetCursor()
+
+    def mouseDoubleClickEvent(self, event):
+        self.fit()
+
+    def resizeEvent(self, event):
+        if self._image_size is not None:
+            if self._fit:
+                self._zoom = self._fit_zoom()
+            else:
+                self._zoom = max(self._zoom, self._fit_zoom())
+            self._clamp()
+        super().resizeEvent(event)